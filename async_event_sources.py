@@ -0,0 +1,98 @@
+import asyncio
+import typing
+
+# sources of events for Processor.query_async
+
+
+class AsyncEventSource:
+    """
+    Abstract class of an asynchronous source of events. A source yields lines in the format of the input file (parsed
+    by the processor's schema) or already created events
+    """
+    async def get_items(self) -> typing.AsyncIterator:
+        """
+        :return: an asynchronous iterator over the lines or events of the source, ending when the source is exhausted.
+        The base source has no items
+        """
+        return
+        # makes this method an asynchronous generator
+        yield
+
+    async def close(self):
+        pass
+
+
+class QueueEventSource(AsyncEventSource):
+    """
+    A source that takes lines or events from an asyncio.Queue, until it takes None. A bounded queue makes the producers
+    wait while the evaluation lags behind
+    """
+    def __init__(self, queue: asyncio.Queue):
+        self.queue = queue
+
+    async def get_items(self) -> typing.AsyncIterator:
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            yield item
+
+
+class StreamEventSource(AsyncEventSource):
+    """
+    A source that reads lines from an asyncio.StreamReader until its end. As the stream is only read when the evaluation
+    asks for more events, a socket is not read while the evaluation lags behind and the sender is slowed by the transport
+    flow control
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter = None, encoding: str = 'utf-8'):
+        """
+        :param reader: the stream to read
+        :param writer: the writing side of the connection, closed with the source
+        :param encoding: the encoding of the lines
+        """
+        self.reader = reader
+        self.writer = writer
+        self.encoding = encoding
+
+    async def get_items(self) -> typing.AsyncIterator:
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return
+            if line.strip():
+                yield line.decode(self.encoding)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+            self.writer = None
+
+
+class TCPEventSource(StreamEventSource):
+    """
+    A source that connects to a TCP server and reads lines from it
+    """
+    def __init__(self, host: str, port: int, encoding: str = 'utf-8'):
+        super().__init__(None, encoding=encoding)
+        self.host = host
+        self.port = port
+
+    async def get_items(self) -> typing.AsyncIterator:
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        async for item in super().get_items():
+            yield item
+
+
+class UnixEventSource(StreamEventSource):
+    """
+    A source that connects to a Unix domain socket and reads lines from it
+    """
+    def __init__(self, path: str, encoding: str = 'utf-8'):
+        super().__init__(None, encoding=encoding)
+        self.path = path
+
+    async def get_items(self) -> typing.AsyncIterator:
+        self.reader, self.writer = await asyncio.open_unix_connection(self.path)
+        async for item in super().get_items():
+            yield item
@@ -0,0 +1,156 @@
+import array
+import json
+import mmap
+import os
+import struct
+import typing
+
+# a binary columnar format that the events of an input file are cached in, see Processor(use_columnar_cache=True)
+
+
+class ColumnBuilder:
+    """
+    Collects the values of an attribute. Integer and float attributes are kept in arrays of 64 bit values, and other
+    attributes (or attributes whose values do not fit an array) are dictionary encoded: the column holds 32 bit codes
+    of the distinct values
+    """
+    def __init__(self):
+        self.kind = None
+        self.values = None
+        self.dictionary = None
+        self.codes = None
+
+    def add(self, value):
+        if self.kind is None:
+            if type(value) is int:
+                self.kind, self.values = 'q', array.array('q')
+            elif type(value) is float:
+                self.kind, self.values = 'd', array.array('d')
+            else:
+                self._encode_dictionary()
+        if self.kind == 'dictionary':
+            # equal values of different types (1, 1.0 and True) get different codes, so they are loaded as they were
+            key = (type(value), value)
+            code = self.codes.get(key)
+            if code is None:
+                code = self.codes[key] = len(self.dictionary)
+                self.dictionary.append(value)
+            self.values.append(code)
+            return
+        if type(value) is not (int if self.kind == 'q' else float):
+            self._encode_dictionary()
+            self.add(value)
+            return
+        try:
+            self.values.append(value)
+        except OverflowError:
+            self._encode_dictionary()
+            self.add(value)
+
+    def _encode_dictionary(self):
+        """
+        converts the column to a dictionary encoded column
+        """
+        previous_values = self.values if self.values is not None else []
+        self.kind = 'dictionary'
+        self.values = array.array('I')
+        self.dictionary = []
+        self.codes = {}
+        for value in previous_values:
+            self.add(value)
+
+
+class ColumnarCache:
+    """
+    The file format: a magic number, the size of a json header, the header (the cache key, the number of rows and the
+    kind, offset and dictionary of every column) and the columns, each a native array aligned to 8 bytes
+    """
+    magic = b'OCEPCOL1'
+
+    @staticmethod
+    def write(cache_path: str, key: typing.Dict, columns: typing.List[ColumnBuilder], rows_num: int):
+        """
+        writes the columns to the cache file (atomically, so readers never see a partial file). Caching is skipped if
+        the file can not be written or the dictionaries can not be saved as json
+        """
+        descriptions = []
+        offset = 0
+        for column in columns:
+            size = len(column.values) * column.values.itemsize if column.values is not None else 0
+            descriptions.append({'kind': column.kind, 'offset': offset, 'size': size,
+                                 'dictionary': column.dictionary})
+            offset += (size + 7) // 8 * 8
+        temporary_path = cache_path + '.%d.tmp' % os.getpid()
+        try:
+            header = json.dumps({'key': key, 'rows': rows_num, 'columns': descriptions}).encode()
+            header += b' ' * (-(len(ColumnarCache.magic) + 8 + len(header)) % 8)
+            with open(temporary_path, 'wb') as cache_file:
+                cache_file.write(ColumnarCache.magic)
+                cache_file.write(struct.pack('<Q', len(header)))
+                cache_file.write(header)
+                for column, description in zip(columns, descriptions):
+                    if column.values is not None:
+                        column.values.tofile(cache_file)
+                    cache_file.write(b'\0' * (-description['size'] % 8))
+            os.replace(temporary_path, cache_path)
+        except (OSError, TypeError, ValueError):
+            try:
+                os.remove(temporary_path)
+            except OSError:
+                pass
+
+    @staticmethod
+    def read_header(cache_file) -> typing.Optional[typing.Tuple[typing.Dict, int]]:
+        """
+        :return: the header of the cache file and the offset of its first column, None if it is not a cache file
+        """
+        if cache_file.read(len(ColumnarCache.magic)) != ColumnarCache.magic:
+            return None
+        header_size_bytes = cache_file.read(8)
+        if len(header_size_bytes) != 8:
+            return None
+        header_size, = struct.unpack('<Q', header_size_bytes)
+        try:
+            header = json.loads(cache_file.read(header_size).decode())
+        except ValueError:
+            return None
+        return header, len(ColumnarCache.magic) + 8 + header_size
+
+    @staticmethod
+    def load(cache_path: str, key: typing.Dict) -> typing.Optional[typing.Iterator[typing.Tuple]]:
+        """
+        :return: an iterator over the rows (attribute values) of the cache file, which is read through a memory map
+        without copying the columns. None if there is no valid cache file for the key
+        """
+        try:
+            cache_file = open(cache_path, 'rb')
+        except OSError:
+            return None
+        with cache_file:
+            header_and_offset = ColumnarCache.read_header(cache_file)
+            if header_and_offset is None or header_and_offset[0]['key'] != key:
+                return None
+            if header_and_offset[0]['rows'] == 0:
+                return iter(())
+            data = mmap.mmap(cache_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return ColumnarCache._get_rows(data, *header_and_offset)
+
+    @staticmethod
+    def _get_rows(data: mmap.mmap, header: typing.Dict, columns_offset: int) -> typing.Iterator[typing.Tuple]:
+        views = []
+        try:
+            buffer = memoryview(data)
+            views.append(buffer)
+            columns = []
+            for description in header['columns']:
+                start = columns_offset + description['offset']
+                kind = description['kind']
+                view = buffer[start:start + description['size']].cast('I' if kind == 'dictionary' else kind)
+                views.append(view)
+                columns.append(map(description['dictionary'].__getitem__, view) if kind == 'dictionary' else view)
+            yield from zip(*columns)
+        finally:
+            # the memory map can only be closed after the views of it are released
+            for view in reversed(views):
+                view.release()
+            data.close()
@@ -1,5 +1,6 @@
 
 metastock7_attributes = ['symbol', 'date', 'open_of_the_day', 'high_of_the_day', 'low_of_the_day', 'close_of_the_day',
                          'volumes']
+metastock7_attribute_types = [str, int, float, float, float, float, int]
 metastock7_time_index = 1
 metastock7_type_index = 0
@@ -1,69 +1,150 @@
 import os
-from tempfile import gettempdir
-from itertools import islice, cycle
-from collections import namedtuple
+import pickle
+import shutil
+import typing
 import heapq
+import tempfile
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
 
 # module for sorting the lines in the input file according to a given attribute (in our use it was time)
 
-Keyed = namedtuple("Keyed", ["key", "obj"])
+read_buffer_size = 1 << 20
+write_buffer_size = 1 << 20
+# the number of (key, line) pairs in every block of a sorted chunk file
+chunk_block_size = 4096
+# the memory a sorted chunk takes in python objects, relative to the size of its lines
+memory_overhead = 4
 
 
-def merge(key=None, *iterables):
-    # based on code posted by Scott David Daniels in c.l.p.
-    # http://groups.google.com/group/comp.lang.python/msg/484f01f1ea3c832d
+def get_sorted_path(input_file: str, prefix: str = 'sorted_') -> str:
+    """
+    :return: the path of the sorted version of the input file, in the directory of the input file
+    """
+    directory, name = os.path.split(input_file)
+    return os.path.join(directory, prefix + name)
 
-    if key is None:
-        keyed_iterables = iterables
-    else:
-        keyed_iterables = [(Keyed(key(obj), obj) for obj in iterable)
-                            for iterable in iterables]
-    for element in heapq.merge(*keyed_iterables):
-        yield element.obj
 
+def get_line_key(line: bytes, key_index: int, key_type: typing.Callable[[str], typing.Any]):
+    """
+    :return: the key of a line, the attribute in key_index converted by key_type
+    """
+    return key_type(line.split(b',', key_index + 1)[key_index].strip().decode())
 
-def batch_sort(input_file, output_file, key, buffer_size=32000, tempdirs=None):
+
+def is_sorted(input_file: str, key_index: int, key_type: typing.Callable[[str], typing.Any]) -> bool:
     """
-    sorts a batch from the input file
-    :param input_file: input file name
-    :param output_file: output file name
-    :param key: key to sort by
-    :param buffer_size: buffer size for the batch
-    :param tempdirs: temporary directories to use for sorting, if None then a new one is made by gettempdir
+    :return: whether the lines of the input file are sorted by their keys. The file is read until the first line out of
+    order, and only the keys of the lines are decoded
     """
-    if tempdirs is None:
-        tempdirs = []
-    if not tempdirs:
-        tempdirs.append(gettempdir())
+    previous_key = None
+    with open(input_file, 'rb', read_buffer_size) as input_stream:
+        for line in input_stream:
+            if not line.strip():
+                continue
+            key = get_line_key(line, key_index, key_type)
+            if previous_key is not None and key < previous_key:
+                return False
+            previous_key = key
+    return True
 
-    chunks = []
-    try:
-        with open(input_file, 'rb', 64 * 1024) as input_file:
-            input_iterator = iter(input_file)
-            for tempdir in cycle(tempdirs):
-                current_chunk = list(islice(input_iterator, buffer_size))
-                if not current_chunk:
-                    break
-                current_chunk.sort(key=key)
-                output_chunk = open(os.path.join(tempdir,'%06i'%len(chunks)), 'w+b',64*1024)
-                chunks.append(output_chunk)
-                output_chunk.writelines(current_chunk)
-                output_chunk.flush()
-                output_chunk.seek(0)
-        with open(output_file, 'wb', 64 * 1024) as output_file:
-            output_file.writelines(merge(key, *chunks))
-    finally:
-        for chunk in chunks:
-            try:
-                chunk.close()
-                os.remove(chunk.name)
-            except Exception:
-                pass
+
+def get_chunk_offsets(input_file: str, chunk_size: int) -> typing.List[typing.Tuple[int, int]]:
+    """
+    :return: (start, end) offsets of consecutive chunks of about chunk_size bytes, starting at line starts
+    """
+    size = os.path.getsize(input_file)
+    starts = [0]
+    with open(input_file, 'rb') as input_stream:
+        while starts[-1] + chunk_size < size:
+            input_stream.seek(starts[-1] + chunk_size - 1)
+            input_stream.readline()
+            if input_stream.tell() >= size:
+                break
+            starts.append(input_stream.tell())
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def read_sorted_chunk(input_file: str, start: int, end: int, key_index: int,
+                      key_type: typing.Callable[[str], typing.Any]) -> typing.List[typing.Tuple]:
+    """
+    :return: the (key, line) pairs of the non empty lines between the offsets, stably sorted by their keys. Every line
+    ends with a line break, so lines can be concatenated in any order
+    """
+    with open(input_file, 'rb') as input_stream:
+        input_stream.seek(start)
+        data = input_stream.read(end - start)
+    keyed_lines = [(get_line_key(line, key_index, key_type), line + b'\n')
+                   for line in data.split(b'\n') if line.strip()]
+    keyed_lines.sort(key=itemgetter(0))
+    return keyed_lines
 
 
-def get_key(time_attribute_index):
-    return lambda line: int(str(line).split(',')[time_attribute_index])
+def sort_chunk(input_file: str, start: int, end: int, key_index: int, key_type: typing.Callable[[str], typing.Any],
+               chunk_path: str) -> str:
+    """
+    sorts a chunk of the input file (in a worker process) and saves it, with the decoded keys, to chunk_path
+    :return: chunk_path
+    """
+    keyed_lines = read_sorted_chunk(input_file, start, end, key_index, key_type)
+    with open(chunk_path, 'wb', write_buffer_size) as chunk_stream:
+        for i in range(0, len(keyed_lines), chunk_block_size):
+            pickle.dump(keyed_lines[i:i + chunk_block_size], chunk_stream, pickle.HIGHEST_PROTOCOL)
+    return chunk_path
+
+
+def read_chunk(chunk_path: str) -> typing.Iterator[typing.Tuple]:
+    """
+    :return: an iterator over the (key, line) pairs of a sorted chunk file
+    """
+    with open(chunk_path, 'rb', read_buffer_size) as chunk_stream:
+        while True:
+            try:
+                block = pickle.load(chunk_stream)
+            except EOFError:
+                return
+            yield from block
 
 
-def sort_file(time_attribute_index, input_file: str, output_file: str):
-    batch_sort(input_file, output_file, get_key(time_attribute_index))
+def sort_file(time_attribute_index: int, input_file: str, output_file: str = None,
+              key_type: typing.Callable[[str], typing.Any] = int, memory_budget: int = 1 << 28,
+              workers_num: int = None, tempdir: str = None) -> str:
+    """
+    sorts the lines of the input file by their time attribute (stably, lines of equal times keep their order). Chunks of
+    the file are sorted in parallel by a pool of processes, and the sorted chunks are merged by a k-way merge. Every key
+    is decoded once
+    :param time_attribute_index: the index of the attribute to sort by
+    :param input_file: input file name
+    :param output_file: output file name, by default the input file name prefixed by 'sorted_'
+    :param key_type: converts the text of the attribute to its value
+    :param memory_budget: the approximate memory (in bytes) that the chunks being sorted may take together
+    :param workers_num: the number of processes sorting chunks, by default the number of CPUs
+    :param tempdir: the directory of the sorted chunks, if None then the default temporary directory
+    :return: the path of the sorted file: the input file itself if it is already sorted, otherwise output_file
+    """
+    if output_file is None:
+        output_file = get_sorted_path(input_file)
+    if is_sorted(input_file, time_attribute_index, key_type):
+        return input_file
+    if workers_num is None:
+        workers_num = os.cpu_count() or 1
+    chunk_size = max(read_buffer_size, memory_budget // (workers_num * memory_overhead))
+    chunk_offsets = get_chunk_offsets(input_file, chunk_size)
+    if len(chunk_offsets) == 1:
+        keyed_lines = read_sorted_chunk(input_file, 0, chunk_offsets[0][1], time_attribute_index, key_type)
+        with open(output_file, 'wb', write_buffer_size) as output_stream:
+            output_stream.writelines(map(itemgetter(1), keyed_lines))
+        return output_file
+    chunks_directory = tempfile.mkdtemp(dir=tempdir)
+    try:
+        with ProcessPoolExecutor(min(workers_num, len(chunk_offsets))) as executor:
+            futures = [executor.submit(sort_chunk, input_file, start, end, time_attribute_index, key_type,
+                                       os.path.join(chunks_directory, '%06i' % i))
+                       for i, (start, end) in enumerate(chunk_offsets)]
+            chunk_paths = [future.result() for future in futures]
+        merged = heapq.merge(*[read_chunk(chunk_path) for chunk_path in chunk_paths], key=itemgetter(0))
+        with open(output_file, 'wb', write_buffer_size) as output_stream:
+            output_stream.writelines(map(itemgetter(1), merged))
+    finally:
+        shutil.rmtree(chunks_directory, ignore_errors=True)
+    return output_file
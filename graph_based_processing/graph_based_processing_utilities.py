@@ -1,6 +1,9 @@
 from .. import processing_utilities
 from .pattern_query_graph import *
+from .pattern_statistics import PatternStatistics
 import typing
+import math
+import random
 
 
 class GraphInitializer:
@@ -8,10 +11,90 @@ class GraphInitializer:
     abstract class initializing the evaluation graph
     """
 
-    def get_graph(self, pattern_query: processing_utilities.CleanPatternQuery,
-                  output_interface: processing_utilities.OutputInterface = processing_utilities.TrivialOutputInterface()) \
-            -> PatternQueryGraph:
-        pass
+    def __init__(self, memory_model_factory: typing.Callable[[typing.Any, bool], processing_utilities.MemoryModel]
+                 = None, use_join_indexes=True, push_down_conditions=True):
+        """
+        :param memory_model_factory: receives the identifier of a node and whether it is an event node and returns
+        a new memory model for the node (for example processing_utilities.TimeOrderedMemoryModel()).
+        If None every node uses a processing_utilities.ListWrapper
+        :param use_join_indexes: if True, children of condition nodes that join on an equality condition get a hash
+        index memory model (instead of the one returned by memory_model_factory), see set_join_indexes
+        :param push_down_conditions: if True, conditions of a single event are checked by its event node, see
+        split_event_conditions
+        """
+        self.memory_model_factory = memory_model_factory
+        self.use_join_indexes = use_join_indexes
+        self.push_down_conditions = push_down_conditions
+
+    def create_memory_model(self, identifier, is_event_node: bool) -> processing_utilities.MemoryModel:
+        """
+        :param identifier: the identifier of the node (event identifier for event nodes)
+        :param is_event_node: True if the node is an event node, False if it is a condition node
+        :return: a new memory model for the node
+        """
+        if self.memory_model_factory is None:
+            return processing_utilities.ListWrapper()
+        return self.memory_model_factory(identifier, is_event_node)
+
+    def split_event_conditions(self, conditions: typing.List[processing_utilities.Condition]) \
+            -> typing.Tuple[typing.Dict[typing.Any, typing.List[processing_utilities.Condition]],
+                            typing.List[processing_utilities.Condition]]:
+        """
+        :return: the conditions of a single event by its identifier, which are given to the event nodes so events
+        failing them are never buffered or joined, and the other conditions. If push_down_conditions is False all the
+        conditions are returned as other conditions
+        """
+        if not self.push_down_conditions:
+            return {}, list(conditions)
+        event_conditions = {}
+        other_conditions = []
+        for condition in conditions:
+            if len(set(condition.event_identifiers)) == 1:
+                event_conditions.setdefault(condition.event_identifiers[0], []).append(condition)
+            else:
+                other_conditions.append(condition)
+        return event_conditions, other_conditions
+
+    def set_join_indexes(self, condition_node: ConditionNode):
+        """
+        gives every child of the condition node that is compared by one of the node's comparison conditions to an
+        event of another child an index on the compared attribute, so the node only combines matching partial results.
+        Equality conditions get a hash index and are preferred over inequality conditions, which get a range index
+        :param condition_node: a condition node whose children and conditions are already set
+        """
+        if not self.use_join_indexes:
+            return
+        comparisons = [condition.comparison for condition in condition_node.conditions
+                       if condition.comparison is not None]
+        comparisons.sort(key=lambda comparison: comparison.relation != '==')
+        for child in condition_node.children:
+            child_identifiers = child.get_identifiers()
+            for comparison in comparisons:
+                if comparison.first_identifier in child_identifiers and \
+                        comparison.second_identifier not in child_identifiers:
+                    identifier = comparison.first_identifier
+                elif comparison.second_identifier in child_identifiers and \
+                        comparison.first_identifier not in child_identifiers:
+                    identifier = comparison.second_identifier
+                else:
+                    continue
+                index_type = processing_utilities.HashIndexMemoryModel if comparison.relation == '==' \
+                    else processing_utilities.RangeIndexMemoryModel
+                index = index_type(identifier, comparison.get_attribute(identifier))
+                if isinstance(child.partial_results_buffer, processing_utilities.BoundedMemoryModel):
+                    child.partial_results_buffer.memory_model = index
+                else:
+                    child.partial_results_buffer = index
+                break
+
+    @staticmethod
+    def set_root_node(root_node: Node, output_interface: processing_utilities.OutputInterface):
+        """
+        sets the output interface of the root node of a graph. The memory model of the root holds matches rather than
+        partial matches, so it is replaced by an unbounded one (see processing_utilities.BoundedMemoryModel)
+        """
+        root_node.partial_results_buffer = root_node.partial_results_buffer.get_unbounded()
+        root_node.set_output_interface(output_interface)
 
 
 class TestingTree(GraphInitializer):
@@ -30,17 +113,18 @@ class TestingTree(GraphInitializer):
         stocks = ['AAME', 'ZHNE', 'AAME', 'MCRS']
         stock_types_with_identifiers = \
             [processing_utilities.EventTypeOrPatternAndIdentifier(type, i) for i, type in enumerate(stocks)]
-        root_node = ConditionNode(processing_utilities.ListWrapper(), processing_utilities.Seq([-1, -3]),
+        root_node = ConditionNode(self.create_memory_model(-2, False), processing_utilities.Seq([-1, -3]),
                                   pattern_query.time_limit, identifier=-2,
                                   conditions=[processing_utilities.Condition(conditions1, [0, 3])])
-        root_node.set_output_interface(output_interface)
-        left_son = ConditionNode(processing_utilities.ListWrapper(), processing_utilities.And(),
+        self.set_root_node(root_node, output_interface)
+        left_son = ConditionNode(self.create_memory_model(-1, False), processing_utilities.And(),
                                  pattern_query.time_limit, identifier=-1,
                                  conditions=[processing_utilities.Condition(conditions2, [0, 1])])
-        right_son = ConditionNode(processing_utilities.ListWrapper(), processing_utilities.And(),
+        right_son = ConditionNode(self.create_memory_model(-3, False), processing_utilities.And(),
                                   pattern_query.time_limit, identifier=-3,
                                   conditions=[])
-        events = [EventNode(processing_utilities.ListWrapper(), pattern_query.time_limit, stock_and_id)
+        events = [EventNode(self.create_memory_model(stock_and_id.identifier, True), pattern_query.time_limit,
+                            stock_and_id)
                   for stock_and_id in stock_types_with_identifiers]
         left_son.set_children([events[0], events[1]])
         right_son.set_children([events[2], events[3]])
@@ -51,7 +135,9 @@ class TestingTree(GraphInitializer):
         events[1].set_parent(left_son)
         events[2].set_parent(right_son)
         events[3].set_parent(right_son)
-        graph = PatternQueryGraph(root_node, events)
+        for condition_node in [left_son, right_son, root_node]:
+            self.set_join_indexes(condition_node)
+        graph = PatternQueryGraph(root_node, events, [left_son, right_son, root_node])
         return graph
 
 
@@ -73,7 +159,7 @@ class LeftDeepTreeInitializer(GraphInitializer):
 
         def get_params_to_operator_construction():
             if operator_type == processing_utilities.Seq or operator_type == processing_utilities.And:
-                return [initial_condition_node_identifier + 1, i]
+                return [old_parent.get_partial_results_identifier(), events[i].identifier]
 
         operator = pattern_query.event_pattern.operator
         operator_type = type(operator)
@@ -85,21 +171,23 @@ class LeftDeepTreeInitializer(GraphInitializer):
         # our own condition node identifiers
         initial_condition_node_identifier = -1
         events_num = len(events)
-        conditions = pattern_query.conditions
+        event_conditions, conditions = self.split_event_conditions(pattern_query.conditions)
         inner_nodes = []
-        old_parent = EventNode(processing_utilities.ListWrapper(), pattern_query.time_limit, events[0])
+        old_parent = EventNode(self.create_memory_model(events[0].identifier, True), pattern_query.time_limit,
+                               events[0], conditions=event_conditions.get(events[0].identifier, []))
         leaves = [old_parent]
         seen_events = {events[0].identifier}
 
         # building the tree bottom-up
         if events_num > 1:
             for i in range(1, events_num):
-                right_child = EventNode(processing_utilities.ListWrapper(), pattern_query.time_limit,
-                                        events[i])
+                right_child = EventNode(self.create_memory_model(events[i].identifier, True),
+                                        pattern_query.time_limit, events[i],
+                                        conditions=event_conditions.get(events[i].identifier, []))
                 identifier = events[i].identifier
                 seen_events.add(identifier)
                 leaves.append(right_child)
-                new_parent = ConditionNode(processing_utilities.ListWrapper(),
+                new_parent = ConditionNode(self.create_memory_model(initial_condition_node_identifier, False),
                                            operator_type(get_params_to_operator_construction()),
                                            pattern_query.time_limit, [old_parent, right_child],
                                            initial_condition_node_identifier)
@@ -111,6 +199,7 @@ class LeftDeepTreeInitializer(GraphInitializer):
                     else:
                         new_conditions.append(condition)
                 conditions = new_conditions
+                self.set_join_indexes(new_parent)
                 old_parent.set_parent(new_parent)
                 right_child.set_parent(new_parent)
                 old_parent = new_parent
@@ -118,11 +207,274 @@ class LeftDeepTreeInitializer(GraphInitializer):
                 initial_condition_node_identifier -= 1
 
         root_node = new_parent if events_num > 1 else old_parent
-        root_node.set_output_interface(output_interface)
+        self.set_root_node(root_node, output_interface)
         pattern_query_graph = PatternQueryGraph(root_node, leaves, inner_nodes, pattern_query.use_const_window)
         return pattern_query_graph
 
 
+class TreePlan:
+    """
+    A node of an evaluation plan chosen by CostBasedTreeInitializer. A leaf holds a single event of the pattern and an
+    inner node joins the events of its two children
+    """
+    def __init__(self, positions: int, cardinality: float, cost: float, left=None, right=None):
+        """
+        :param positions: bit mask of the positions of the pattern events that this node covers
+        :param cardinality: estimated number of partial results that this node holds
+        :param cost: estimated number of partial results held by this node and all the nodes below it
+        :param left: left child plan (None for a leaf)
+        :param right: right child plan (None for a leaf)
+        """
+        self.positions = positions
+        self.cardinality = cardinality
+        self.cost = cost
+        self.left = left
+        self.right = right
+
+    def is_leaf(self) -> bool:
+        return self.left is None
+
+
+class CostBasedTreeInitializer(GraphInitializer):
+    """
+    This class chooses the evaluation tree of a pattern query by its estimated cost, the expected number of partial
+    results held by all of its nodes, given the arrival rates of the event types and the selectivities of the conditions
+    (see PatternStatistics). Like ZStream it searches left deep and bushy trees by dynamic programming over the subsets
+    of the pattern events: contiguous ranges of the seq order for Seq patterns, and all subsets for And patterns (or
+    contiguous ranges of the declaration order if the pattern has more than max_bushy_events events).
+    This class cannot implement operator nesting.
+    """
+    max_bushy_events = 12
+
+    def __init__(self, statistics: PatternStatistics = None, sample_events: typing.Iterable = None,
+                 samples_num: int = 1000,
+                 memory_model_factory: typing.Callable[[typing.Any, bool], processing_utilities.MemoryModel] = None,
+                 use_join_indexes=True, push_down_conditions=True, seed=0):
+        """
+        :param statistics: the statistics to estimate costs by. If None they are estimated for every pattern query
+        from sample_events
+        :param sample_events: a time ordered sample of the stream (for example itertools.islice(processor.get_events(),
+        10000)). If both statistics and sample_events are None all rates and selectivities are assumed equal
+        :param samples_num: maximal number of combinations of sampled events to estimate a condition's selectivity by
+        :param memory_model_factory: see GraphInitializer
+        :param use_join_indexes: see GraphInitializer
+        :param push_down_conditions: see GraphInitializer
+        :param seed: the seed of the combinations of sampled events, so the plans chosen for a sample are reproducible
+        """
+        super().__init__(memory_model_factory, use_join_indexes, push_down_conditions)
+        self.statistics = statistics
+        self.sample_events = list(sample_events) if sample_events is not None else None
+        self.samples_num = samples_num
+        self.seed = seed
+        self.last_plan = None
+        self.last_events = None
+        self.last_operator_name = None
+        self.last_left_deep_cost = None
+
+    def get_statistics(self, pattern_query: processing_utilities.CleanPatternQuery) -> PatternStatistics:
+        if self.statistics is not None:
+            return self.statistics
+        if self.sample_events is not None:
+            return PatternStatistics.from_events(self.sample_events, pattern_query, self.samples_num, self.seed)
+        return PatternStatistics()
+
+    @staticmethod
+    def get_ordered_events(pattern_query: processing_utilities.CleanPatternQuery) \
+            -> typing.List[processing_utilities.EventTypeOrPatternAndIdentifier]:
+        """
+        :return: the pattern events in seq order for a Seq pattern and in declaration order otherwise
+        """
+        operator = pattern_query.event_pattern.operator
+        events = pattern_query.event_pattern.event_types_or_patterns
+        if type(operator) != processing_utilities.Seq:
+            return list(events)
+        event_dict = {event_and_identifier.identifier: event_and_identifier for event_and_identifier in events}
+        return processing_utilities.Seq.get_sorted_by_identifier_order(event_dict, operator.identifiers_order)
+
+    def get_cardinality_function(self, pattern_query: processing_utilities.CleanPatternQuery,
+                                 statistics: PatternStatistics) -> typing.Callable[[int], float]:
+        """
+        :return: a function receiving a bit mask of positions of pattern events (see get_ordered_events) and returning
+        the estimated number of partial results holding these events
+        """
+        events = self.get_ordered_events(pattern_query)
+        events_num = len(events)
+        is_seq = type(pattern_query.event_pattern.operator) == processing_utilities.Seq
+        identifier_to_position = {event.identifier: i for i, event in enumerate(events)}
+        leaf_cardinalities = [statistics.get_arrival_rate(event.event_type_or_pattern) * pattern_query.time_limit
+                              for event in events]
+        condition_masks = []
+        for condition in pattern_query.conditions:
+            if all(identifier in identifier_to_position for identifier in condition.event_identifiers):
+                mask = sum(1 << identifier_to_position[identifier] for identifier in set(condition.event_identifiers))
+                condition_masks.append((mask, statistics.get_selectivity(condition)))
+
+        def get_cardinality(mask: int) -> float:
+            cardinality = 1.0
+            for i in range(events_num):
+                if mask & (1 << i):
+                    cardinality *= leaf_cardinalities[i]
+            for condition_mask, selectivity in condition_masks:
+                if condition_mask & mask == condition_mask:
+                    cardinality *= selectivity
+            if is_seq:
+                # only one of the orders of the events is a seq match
+                cardinality /= math.factorial(bin(mask).count('1'))
+            return cardinality
+
+        return get_cardinality
+
+    def get_plan_cost(self, plan: TreePlan, pattern_query: processing_utilities.CleanPatternQuery,
+                      statistics: PatternStatistics) -> float:
+        """
+        :return: the estimated cost of an existing plan under (possibly new) statistics
+        """
+        get_cardinality = self.get_cardinality_function(pattern_query, statistics)
+
+        def get_cost(node_plan: TreePlan) -> float:
+            cost = get_cardinality(node_plan.positions)
+            if not node_plan.is_leaf():
+                cost += get_cost(node_plan.left) + get_cost(node_plan.right)
+            return cost
+
+        return get_cost(plan)
+
+    def get_plan(self, pattern_query: processing_utilities.CleanPatternQuery, statistics: PatternStatistics) \
+            -> TreePlan:
+        """
+        :return: the evaluation plan with the lowest estimated cost
+        """
+        events_num = len(pattern_query.event_pattern.event_types_or_patterns)
+        is_seq = type(pattern_query.event_pattern.operator) == processing_utilities.Seq
+        get_cardinality = self.get_cardinality_function(pattern_query, statistics)
+        best_plans = {}
+        for i in range(events_num):
+            cardinality = get_cardinality(1 << i)
+            best_plans[1 << i] = TreePlan(1 << i, cardinality, cardinality)
+
+        def set_best_plan(mask: int, splits: typing.Iterable[typing.Tuple[int, int]]):
+            cardinality = get_cardinality(mask)
+            for left_mask, right_mask in splits:
+                left, right = best_plans[left_mask], best_plans[right_mask]
+                cost = left.cost + right.cost + cardinality
+                if mask not in best_plans or cost < best_plans[mask].cost:
+                    best_plans[mask] = TreePlan(mask, cardinality, cost, left, right)
+
+        if is_seq or events_num > self.max_bushy_events:
+            for length in range(2, events_num + 1):
+                for first in range(events_num - length + 1):
+                    mask = ((1 << length) - 1) << first
+                    left_masks = [((1 << split) - 1) << first for split in range(1, length)]
+                    set_best_plan(mask, [(left_mask, mask ^ left_mask) for left_mask in left_masks])
+        else:
+            for mask in sorted(range(1, 1 << events_num), key=lambda m: bin(m).count('1')):
+                if mask & (mask - 1) == 0:
+                    continue
+                lowest = mask & -mask
+                # the left part always holds the lowest position, so every split is considered once
+                set_best_plan(mask, ((left_mask, mask ^ left_mask) for left_mask in self._get_submasks(mask)
+                                     if left_mask & lowest and left_mask != mask))
+        self.last_left_deep_cost = sum(get_cardinality((1 << length) - 1) for length in range(2, events_num + 1)) + \
+            sum(get_cardinality(1 << i) for i in range(events_num))
+        return best_plans[(1 << events_num) - 1]
+
+    @staticmethod
+    def _get_submasks(mask: int) -> typing.Iterator[int]:
+        submask = mask
+        while submask:
+            yield submask
+            submask = (submask - 1) & mask
+
+    def get_graph(self, pattern_query: processing_utilities.CleanPatternQuery,
+                  output_interface: processing_utilities.OutputInterface = processing_utilities.TrivialOutputInterface()) \
+            -> PatternQueryGraph:
+        """
+        assumes no operator nesting
+        :param pattern_query:
+        :param output_interface:
+        :return: PatternQueryGraph.PatternQueryGraph built by the plan with the lowest estimated cost
+        """
+        return self.build_graph(self.get_plan(pattern_query, self.get_statistics(pattern_query)), pattern_query,
+                                output_interface)
+
+    def build_graph(self, plan: TreePlan, pattern_query: processing_utilities.CleanPatternQuery,
+                    output_interface: processing_utilities.OutputInterface =
+                    processing_utilities.TrivialOutputInterface()) -> PatternQueryGraph:
+        """
+        :param plan: a plan returned by get_plan for this pattern query
+        :param pattern_query:
+        :param output_interface:
+        :return: PatternQueryGraph.PatternQueryGraph built by the plan
+        """
+        events = self.get_ordered_events(pattern_query)
+        self.last_plan = plan
+        self.last_events = events
+        self.last_operator_name = type(pattern_query.event_pattern.operator).__name__
+        is_seq = type(pattern_query.event_pattern.operator) == processing_utilities.Seq
+        leaves = [None] * len(events)
+        inner_nodes = []
+        event_conditions, conditions = self.split_event_conditions(pattern_query.conditions)
+        # our own condition node identifiers
+        next_condition_node_identifier = [-1]
+
+        def build_node(node_plan: TreePlan) -> Node:
+            nonlocal conditions
+            if node_plan.is_leaf():
+                position = node_plan.positions.bit_length() - 1
+                leaves[position] = EventNode(self.create_memory_model(events[position].identifier, True),
+                                             pattern_query.time_limit, events[position],
+                                             conditions=event_conditions.get(events[position].identifier, []))
+                return leaves[position]
+            left, right = build_node(node_plan.left), build_node(node_plan.right)
+            identifier = next_condition_node_identifier[0]
+            next_condition_node_identifier[0] -= 1
+            operator = processing_utilities.Seq([left.get_partial_results_identifier(),
+                                                 right.get_partial_results_identifier()]) if is_seq \
+                else processing_utilities.And()
+            node = ConditionNode(self.create_memory_model(identifier, False), operator, pattern_query.time_limit,
+                                 [left, right], identifier)
+            node_identifiers = node.get_identifiers()
+            new_conditions = []
+            for condition in conditions:
+                if set(condition.event_identifiers).issubset(node_identifiers):
+                    node.add_condition(condition)
+                else:
+                    new_conditions.append(condition)
+            conditions = new_conditions
+            self.set_join_indexes(node)
+            left.set_parent(node)
+            right.set_parent(node)
+            inner_nodes.append(node)
+            return node
+
+        root_node = build_node(plan)
+        self.set_root_node(root_node, output_interface)
+        return PatternQueryGraph(root_node, leaves, inner_nodes, pattern_query.use_const_window)
+
+    def get_plan_report(self) -> str:
+        """
+        :return: a description of the plan chosen for the last pattern query and its estimated cost
+        """
+        if self.last_plan is None:
+            return "no plan was chosen yet"
+        lines = ["estimated cost: {:.6g} partial results (left deep tree in pattern order: {:.6g})".format(
+            self.last_plan.cost, self.last_left_deep_cost)]
+
+        def describe(node_plan: TreePlan, depth: int):
+            if node_plan.is_leaf():
+                event = self.last_events[node_plan.positions.bit_length() - 1]
+                description = "{} ({})".format(event.event_type_or_pattern, event.identifier)
+            else:
+                description = self.last_operator_name
+            lines.append("{}{}: {:.6g} partial results".format('    ' * depth, description, node_plan.cardinality))
+            if not node_plan.is_leaf():
+                describe(node_plan.left, depth + 1)
+                describe(node_plan.right, depth + 1)
+
+        describe(self.last_plan, 0)
+        return '\n'.join(lines)
+
+
 class NaiveMultipleTreesGraphBasedProcessing(processing_utilities.EvaluationModel):
     """
     This class initializes a graph for each input query.
@@ -136,6 +488,8 @@ class NaiveMultipleTreesGraphBasedProcessing(processing_utilities.EvaluationMode
         """
         self.graph_initializer = graph_initializer
         self.graphs = []
+        # routing index from an event type to the (graph, event node) pairs interested in events of this type
+        self.event_type_to_event_nodes = {}
 
     def set_pattern_queries(self, pattern_queries: typing.Iterable[processing_utilities.CleanPatternQuery],
                             output_interfaces: typing.List[processing_utilities.OutputInterface]):
@@ -145,24 +499,445 @@ class NaiveMultipleTreesGraphBasedProcessing(processing_utilities.EvaluationMode
         :param pattern_queries: the model's pattern queries
         :param output_interfaces: the corresponding output interfaces to the model's pattern queries
         """
-        self.graphs = [self.graph_initializer.get_graph(pattern_query, output_interface) for
-                       pattern_query, output_interface in zip(pattern_queries, output_interfaces)]
+        self.graphs = []
+        self.event_type_to_event_nodes = {}
+        for pattern_query, output_interface in zip(pattern_queries, output_interfaces):
+            self.add_pattern_query(pattern_query, output_interface)
+
+    def add_pattern_query(self, pattern_query: processing_utilities.CleanPatternQuery,
+                          output_interface: processing_utilities.OutputInterface =
+                          processing_utilities.TrivialOutputInterface()) -> PatternQueryGraph:
+        """
+        builds a graph for a new pattern query and adds it to the model (can be called while processing the stream)
+        :param pattern_query: the new pattern query
+        :param output_interface: the output interface corresponding to the new pattern query
+        :return: the graph that was built for the pattern query
+        """
+        graph = self.graph_initializer.get_graph(pattern_query, output_interface)
+        self.add_graph(graph)
+        return graph
+
+    def add_graph(self, graph: PatternQueryGraph):
+        """
+        adds a graph to the model and registers its event nodes in the routing index
+        :param graph: the graph to add
+        """
+        self.graphs.append(graph)
+        self._register_graph(graph)
+
+    def remove_graph(self, graph: PatternQueryGraph):
+        """
+        removes a graph from the model and unregisters its event nodes from the routing index
+        :param graph: the graph to remove (as returned by add_pattern_query or found in self.graphs)
+        """
+        self.graphs.remove(graph)
+        self._unregister_graph(graph)
+
+    def replace_graph(self, old_graph: PatternQueryGraph, new_graph: PatternQueryGraph):
+        """
+        puts new_graph in old_graph's position in the model and updates the routing index
+        """
+        self.graphs[self.graphs.index(old_graph)] = new_graph
+        self._unregister_graph(old_graph)
+        self._register_graph(new_graph)
+
+    def _register_graph(self, graph: PatternQueryGraph):
+        for event_node in graph.event_nodes:
+            self.event_type_to_event_nodes.setdefault(event_node.event_type, []).append((graph, event_node))
+
+    def _unregister_graph(self, graph: PatternQueryGraph):
+        for event_node in graph.event_nodes:
+            routes = [route for route in self.event_type_to_event_nodes.get(event_node.event_type, [])
+                      if route[0] is not graph]
+            if routes:
+                self.event_type_to_event_nodes[event_node.event_type] = routes
+            else:
+                self.event_type_to_event_nodes.pop(event_node.event_type, None)
 
     def handle_event(self, event, event_counter):
         """
-        passes the event to the model's trees in an attempt to try to add it where fit as a partial result
+        passes the event to the event nodes that are interested in its type in an attempt to try to add it where fit
+        as a partial result
         :param event: the event to add
         :param event_counter: the corresponding event counter if the pattern uses fixed window instead of time limit
         """
-        for graph in self.graphs:
+        routes = self.event_type_to_event_nodes.get(event.get_type())
+        if routes is None:
+            return
+        for graph, event_node in routes:
             if graph.use_const_window:
                 event.set_time_to_counter(event_counter)
-            for event_node in graph.event_nodes:
-                event_node.try_add_partial_result(event)
+            event_node.try_add_partial_result(event)
+
+    @staticmethod
+    def get_batch_filters(graph: PatternQueryGraph, event_node: EventNode, time_name: str) \
+            -> typing.Tuple[typing.List[processing_utilities.ConstantComparison],
+                            typing.List[processing_utilities.Condition]]:
+        """
+        :return: the constant comparisons of the event node's conditions, which can be applied to a whole batch, and the
+        other conditions. Comparisons of the time attribute in constant window graphs are not applied to the batch, as
+        the time of every event is replaced by its counter before its conditions are checked
+        """
+        comparisons = []
+        conditions = []
+        for condition in event_node.conditions:
+            comparison = condition.constant_comparison \
+                if isinstance(condition, processing_utilities.CompiledCondition) else None
+            if comparison is None or (graph.use_const_window and comparison.attribute == time_name):
+                conditions.append(condition)
+            else:
+                comparisons.append(comparison)
+        return comparisons, conditions
+
+    def handle_event_batch(self, batch: processing_utilities.EventBatch, first_counter: int):
+        """
+        handles the events of a batch as handle_event handles them one by one, but finds the events of every event node
+        by a vectorized type mask and filters them by the node's constant comparisons for the whole batch. Only the
+        remaining events are passed to the event nodes, in the order of the batch (and for every event, in the order of
+        its routes), so the results are the same
+        :param batch: the events to handle
+        :param first_counter: the event counter of the first event in the batch
+        """
+        pending = []
+        for event_type, routes in self.event_type_to_event_nodes.items():
+            indices = batch.get_type_indices(event_type)
+            if len(indices) == 0:
+                continue
+            for route_index, (graph, event_node) in enumerate(routes):
+                comparisons, conditions = self.get_batch_filters(graph, event_node, batch.time_name)
+                if comparisons:
+                    route_indices, failed_comparisons = batch.filter(indices, comparisons)
+                    if failed_comparisons:
+                        conditions = [condition for condition in event_node.conditions
+                                      if condition in conditions or condition.constant_comparison in failed_comparisons]
+                else:
+                    route_indices = indices
+                pending.extend((index, route_index, graph, event_node, conditions) for index in route_indices)
+        pending.sort(key=lambda item: (item[0], item[1]))
+        for index, _, graph, event_node, conditions in pending:
+            event = batch.events[index]
+            if graph.use_const_window:
+                event.set_time_to_counter(first_counter + index)
+            event_node.try_add_partial_result(event, conditions)
 
     def get_results(self) -> typing.List[typing.List]:
         return [graph.root_node.get_results() for graph in self.graphs]
 
+    def get_shedding_statistics(self) -> typing.List[typing.Dict]:
+        """
+        :return: for every query, the number of partial matches dropped by the bounded memory models of its graph (see
+        processing_utilities.BoundedMemoryModel) and the estimated recall loss, the part of its matches that were lost.
+        Every node is assumed to lose its part of the new partial matches of its parent independently, so the recall is
+        the product of the parts that were kept
+        """
+        statistics = []
+        for graph in self.graphs:
+            dropped = 0
+            recall = 1.0
+            for node in graph.event_nodes + graph.inner_nodes:
+                if isinstance(node.partial_results_buffer, processing_utilities.BoundedMemoryModel):
+                    node_statistics = node.partial_results_buffer.get_shedding_statistics()
+                    dropped += node_statistics['dropped']
+                    recall *= 1 - node_statistics['estimated_recall_loss']
+            statistics.append({'dropped': dropped, 'estimated_recall_loss': 1 - recall})
+        return statistics
+
     def clear(self):
         for g in self.graphs:
             g.clear()
+
+
+class SharedMultipleTreesGraphBasedProcessing(NaiveMultipleTreesGraphBasedProcessing):
+    """
+    This class initializes a graph for each input query, like NaiveMultipleTreesGraphBasedProcessing, but merges
+    equivalent nodes of different graphs into a single node: event nodes of the same type, identifier, conditions,
+    window and memory model, and condition nodes with the same operator, children, identifier, conditions, window and
+    memory model (so a node keeps the join index chosen for it by set_join_indexes). The graphs then
+    form a DAG in which a shared node saves and builds its partial results once and diffuses them to the parents it has
+    in all the graphs. Root nodes are never shared, so every query keeps its own matches and output interface.
+    """
+
+    def __init__(self, graph_initializer: GraphInitializer):
+        super().__init__(graph_initializer)
+        self.signature_to_node = {}
+        # number of graphs every node of the DAG belongs to, and the signature it was registered by
+        self.node_to_graphs_num = {}
+        self.node_to_signature = {}
+
+    def set_pattern_queries(self, pattern_queries: typing.Iterable[processing_utilities.CleanPatternQuery],
+                            output_interfaces: typing.List[processing_utilities.OutputInterface]):
+        self.signature_to_node = {}
+        self.node_to_graphs_num = {}
+        self.node_to_signature = {}
+        super().set_pattern_queries(pattern_queries, output_interfaces)
+
+    @staticmethod
+    def get_condition_signature(condition: processing_utilities.Condition) -> tuple:
+        """
+        :return: a key that is equal for conditions that are known to be equivalent: the same condition function on the
+        same identifiers, the same attribute comparison or the same compiled expression
+        """
+        comparison = condition.comparison
+        if comparison is not None:
+            return (comparison.first_identifier, comparison.first_attribute, comparison.relation,
+                    comparison.second_identifier, comparison.second_attribute)
+        if isinstance(condition, processing_utilities.CompiledCondition):
+            return condition.expression, tuple(condition.event_identifiers)
+        return condition.condition_apply_function, tuple(condition.event_identifiers)
+
+    @staticmethod
+    def get_memory_model_signature(memory_model: processing_utilities.MemoryModel) -> tuple:
+        """
+        :return: a key that is equal for memory models of the same type, indexing their partial results (if they do) on
+        the same attribute of the same identifier
+        """
+        index = memory_model.get_attribute_index()
+        if index is None:
+            return type(memory_model), None
+        return type(memory_model), type(index), index.identifier, index.attribute_name
+
+    def get_node_signature(self, node: Node, children_signatures: typing.List[tuple], use_const_window: bool) -> tuple:
+        """
+        :param children_signatures: the signatures of the node's children (empty for event nodes)
+        :return: a key that is equal for nodes that build the same partial results and save them the same way
+        """
+        conditions = frozenset(self.get_condition_signature(condition) for condition in node.conditions)
+        memory_model = self.get_memory_model_signature(node.partial_results_buffer)
+        if isinstance(node, EventNode):
+            return EventNode, node.event_type, node.event_identifier, conditions, node.time_limit, use_const_window, \
+                memory_model
+        operator = node.operator
+        identifiers_order = tuple(operator.identifiers_order) if isinstance(operator, processing_utilities.Seq) \
+            else None
+        return ConditionNode, type(operator), identifiers_order, node.identifier, tuple(children_signatures), \
+            conditions, node.time_limit, use_const_window, memory_model
+
+    def share_nodes(self, graph: PatternQueryGraph):
+        """
+        replaces every node of the graph that is equivalent to a node of a previously added graph by that node, and
+        registers the remaining nodes for sharing with graphs added later
+        """
+        node_to_shared_node = {}
+
+        def share(node: Node) -> tuple:
+            children_signatures = []
+            if isinstance(node, ConditionNode):
+                children_signatures = [share(child) for child in node.children]
+            signature = self.get_node_signature(node, children_signatures, graph.use_const_window)
+            if node is not graph.root_node and signature in self.signature_to_node:
+                node_to_shared_node[node] = self.signature_to_node[signature]
+                return signature
+            if isinstance(node, ConditionNode):
+                node.set_children([node_to_shared_node[child] for child in node.children])
+                for child in node.children:
+                    child.add_parent(node)
+            if node is not graph.root_node:
+                self.signature_to_node[signature] = node
+                self.node_to_signature[node] = signature
+            node_to_shared_node[node] = node
+            return signature
+
+        share(graph.root_node)
+        graph.event_nodes = [node_to_shared_node[event_node] for event_node in graph.event_nodes]
+        graph.inner_nodes = [node_to_shared_node[inner_node] for inner_node in graph.inner_nodes]
+
+    @staticmethod
+    def get_graph_nodes(graph: PatternQueryGraph) -> set:
+        return set(graph.event_nodes + graph.inner_nodes + [graph.root_node])
+
+    def _register_graph(self, graph: PatternQueryGraph):
+        self.share_nodes(graph)
+        for node in self.get_graph_nodes(graph):
+            self.node_to_graphs_num[node] = self.node_to_graphs_num.get(node, 0) + 1
+            # a shared event node is routed once, by the first graph that uses it
+            if isinstance(node, EventNode) and self.node_to_graphs_num[node] == 1:
+                self.event_type_to_event_nodes.setdefault(node.event_type, []).append((graph, node))
+
+    def _unregister_graph(self, graph: PatternQueryGraph):
+        graph_nodes = self.get_graph_nodes(graph)
+        removed_nodes = set()
+        for node in graph_nodes:
+            self.node_to_graphs_num[node] -= 1
+            if self.node_to_graphs_num[node] == 0:
+                removed_nodes.add(node)
+                del self.node_to_graphs_num[node]
+                signature = self.node_to_signature.pop(node, None)
+                if signature is not None:
+                    del self.signature_to_node[signature]
+        for node in graph_nodes - removed_nodes:
+            node.parents = [parent for parent in node.parents if parent not in removed_nodes]
+        for event_node in graph.event_nodes:
+            if event_node not in removed_nodes:
+                continue
+            routes = [route for route in self.event_type_to_event_nodes.get(event_node.event_type, [])
+                      if route[1] is not event_node]
+            if routes:
+                self.event_type_to_event_nodes[event_node.event_type] = routes
+            else:
+                self.event_type_to_event_nodes.pop(event_node.event_type, None)
+
+    def get_shared_nodes_num(self) -> int:
+        """
+        :return: the number of nodes that belong to more than one graph
+        """
+        return sum(1 for graphs_num in self.node_to_graphs_num.values() if graphs_num > 1)
+
+    def clear(self):
+        for node in self.node_to_graphs_num:
+            node.clear()
+
+
+class AdaptiveGraphBasedProcessing(NaiveMultipleTreesGraphBasedProcessing):
+    """
+    This class evaluates every query by a tree chosen by a CostBasedTreeInitializer and keeps track of live statistics:
+    the arrival rate of the event types of the event nodes and the selectivity of the conditions on the events currently
+    in the window. Every check_interval events it re-estimates the cost of each query's current plan, and if it exceeds
+    replan_threshold times the cost of the best plan for the new statistics, the query's graph is rebuilt by the best
+    plan and the events in the window are replayed into it. Matches made only of replayed events were already found
+    by the old graph, so they are discarded, and no match is lost or duplicated.
+    """
+
+    def __init__(self, graph_initializer: CostBasedTreeInitializer = None, check_interval: int = 10000,
+                 replan_threshold: float = 1.5, samples_num: int = 1000, seed=0):
+        """
+        :param graph_initializer: the initializer building and costing the plans (a new CostBasedTreeInitializer with no
+        statistics if None)
+        :param check_interval: number of events between checks of the plans
+        :param replan_threshold: a query is re-planned if the cost of its plan is larger than the cost of the best plan
+        by this factor
+        :param samples_num: maximal number of combinations of events to estimate a condition's selectivity by
+        :param seed: the seed of the combinations of events in the window, so the re-plannings are reproducible
+        """
+        super().__init__(graph_initializer if graph_initializer is not None else CostBasedTreeInitializer())
+        self.check_interval = check_interval
+        self.replan_threshold = replan_threshold
+        self.samples_num = samples_num
+        self.random = random.Random(seed)
+        # per graph (by position in self.graphs): its query, output interface, plan and results of replaced graphs
+        self.pattern_queries = []
+        self.output_interfaces = []
+        self.plans = []
+        self.replaced_graphs_results = []
+        # (event counter, query index, cost of the old plan, cost of the new plan) of every re-planning
+        self.replanning_log = []
+        self.type_counts = {}
+        self.events_since_check = 0
+        self.period_start_time = None
+
+    def set_pattern_queries(self, pattern_queries: typing.Iterable[processing_utilities.CleanPatternQuery],
+                            output_interfaces: typing.List[processing_utilities.OutputInterface]):
+        self.pattern_queries = []
+        self.output_interfaces = []
+        self.plans = []
+        self.replaced_graphs_results = []
+        super().set_pattern_queries(pattern_queries, output_interfaces)
+
+    def add_pattern_query(self, pattern_query: processing_utilities.CleanPatternQuery,
+                          output_interface: processing_utilities.OutputInterface =
+                          processing_utilities.TrivialOutputInterface()) -> PatternQueryGraph:
+        graph = super().add_pattern_query(pattern_query, output_interface)
+        self.pattern_queries.append(pattern_query)
+        self.output_interfaces.append(output_interface)
+        self.plans.append(self.graph_initializer.last_plan)
+        self.replaced_graphs_results.append([])
+        return graph
+
+    def remove_graph(self, graph: PatternQueryGraph):
+        index = self.graphs.index(graph)
+        super().remove_graph(graph)
+        for per_graph in (self.pattern_queries, self.output_interfaces, self.plans, self.replaced_graphs_results):
+            del per_graph[index]
+
+    def handle_event(self, event, event_counter):
+        event_type = event.get_type()
+        if event_type in self.event_type_to_event_nodes:
+            self.type_counts[event_type] = self.type_counts.get(event_type, 0) + 1
+        if self.period_start_time is None:
+            self.period_start_time = event.get_time()
+        super().handle_event(event, event_counter)
+        self.events_since_check += 1
+        if self.events_since_check >= self.check_interval:
+            self.check_plans(event, event_counter)
+
+    def handle_event_batch(self, batch: processing_utilities.EventBatch, first_counter: int):
+        """
+        the events are handled one by one, as the live statistics count every event
+        """
+        processing_utilities.EvaluationModel.handle_event_batch(self, batch, first_counter)
+
+    @staticmethod
+    def get_window_events(graph: PatternQueryGraph) -> typing.Dict:
+        """
+        :return: mapping from event identifier to the events currently saved in its event node
+        """
+        return {event_node.event_identifier: [event for partial_result in event_node.partial_results_buffer
+                                              for event in partial_result.events]
+                for event_node in graph.event_nodes}
+
+    def get_live_statistics(self, graph: PatternQueryGraph, pattern_query: processing_utilities.CleanPatternQuery,
+                            duration) -> PatternStatistics:
+        """
+        :param duration: the duration (in time units, or events for constant windows) of the current period
+        :return: the arrival rates measured in the current period and the selectivities of the conditions on the
+        events currently in the window
+        """
+        duration = duration if duration > 0 else 1
+        arrival_rates = {event_type: count / duration for event_type, count in self.type_counts.items()}
+        identifier_to_events = self.get_window_events(graph)
+        selectivities = {condition: PatternStatistics.estimate_selectivity(condition, identifier_to_events,
+                                                                           self.samples_num, self.random)
+                         for condition in pattern_query.conditions}
+        return PatternStatistics(arrival_rates, selectivities, default_arrival_rate=0.5 / duration)
+
+    def check_plans(self, event, event_counter):
+        """
+        re-plans every query whose current plan became too expensive relative to the best plan for the live statistics,
+        and starts a new statistics period
+        :param event: the last handled event
+        :param event_counter: the counter of the last handled event
+        """
+        for i, graph in enumerate(list(self.graphs)):
+            pattern_query = self.pattern_queries[i]
+            duration = self.events_since_check if pattern_query.use_const_window else \
+                event.get_time() - self.period_start_time
+            statistics = self.get_live_statistics(graph, pattern_query, duration)
+            current_cost = self.graph_initializer.get_plan_cost(self.plans[i], pattern_query, statistics)
+            best_plan = self.graph_initializer.get_plan(pattern_query, statistics)
+            if current_cost > self.replan_threshold * best_plan.cost:
+                self.replace_plan(i, best_plan)
+                self.replanning_log.append((event_counter, i, current_cost, best_plan.cost))
+        self.type_counts = {}
+        self.events_since_check = 0
+        self.period_start_time = event.get_time()
+
+    def replace_plan(self, index: int, plan: TreePlan):
+        """
+        replaces the graph of a query by a graph built by the given plan, and moves the partial results in the window
+        into it by replaying the events of the old graph's event nodes through the new graph
+        :param index: the index of the query
+        :param plan: the new plan of the query
+        """
+        old_graph = self.graphs[index]
+        new_graph = self.graph_initializer.build_graph(plan, self.pattern_queries[index],
+                                                       self.output_interfaces[index])
+        self.replaced_graphs_results[index].extend(old_graph.root_node.get_results())
+        events = {}
+        for window_events in self.get_window_events(old_graph).values():
+            for event in window_events:
+                events[id(event)] = event
+        root_node = new_graph.root_node
+        output_interface = root_node.output_interface
+        # matches made only of replayed events were already reported by the old graph
+        root_node.set_output_interface(None)
+        for event in sorted(events.values(), key=lambda replayed_event: replayed_event.get_time()):
+            for event_node in new_graph.event_nodes:
+                if event_node.event_type == event.get_type():
+                    event_node.try_add_partial_result(event)
+        root_node.clear()
+        root_node.set_output_interface(output_interface)
+        self.replace_graph(old_graph, new_graph)
+        self.plans[index] = plan
+
+    def get_results(self) -> typing.List[typing.List]:
+        return [replaced_graphs_results + graph.root_node.get_results()
+                for replaced_graphs_results, graph in zip(self.replaced_graphs_results, self.graphs)]
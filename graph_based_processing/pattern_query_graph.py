@@ -17,29 +17,74 @@ class Node:
         if conditions is None:
             self.conditions = []
         self.conditions = conditions if conditions else []
-        self.parent = parent
+        # a node shared by several graphs (see SharedMultipleTreesGraphBasedProcessing) has a parent in each of them
+        self.parents = [parent] if parent is not None else []
         self.partial_results_buffer = memory_model
         self.time_limit = time_limit
 
     def add_condition(self, condition: processing_utilities.Condition):
         self.conditions.append(condition)
 
+    @property
+    def parent(self):
+        return self.parents[0] if self.parents else None
+
     def set_parent(self, parent):
-        self.parent = parent
+        self.parents = [parent] if parent is not None else []
 
-    def get_relevant_results(self, current_time):
+    def add_parent(self, parent):
+        """
+        adds another predecessor node, to which the partial results of this node are diffused as well
+        """
+        if all(existing_parent is not parent for existing_parent in self.parents):
+            self.parents.append(parent)
+
+    def get_relevant_results(self, current_time, min_start_time=None, max_start_time=None):
         """
         :param current_time: time of the current processed event
+        :param min_start_time: if given, only partial matches starting at or after it are returned
+        :param max_start_time: if given, only partial matches starting at or before it are returned
         :return: all the partial matches that are still in the time limit
         """
-        return self.partial_results_buffer.get_relevant_results(current_time, self.time_limit,
-                                                                is_sorted=type(self) == EventNode)
+        if min_start_time is None and max_start_time is None:
+            return self.partial_results_buffer.get_relevant_results(current_time, self.time_limit,
+                                                                    is_sorted=type(self) == EventNode)
+        return self.partial_results_buffer.get_results_in_time_range(current_time, self.time_limit, min_start_time,
+                                                                     max_start_time, is_sorted=type(self) == EventNode)
+
+    def get_matching_results(self, relation: str, value, current_time):
+        """
+        :param relation: a relation supported by the node's (attribute index) memory model
+        :param value: the value to compare the indexed attribute to
+        :param current_time: time of the current processed event
+        :return: all the partial matches that are still in the time limit and whose indexed attribute satisfies
+        (attribute relation value)
+        """
+        return self.partial_results_buffer.get_matching_results(relation, value, current_time, self.time_limit)
+
+    def get_identifiers(self) -> set:
+        """
+        :return: the identifiers of all the events that the partial results of this node hold
+        """
+        pass
+
+    def get_partial_results_identifier(self):
+        """
+        :return: the identifier of the partial results created by this node (as used by the parent's operator)
+        """
+        pass
+
+    def get_layout(self) -> tuple:
+        """
+        :return: the identifiers of the events that the partial results of this node hold, in the order of their slots
+        """
+        pass
 
     def get_results(self):
         """
         :return: all saved (partial, if node is not root node) matches
         """
-        return [list(partial_result.completely_unpack().values()) for partial_result in self.partial_results_buffer]
+        return [list(partial_result.events) for partial_result in self.partial_results_buffer]
 
     def clear(self):
         self.partial_results_buffer.clear()
@@ -62,20 +107,80 @@ class ConditionNode(Node):
         self.children = children
         self.operator = operator
         self.identifier = identifier
+        # the concatenation of the children's layouts, see get_layout
+        self.layout = None
+        # cache from a (diffuser child, child) pair to the key used to probe the child's hash index, see _get_join_probe
+        self.join_probes = {}
 
-    def set_output_interface(self, output_interface: processing_utilities.OutputInterface =
-    processing_utilities.TrivialOutputInterface()):
-        self.output_interface = output_interface
+    def add_condition(self, condition: processing_utilities.Condition):
+        super().add_condition(condition)
+        self.join_probes = {}
+
+    def get_identifiers(self) -> set:
+        return set().union(*(child.get_identifiers() for child in self.children))
+
+    def get_partial_results_identifier(self):
+        return self.identifier
+
+    def get_layout(self) -> tuple:
+        if self.layout is None:
+            self.layout = sum((child.get_layout() for child in self.children), ())
+        return self.layout
+
+    def _get_join_probe(self, diffuser_child: Node, child: Node):
+        """
+        :param diffuser_child: the child node that a new partial result was built in
+        :param child: another child of this node
+        :return: (identifier, attribute, relation) such that the partial results of child that can join a new partial
+        result of diffuser_child are those whose index key satisfies (key relation value), where value is the attribute
+        of the event of the identifier in the new partial result. None if child's memory model is not an attribute
+        index on one of this node's comparison conditions
+        """
+        pair = (diffuser_child, child)
+        if pair in self.join_probes:
+            return self.join_probes[pair]
+        probe = None
+        buffer = child.partial_results_buffer.get_attribute_index()
+        if buffer is not None:
+            diffuser_identifiers = diffuser_child.get_identifiers()
+            for condition in self.conditions:
+                comparison = condition.comparison
+                if comparison is None or \
+                        buffer.identifier not in (comparison.first_identifier, comparison.second_identifier) or \
+                        comparison.get_attribute(buffer.identifier) != buffer.attribute_name or \
+                        comparison.get_relation(buffer.identifier) not in buffer.supported_relations:
+                    continue
+                other_identifier = comparison.get_other_identifier(buffer.identifier)
+                if other_identifier in diffuser_identifiers:
+                    probe = (other_identifier, comparison.get_attribute(other_identifier),
+                             comparison.get_relation(buffer.identifier))
+                    break
+        self.join_probes[pair] = probe
+        return probe
 
-    def _check_conditions(self, partial_result: Union[processing_utilities.PartialResult, processing_utilities.Event])\
-            -> bool:
+    def _get_join_partners(self, child: Node, partial_result: processing_utilities.PartialResult,
+                           diffuser_child: Node, current_time):
         """
-        :param partial_result: partial_result to check
-        :return: True if partial result is within the time limit and all conditions hold, False otherwise
+        :return: the partial results of child that may be combined with the new partial result. If child is indexed on
+        a comparison condition only the partial results satisfying the comparison are returned, and if the operator
+        restricts the start time of child's partial results (as Seq does) only those in the allowed range are returned
         """
-        time_limit = partial_result.end_time - partial_result.start_time <= self.time_limit
-        return time_limit and \
-               all(condition.check_condition(partial_result) for condition in self.conditions)
+        min_start_time, max_start_time = \
+            self.operator.get_start_time_range(child.get_partial_results_identifier(), partial_result)
+        probe = self._get_join_probe(diffuser_child, child)
+        if probe is None:
+            return child.get_relevant_results(current_time, min_start_time, max_start_time)
+        identifier, attribute, relation = probe
+        value = getattr(partial_result.get_event(identifier), attribute)
+        results = child.get_matching_results(relation, value, current_time)
+        if min_start_time is None and max_start_time is None:
+            return results
+        return [result for result in results if (min_start_time is None or result.start_time >= min_start_time) and
+                (max_start_time is None or result.start_time <= max_start_time)]
+
+    def set_output_interface(self, output_interface: processing_utilities.OutputInterface =
+    processing_utilities.TrivialOutputInterface()):
+        self.output_interface = output_interface
 
     def try_add_partial_result(self, partial_result: processing_utilities.PartialResult, diffuser_child: Node):
         """
@@ -87,27 +192,34 @@ class ConditionNode(Node):
         """
         current_time = partial_result.start_time
 
-        children_buffers = [child.get_relevant_results(current_time) for child in self.children
-                            if child != diffuser_child]
-        for new_result in self.operator.get_new_results(children_buffers, partial_result, self.identifier):
-            if self._check_conditions(new_result):
-                new_result.operator_type = type(self.operator)
-                self.partial_results_buffer.add_partial_result(new_result)
-                if self.parent:
-                    self.parent.try_add_partial_result(new_result, self)
+        children_buffers = [self._get_join_partners(child, partial_result, diffuser_child, current_time)
+                            for child in self.children if child != diffuser_child]
+        # the operator only returns new results within the time limit that satisfy the conditions, which it checks
+        # while building them
+        new_results = self.operator.get_new_results(children_buffers, partial_result, self.identifier,
+                                                    self.conditions, self.time_limit, self.get_layout())
+        for child in self.children:
+            if child != diffuser_child:
+                child.partial_results_buffer.record_joins(len(new_results))
+        for new_result in new_results:
+            self.partial_results_buffer.add_partial_result(new_result)
+            for parent in self.parents:
+                parent.try_add_partial_result(new_result, self)
 
         if self.is_root() and self.output_interface is not None and \
                 self.output_interface.output_while_running():
             results = self.partial_results_buffer.pop_results()
             self.output_interface.output_results\
-                ([list(partial_result.completely_unpack().values()) for partial_result in results])
+                ([list(partial_result.events) for partial_result in results])
         return self
 
     def set_children(self, children: List[Node]):
         self.children = children
+        self.layout = None
+        self.join_probes = {}
 
     def is_root(self):
-        return self.parent is None
+        return not self.parents
 
 
 class EventNode(Node):
@@ -129,22 +241,38 @@ class EventNode(Node):
         self.event_type = event_type_and_identifier.event_type_or_pattern
         self.event_identifier = event_type_and_identifier.identifier
 
-    def _check_conditions(self, partial_result: Union[processing_utilities.PartialResult, processing_utilities.Event])\
-            -> bool:
-        return all(condition.check_condition(partial_result) for condition in self.conditions)
+    def get_identifiers(self) -> set:
+        return {self.event_identifier}
+
+    def get_partial_results_identifier(self):
+        return self.event_identifier
+
+    def get_layout(self) -> tuple:
+        return self.event_identifier,
+
+    def _check_conditions(self, partial_result: Union[processing_utilities.PartialResult, processing_utilities.Event],
+                          conditions: List[processing_utilities.Condition] = None) -> bool:
+        if conditions is None:
+            conditions = self.conditions
+        return all(condition.check_condition(partial_result) for condition in conditions)
 
-    def try_add_partial_result(self, event: processing_utilities.Event):
+    def try_add_partial_result(self, event: processing_utilities.Event,
+                               conditions: List[processing_utilities.Condition] = None):
         """
         adds a partial result if it's from the right type
         :param event: an event corresponding to this leaf node
+        :param conditions: if given, the conditions to check instead of all the node's conditions (the others are known
+        to hold for the event)
         :return: self
         """
         if self.event_type == event.get_type():
-            partial_result = processing_utilities.PartialResult({self.event_identifier: event},
-                                                                identifier=self.event_identifier)
-            if self._check_conditions(partial_result):
+            time = event.get_time()
+            partial_result = processing_utilities.PartialResult((event,), self.get_layout(), time, time,
+                                                                self.event_identifier)
+            if self._check_conditions(partial_result, conditions):
                 self.partial_results_buffer.add_partial_result(partial_result)
-                self.parent.try_add_partial_result(partial_result, self)
+                for parent in self.parents:
+                    parent.try_add_partial_result(partial_result, self)
         return self
 
 
@@ -0,0 +1,112 @@
+from .. import processing_utilities
+import typing
+import random
+import itertools
+
+
+class PatternStatistics:
+    """
+    This class holds the statistics used to estimate the cost of evaluation plans: the arrival rate of every event type
+    and the selectivity of every condition
+    """
+    def __init__(self, arrival_rates: typing.Dict = None,
+                 selectivities: typing.Dict[processing_utilities.Condition, float] = None, default_arrival_rate=1.0):
+        """
+        :param arrival_rates: mapping from event type to the number of events of that type per time unit (or per event
+        if the pattern uses a constant window)
+        :param selectivities: mapping from condition to the fraction of the combinations of events that satisfy it
+        :param default_arrival_rate: arrival rate of event types missing from arrival_rates
+        """
+        self.arrival_rates = arrival_rates if arrival_rates is not None else {}
+        self.selectivities = selectivities if selectivities is not None else {}
+        self.default_arrival_rate = default_arrival_rate
+
+    def get_arrival_rate(self, event_type) -> float:
+        return self.arrival_rates.get(event_type, self.default_arrival_rate)
+
+    def get_selectivity(self, condition: processing_utilities.Condition) -> float:
+        return self.selectivities.get(condition, 1.0)
+
+    @staticmethod
+    def get_duration(events: typing.Sequence, use_const_window=False):
+        """
+        :param events: a time ordered sample of the stream
+        :param use_const_window: if True the duration is measured in events instead of time units
+        :return: the (positive) duration of the sample
+        """
+        duration = len(events) if use_const_window or len(events) < 2 else \
+            events[-1].get_time() - events[0].get_time()
+        return duration if duration > 0 else 1
+
+    @staticmethod
+    def get_arrival_rates(events: typing.Sequence, use_const_window=False) -> typing.Dict:
+        """
+        :param events: a time ordered sample of the stream
+        :param use_const_window: if True the rates are per event instead of per time unit
+        :return: mapping from event type to its arrival rate in the sample
+        """
+        counts = {}
+        for event in events:
+            event_type = event.get_type()
+            counts[event_type] = counts.get(event_type, 0) + 1
+        duration = PatternStatistics.get_duration(events, use_const_window)
+        return {event_type: count / duration for event_type, count in counts.items()}
+
+    @staticmethod
+    def estimate_selectivity(condition: processing_utilities.Condition, identifier_to_events: typing.Dict,
+                             samples_num: int, random_generator: random.Random) -> float:
+        """
+        :param condition: the condition to estimate
+        :param identifier_to_events: mapping from identifier to the sampled events of the identifier's type
+        :param samples_num: number of random combinations of events to check the condition on
+        :param random_generator: the generator choosing the random combinations
+        :return: the fraction of the sampled combinations satisfying the condition (never zero, as the sample can
+        miss rare matches)
+        """
+        if any(not identifier_to_events.get(identifier) for identifier in condition.event_identifiers):
+            return 1.0
+        candidates = [identifier_to_events[identifier] for identifier in condition.event_identifiers]
+        combinations_num = 1
+        for events in candidates:
+            combinations_num *= len(events)
+        if combinations_num <= samples_num:
+            combinations = itertools.product(*candidates)
+        else:
+            combinations = ([random_generator.choice(events) for events in candidates] for _ in range(samples_num))
+        checked = satisfied = 0
+        for combination in combinations:
+            checked += 1
+            try:
+                if condition.condition_apply_function(*combination):
+                    satisfied += 1
+            except (TypeError, ValueError, ArithmeticError, AttributeError, KeyError):
+                pass
+        return max(satisfied, 0.5) / checked if checked else 1.0
+
+    @staticmethod
+    def from_events(events: typing.Sequence, pattern_query: processing_utilities.CleanPatternQuery,
+                    samples_num: int = 1000, seed=0):
+        """
+        estimates the statistics of a pattern query from a sample of the stream (for example the first events of the
+        input file, itertools.islice(processor.get_events(), 10000))
+        :param events: a time ordered sample of the stream
+        :param pattern_query: the pattern query whose conditions are estimated
+        :param samples_num: maximal number of combinations of events to check every condition on
+        :param seed: the seed of the random combinations, so the same sample gives the same estimates
+        :return: the estimated statistics
+        """
+        random_generator = random.Random(seed)
+        events = list(events)
+        type_to_events = {}
+        for event in events:
+            type_to_events.setdefault(event.get_type(), []).append(event)
+        identifier_to_events = {event_type_and_identifier.identifier:
+                                type_to_events.get(event_type_and_identifier.event_type_or_pattern, [])
+                                for event_type_and_identifier in pattern_query.event_pattern.event_types_or_patterns}
+        selectivities = {condition: PatternStatistics.estimate_selectivity(condition, identifier_to_events,
+                                                                           samples_num, random_generator)
+                         for condition in pattern_query.conditions}
+        arrival_rates = PatternStatistics.get_arrival_rates(events, pattern_query.use_const_window)
+        # a type missing from the sample is rarer than any sampled type, but not impossible
+        default_arrival_rate = 0.5 / PatternStatistics.get_duration(events, pattern_query.use_const_window)
+        return PatternStatistics(arrival_rates, selectivities, default_arrival_rate)
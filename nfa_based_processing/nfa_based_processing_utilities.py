@@ -0,0 +1,246 @@
+from .. import processing_utilities
+from ..graph_based_processing.pattern_statistics import PatternStatistics
+import typing
+import collections
+import math
+
+
+def get_ordered_events(pattern_query: processing_utilities.CleanPatternQuery) \
+        -> typing.List[processing_utilities.EventTypeOrPatternAndIdentifier]:
+    """
+    :return: the pattern events in seq order for a Seq pattern and in declaration order otherwise
+    """
+    operator = pattern_query.event_pattern.operator
+    events = list(pattern_query.event_pattern.event_types_or_patterns)
+    if not isinstance(operator, processing_utilities.Seq):
+        return events
+    event_dict = {event_and_identifier.identifier: event_and_identifier for event_and_identifier in events}
+    return processing_utilities.Seq.get_sorted_by_identifier_order(event_dict, operator.identifiers_order)
+
+
+class LazyNFA:
+    """
+    An automaton that evaluates a pattern query without operator nesting. Its states are the prefixes of the evaluation
+    order, a permutation of the pattern events by increasing arrival rate of their types, and its instances are bindings
+    of these prefixes to events. Only events of the first identifier in the evaluation order (the rarest) start new
+    instances; the events of the other identifiers are buffered until an instance reaches their state.
+    A binding is created when the last of its events arrives, by extending the instances of the previous state with the
+    new event and then with the buffered events of the following states. So every match is found exactly once, when
+    its last event arrives, just as in the tree based evaluation.
+    """
+    def __init__(self, pattern_query: processing_utilities.CleanPatternQuery,
+                 output_interface: processing_utilities.OutputInterface,
+                 evaluation_order: typing.List[processing_utilities.EventTypeOrPatternAndIdentifier]):
+        """
+        :param pattern_query: the pattern query to evaluate
+        :param output_interface: the output interface of the matches
+        :param evaluation_order: the pattern events in the order they are bound
+        """
+        self.time_limit = pattern_query.time_limit
+        self.use_const_window = pattern_query.use_const_window
+        self.output_interface = output_interface
+        self.evaluation_order = evaluation_order
+        self.depths_num = len(evaluation_order)
+        identifier_to_depth = {event_and_identifier.identifier: depth
+                               for depth, event_and_identifier in enumerate(evaluation_order)}
+        event_types = [event_and_identifier.event_type_or_pattern for event_and_identifier in evaluation_order]
+        self.type_to_depths = {}
+        for depth, event_type in enumerate(event_types):
+            self.type_to_depths.setdefault(event_type, []).append(depth)
+        # matches hold their events in seq order for Seq patterns and in declaration order otherwise, as the left deep
+        # tree does
+        self.output_depths = [identifier_to_depth[event_and_identifier.identifier]
+                              for event_and_identifier in get_ordered_events(pattern_query)]
+        # two events of the same type may be the same event (of the same sequence id), of different types never are
+        self.same_type_depths = [[other_depth for other_depth in range(depth)
+                                  if event_types[other_depth] == event_types[depth]]
+                                 for depth in range(self.depths_num)]
+        self.preceding_depths, self.following_depths = self.get_seq_neighbours(pattern_query, identifier_to_depth)
+        # every condition is checked in the depth binding the last of its identifiers
+        self.depth_conditions = [[] for _ in range(self.depths_num)]
+        for condition in pattern_query.conditions:
+            argument_depths = [identifier_to_depth[identifier] for identifier in condition.event_identifiers]
+            self.depth_conditions[max(argument_depths)].append((condition.condition_apply_function, argument_depths))
+        # instances[depth] holds the bindings of the first depth + 1 events of the evaluation order, buffers[depth] the
+        # (time ordered) events waiting to be bound in depth
+        self.instances = [[] for _ in range(self.depths_num)]
+        self.buffers = [collections.deque() for _ in range(self.depths_num)]
+        self.matches = []
+        self.last_cleanup_time = None
+
+    def get_seq_neighbours(self, pattern_query: processing_utilities.CleanPatternQuery, identifier_to_depth: typing.Dict)\
+            -> typing.Tuple[typing.List, typing.List]:
+        """
+        :return: for every depth, the earlier depths whose events must directly precede and directly follow the event
+        bound in depth (None if there is no such depth or the operator is not Seq). As the events bound before are
+        already ordered, it is enough to compare a new event to these two
+        """
+        preceding_depths = [None] * self.depths_num
+        following_depths = [None] * self.depths_num
+        operator = pattern_query.event_pattern.operator
+        if not isinstance(operator, processing_utilities.Seq):
+            return preceding_depths, following_depths
+        depth_to_position = {identifier_to_depth[identifier]: position
+                             for identifier, position in operator.identifier_positions.items()
+                             if identifier in identifier_to_depth}
+        for depth in range(self.depths_num):
+            position = depth_to_position[depth]
+            earlier_positions = [(depth_to_position[other_depth], other_depth) for other_depth in range(depth)]
+            preceding = [item for item in earlier_positions if item[0] < position]
+            following = [item for item in earlier_positions if item[0] > position]
+            preceding_depths[depth] = max(preceding)[1] if preceding else None
+            following_depths[depth] = min(following)[1] if following else None
+        return preceding_depths, following_depths
+
+    def bind(self, binding: typing.Tuple, event, depth: int):
+        """
+        :param binding: (events, start time, end time) of an instance of the state depth - 1
+        :param event: the event to bind in depth
+        :return: the extended binding, or None if the event breaks the window, the seq order, the uniqueness of the
+        events or a condition
+        """
+        events, start_time, end_time = binding
+        time = event.get_time()
+        start_time = min(start_time, time)
+        end_time = max(end_time, time)
+        if end_time - start_time > self.time_limit:
+            return None
+        preceding_depth = self.preceding_depths[depth]
+        if preceding_depth is not None and events[preceding_depth].get_time() > time:
+            return None
+        following_depth = self.following_depths[depth]
+        if following_depth is not None and events[following_depth].get_time() < time:
+            return None
+        if self.same_type_depths[depth]:
+            sequence_id = event.sequence_id
+            if any(events[other_depth].sequence_id == sequence_id for other_depth in self.same_type_depths[depth]):
+                return None
+        events = events + (event,)
+        for condition_apply_function, argument_depths in self.depth_conditions[depth]:
+            if not condition_apply_function(*[events[argument_depth] for argument_depth in argument_depths]):
+                return None
+        return events, start_time, end_time
+
+    def extend(self, binding: typing.Tuple, depth: int):
+        """
+        saves a new binding of the first depth events and extends it by the buffered events of the following states
+        """
+        if depth == self.depths_num:
+            events = binding[0]
+            self.matches.append([events[output_depth] for output_depth in self.output_depths])
+            return
+        self.instances[depth - 1].append(binding)
+        for event in self.buffers[depth]:
+            new_binding = self.bind(binding, event, depth)
+            if new_binding is not None:
+                self.extend(new_binding, depth + 1)
+
+    def remove_expired(self, current_time):
+        """
+        removes the instances and buffered events that can not be in a match with an event arriving at current_time or
+        later
+        """
+        earliest_time = current_time - self.time_limit
+        self.instances = [[binding for binding in instances if binding[1] >= earliest_time]
+                          for instances in self.instances]
+        for buffer in self.buffers:
+            while buffer and buffer[0].get_time() < earliest_time:
+                buffer.popleft()
+        self.last_cleanup_time = current_time
+
+    def handle_event(self, event):
+        """
+        binds the event in every depth of its type, and buffers it for the instances that will reach these depths
+        """
+        depths = self.type_to_depths.get(event.get_type())
+        if depths is None:
+            return
+        current_time = event.get_time()
+        if self.last_cleanup_time is None or current_time - self.last_cleanup_time > self.time_limit:
+            self.remove_expired(current_time)
+        for depth in depths:
+            previous_instances = [((), math.inf, -math.inf)] if depth == 0 else self.instances[depth - 1]
+            for binding in previous_instances:
+                new_binding = self.bind(binding, event, depth)
+                if new_binding is not None:
+                    self.extend(new_binding, depth + 1)
+        for depth in depths:
+            if depth > 0:
+                self.buffers[depth].append(event)
+        if self.matches and self.output_interface is not None and self.output_interface.output_while_running():
+            self.output_interface.output_results(self.matches)
+            self.matches = []
+
+    def clear(self):
+        self.instances = [[] for _ in range(self.depths_num)]
+        self.buffers = [collections.deque() for _ in range(self.depths_num)]
+        self.matches = []
+        self.last_cleanup_time = None
+
+
+class NFAEvaluationModel(processing_utilities.EvaluationModel):
+    """
+    This class evaluates every pattern query by a LazyNFA, an alternative to the tree based evaluation that is
+    efficient for long Seq patterns with selective (rare or strongly filtered) events. The automaton binds the events
+    of the rarest type first, so the instances it keeps are few, and buffers the events of the frequent types.
+    This class cannot implement operator nesting.
+    """
+    def __init__(self, statistics: PatternStatistics = None, sample_events: typing.Iterable = None):
+        """
+        :param statistics: the statistics holding the arrival rates of the event types
+        :param sample_events: a time ordered sample of the stream to measure the arrival rates by, if statistics is
+        None (for example itertools.islice(processor.get_events(), 10000)). If both are None the events are bound in
+        seq order (declaration order for And patterns), as in an eager NFA
+        """
+        if statistics is None and sample_events is not None:
+            sample_events = list(sample_events)
+            statistics = PatternStatistics(PatternStatistics.get_arrival_rates(sample_events),
+                                           default_arrival_rate=0.5 / PatternStatistics.get_duration(sample_events))
+        self.statistics = statistics
+        self.automata = []
+        # routing index from an event type to the automata interested in events of this type
+        self.event_type_to_automata = {}
+
+    def get_evaluation_order(self, pattern_query: processing_utilities.CleanPatternQuery) \
+            -> typing.List[processing_utilities.EventTypeOrPatternAndIdentifier]:
+        """
+        :return: the pattern events by increasing arrival rate, ties (or all events, if there are no statistics) broken
+        by seq order for Seq patterns and by declaration order otherwise
+        """
+        events = get_ordered_events(pattern_query)
+        if self.statistics is None:
+            return events
+        return sorted(events,
+                      key=lambda event_and_identifier:
+                      self.statistics.get_arrival_rate(event_and_identifier.event_type_or_pattern))
+
+    def set_pattern_queries(self, pattern_queries: typing.Iterable[processing_utilities.CleanPatternQuery],
+                            output_interfaces: typing.List[processing_utilities.OutputInterface]):
+        self.automata = []
+        self.event_type_to_automata = {}
+        for pattern_query, output_interface in zip(pattern_queries, output_interfaces):
+            automaton = LazyNFA(pattern_query, output_interface, self.get_evaluation_order(pattern_query))
+            self.automata.append(automaton)
+            for event_type in automaton.type_to_depths:
+                self.event_type_to_automata.setdefault(event_type, []).append(automaton)
+
+    def handle_event(self, event, event_counter):
+        """
+        passes the event to the automata interested in its type
+        :param event: the event to add
+        :param event_counter: the corresponding event counter if the pattern uses fixed window instead of time limit
+        """
+        automata = self.event_type_to_automata.get(event.get_type())
+        if automata is None:
+            return
+        for automaton in automata:
+            if automaton.use_const_window:
+                event.set_time_to_counter(event_counter)
+            automaton.handle_event(event)
+
+    def get_results(self) -> typing.List[typing.List]:
+        return [automaton.matches for automaton in self.automata]
+
+    def clear(self):
+        for automaton in self.automata:
+            automaton.clear()
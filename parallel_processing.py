@@ -0,0 +1,406 @@
+from . import processing_utilities
+import typing
+import multiprocessing
+import threading
+import queue
+
+
+def get_schema_arguments(event) -> typing.Tuple[typing.List[str], int, int]:
+    """
+    :return: the arguments of an EventSchema that can recreate the event from its values
+    """
+    attribute_names = list(event.attributes)
+    return attribute_names, attribute_names.index(event.time_name), attribute_names.index(event.type_name)
+
+
+class ForwardingOutputInterface(processing_utilities.OutputInterface):
+    """
+    The output interface of a query evaluated by a worker process. It sends the matches of the query (as the values of
+    their events) to the main process, where they are passed to the query's own output interface
+    """
+    def __init__(self, query_index: int, output_while_running: bool, connection):
+        """
+        :param query_index: the index of the query in the queries of the ParallelEvaluationModel
+        :param output_while_running: the output_while_running of the query's own output interface
+        :param connection: the connection to send the matches to
+        """
+        self.query_index = query_index
+        self.forward_while_running = output_while_running
+        self.connection = connection
+
+    def output_results(self, results):
+        self.connection.send(('results', self.query_index,
+                              [[event.get_values() for event in result] for result in results]))
+        return results
+
+    def output_while_running(self) -> bool:
+        return self.forward_while_running
+
+
+def run_worker(evaluation_model: processing_utilities.EvaluationModel,
+               pattern_queries: typing.List[processing_utilities.CleanPatternQuery], query_indices: typing.List[int],
+               output_interfaces: typing.List[processing_utilities.OutputInterface], events_connection,
+               results_connection):
+    """
+    the main loop of a worker process: evaluates its queries on the batches of events it receives until it receives
+    None, and then sends the results of its queries
+    """
+    evaluation_model.set_pattern_queries(
+        pattern_queries,
+        [ForwardingOutputInterface(query_index, output_interface.output_while_running(), results_connection)
+         for query_index, output_interface in zip(query_indices, output_interfaces)])
+    event_schema = None
+    while True:
+        try:
+            batch = events_connection.recv()
+        except EOFError:
+            break
+        if batch is None:
+            break
+        schema_arguments, counters, values = batch
+        if schema_arguments is not None:
+            event_schema = processing_utilities.EventSchema(*schema_arguments)
+        create_event = event_schema.create_event
+        for counter, event_values in zip(counters, values):
+            evaluation_model.handle_event(create_event(event_values), counter)
+    results = evaluation_model.get_results()
+    results_connection.send(('done', query_indices,
+                             [[[event.get_values() for event in result] for result in query_results]
+                              for query_results in results]))
+    results_connection.close()
+
+
+class ParallelEvaluationModel(processing_utilities.EvaluationModel):
+    """
+    This class splits the pattern queries between worker processes, each evaluating its queries by its own evaluation
+    model. The events are passed to the workers in batches of attribute values (only the events of the types used by a
+    worker's queries are passed to it), through pipes, and the matches are passed back the same way and recreated as
+    events, so every query has the same results and output as in a sequential evaluation.
+    Workers are started by forking (the conditions of pattern queries are usually functions that can not be pickled),
+    so this class is not supported on platforms without the fork start method.
+    """
+    def __init__(self, evaluation_model_factory: typing.Callable[[], processing_utilities.EvaluationModel],
+                 workers_num: int = None, batch_size: int = 4096):
+        """
+        :param evaluation_model_factory: returns a new evaluation model for the queries of a worker (for example
+        lambda: NaiveMultipleTreesGraphBasedProcessing(LeftDeepTreeInitializer()))
+        :param workers_num: the number of worker processes, by default the number of CPUs (never more than the number of
+        queries)
+        :param batch_size: the number of events collected before they are passed to the workers
+        """
+        self.evaluation_model_factory = evaluation_model_factory
+        self.workers_num = workers_num if workers_num is not None else multiprocessing.cpu_count()
+        self.batch_size = batch_size
+        self.workers = []
+        self.output_interfaces = []
+        self.results = []
+        self.event_schema = None
+        self.schema_arguments = None
+
+    @staticmethod
+    def get_event_types(pattern_query: processing_utilities.CleanPatternQuery) -> typing.Optional[set]:
+        """
+        :return: the event types of the pattern query, or None if the pattern is nested
+        """
+        event_types = set()
+        for event_type_or_pattern in pattern_query.event_pattern.event_types_or_patterns:
+            if isinstance(event_type_or_pattern.event_type_or_pattern, processing_utilities.EventPattern):
+                return None
+            event_types.add(event_type_or_pattern.event_type_or_pattern)
+        return event_types
+
+    def set_pattern_queries(self, pattern_queries: typing.Iterable[processing_utilities.CleanPatternQuery],
+                            output_interfaces: typing.List[processing_utilities.OutputInterface]):
+        """
+        splits the queries between the workers (round robin) and starts the workers
+        """
+        self.close()
+        pattern_queries = list(pattern_queries)
+        self.output_interfaces = list(output_interfaces)
+        self.results = [[] for _ in pattern_queries]
+        self.event_schema = None
+        self.schema_arguments = None
+        # results arrive from the workers' reader threads
+        self.results_queue = queue.Queue()
+        # routing index from an event type to the workers interested in events of this type, and the workers
+        # interested in all the events
+        self.event_type_to_workers = {}
+        self.all_types_workers = []
+        context = multiprocessing.get_context('fork')
+        workers_num = max(1, min(self.workers_num, len(pattern_queries)))
+        for worker_index in range(workers_num):
+            query_indices = list(range(worker_index, len(pattern_queries), workers_num))
+            if not query_indices:
+                continue
+            worker_queries = [pattern_queries[query_index] for query_index in query_indices]
+            events_receiver, events_sender = context.Pipe(duplex=False)
+            results_receiver, results_sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_worker,
+                                      args=(self.evaluation_model_factory(), worker_queries, query_indices,
+                                            [self.output_interfaces[query_index] for query_index in query_indices],
+                                            events_receiver, results_sender),
+                                      daemon=True)
+            process.start()
+            events_receiver.close()
+            results_sender.close()
+            # the reader threads are started once all the workers are forked, as forking a process running threads
+            # may deadlock on locks held by the threads
+            reader = threading.Thread(target=self._read_results, args=(results_receiver, self.results_queue),
+                                      daemon=True)
+            worker = _Worker(process, events_sender, reader)
+            self.workers.append(worker)
+            event_types = set()
+            for pattern_query in worker_queries:
+                query_event_types = self.get_event_types(pattern_query)
+                if query_event_types is None:
+                    event_types = None
+                    break
+                event_types |= query_event_types
+            if event_types is None:
+                self.all_types_workers.append(worker)
+                continue
+            for event_type in event_types:
+                self.event_type_to_workers.setdefault(event_type, []).append(worker)
+        for worker in self.workers:
+            worker.reader.start()
+        self.pending_events_num = 0
+
+    @staticmethod
+    def _read_results(connection, results_queue: queue.Queue):
+        """
+        moves the messages of a worker to the results queue, so a worker is never blocked on sending results while the
+        main process is blocked on sending it events
+        """
+        while True:
+            try:
+                message = connection.recv()
+            except EOFError:
+                break
+            results_queue.put(message)
+            if message[0] == 'done':
+                break
+        connection.close()
+
+    def handle_event(self, event, event_counter):
+        """
+        adds the event to the batches of the workers interested in its type, and passes the batches to the workers when
+        they are full
+        :param event: the event to add
+        :param event_counter: the corresponding event counter if the pattern uses fixed window instead of time limit
+        """
+        if self.schema_arguments is None:
+            self.schema_arguments = get_schema_arguments(event)
+            self.event_schema = processing_utilities.EventSchema(*self.schema_arguments)
+        workers = self.event_type_to_workers.get(event.get_type())
+        if workers is None and not self.all_types_workers:
+            return
+        values = event.get_values()
+        for worker in workers or ():
+            worker.add_event(event_counter, values)
+        for worker in self.all_types_workers:
+            worker.add_event(event_counter, values)
+        self.pending_events_num += 1
+        if self.pending_events_num >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        passes the collected batches to the workers and outputs the results received so far
+        """
+        for worker in self.workers:
+            worker.send_batch(self.schema_arguments)
+        self.pending_events_num = 0
+        self.output_received_results()
+
+    def output_received_results(self, block: bool = False) -> int:
+        """
+        passes the matches received from the workers to the output interfaces of their queries
+        :param block: if True, waits for a message
+        :return: the number of 'done' messages (each carrying the final results of a worker) received
+        """
+        done_num = 0
+        while True:
+            try:
+                message = self.results_queue.get(block=block)
+            except queue.Empty:
+                return done_num
+            block = False
+            if message[0] == 'results':
+                _, query_index, results = message
+                self.output_interfaces[query_index].output_results(self.create_matches(results))
+            else:
+                _, query_indices, queries_results = message
+                for query_index, results in zip(query_indices, queries_results):
+                    self.results[query_index] = self.create_matches(results)
+                done_num += 1
+
+    def create_matches(self, results: typing.List[typing.List[typing.Tuple]]) -> typing.List[typing.List]:
+        """
+        :param results: matches as the values of their events
+        :return: the matches as lists of events
+        """
+        create_event = self.event_schema.create_event
+        return [[create_event(values) for values in result] for result in results]
+
+    def get_results(self) -> typing.List[typing.List]:
+        """
+        passes the last batches to the workers, waits for them to finish and returns the results of all the queries
+        """
+        if self.workers:
+            self.flush()
+            for worker in self.workers:
+                worker.finish()
+            done_num = 0
+            while done_num < len(self.workers):
+                done_num += self.output_received_results(block=True)
+            self.output_received_results()
+            self.close()
+        return self.results
+
+    def close(self):
+        """
+        stops the workers (workers that did not finish stop without their results being output)
+        """
+        for worker in self.workers:
+            worker.close()
+        self.workers = []
+
+
+class _Worker:
+    """
+    the main process side of a worker: its process, its batch of events and its events connection
+    """
+    def __init__(self, process, events_connection, reader: threading.Thread):
+        self.process = process
+        self.events_connection = events_connection
+        self.reader = reader
+        self.counters = []
+        self.values = []
+        self.schema_sent = False
+        self.finished = False
+
+    def add_event(self, counter: int, values: typing.Tuple):
+        self.counters.append(counter)
+        self.values.append(values)
+
+    def send_batch(self, schema_arguments):
+        if not self.values:
+            return
+        self.events_connection.send((None if self.schema_sent else schema_arguments, self.counters, self.values))
+        self.schema_sent = True
+        self.counters = []
+        self.values = []
+
+    def finish(self):
+        self.events_connection.send(None)
+        self.finished = True
+
+    def close(self):
+        # forked workers hold copies of each other's connections, so a worker does not see the connection closed
+        if not self.finished:
+            self.finish()
+        self.events_connection.close()
+        self.process.join()
+        self.reader.join()
+
+
+class TimeSlice:
+    """
+    A slice of the lines of a time sorted input file, given as byte offsets. The slice owns the matches whose last event
+    is in its lines, and its evaluation starts at an earlier line, so the events of these matches in the previous
+    slices (in the time limit or the constant window before the slice) are evaluated too
+    """
+    def __init__(self, evaluation_start: int, start: int, end: int, first_counter: int, start_counter: int,
+                 start_time):
+        """
+        :param evaluation_start: the offset of the first line to evaluate
+        :param start: the offset of the first line of the slice
+        :param end: the offset after the last line of the slice
+        :param first_counter: the counter of the event in the first line to evaluate
+        :param start_counter: the counter of the event in the first line of the slice
+        :param start_time: the time of the event in the first line of the slice
+        """
+        self.evaluation_start = evaluation_start
+        self.start = start
+        self.end = end
+        self.first_counter = first_counter
+        self.start_counter = start_counter
+        self.start_time = start_time
+
+    def is_owned(self, match: typing.List, pattern_query: processing_utilities.CleanPatternQuery) -> bool:
+        """
+        :return: True if the last event of the match is in the slice (as events are sorted by time, this is the event
+        with the latest time, or counter for a constant window)
+        """
+        if self.evaluation_start == self.start:
+            return True
+        threshold = self.start_counter if pattern_query.use_const_window else self.start_time
+        return max(event.get_time() for event in match) >= threshold
+
+
+def run_time_slice(processor, evaluation_model: processing_utilities.EvaluationModel,
+                   pattern_queries: typing.List[processing_utilities.CleanPatternQuery],
+                   output_interfaces: typing.List[processing_utilities.OutputInterface], time_slice: TimeSlice,
+                   results_connection):
+    """
+    the main function of a time slice process: evaluates the queries on the lines of the time slice and sends the
+    matches it owns, both those output while running and those returned by get_results
+    """
+    collecting_output_interfaces = [processing_utilities.CollectingOutputInterface(
+        output_interface.output_while_running()) for output_interface in output_interfaces]
+    evaluation_model.set_pattern_queries(pattern_queries, collecting_output_interfaces)
+    schema_arguments = None
+    for counter, event in enumerate(processor.get_events_in_range(time_slice.evaluation_start, time_slice.end),
+                                    time_slice.first_counter):
+        if schema_arguments is None:
+            schema_arguments = get_schema_arguments(event)
+        evaluation_model.handle_event(event, counter)
+    results = evaluation_model.get_results()
+
+    def get_owned_values(matches, pattern_query):
+        return [[event.get_values() for event in match] for match in matches
+                if time_slice.is_owned(match, pattern_query)]
+
+    results_connection.send((schema_arguments,
+                             [get_owned_values(output_interface.pop_results(), pattern_query)
+                              for output_interface, pattern_query in zip(collecting_output_interfaces,
+                                                                         pattern_queries)],
+                             [get_owned_values(query_results, pattern_query)
+                              for query_results, pattern_query in zip(results, pattern_queries)]))
+    results_connection.close()
+
+
+def evaluate_time_slices(processor, pattern_queries: typing.List[processing_utilities.CleanPatternQuery],
+                         evaluation_model_factory: typing.Callable[[], processing_utilities.EvaluationModel],
+                         time_slices: typing.List[TimeSlice],
+                         output_interfaces: typing.List[processing_utilities.OutputInterface]) -> typing.List:
+    """
+    evaluates every time slice in a forked process, and passes the matches of the slices, in the order of the slices,
+    to the output interfaces
+    :return: the results of the queries, as returned by the evaluation models' get_results
+    """
+    context = multiprocessing.get_context('fork')
+    processes = []
+    for time_slice in time_slices:
+        results_receiver, results_sender = context.Pipe(duplex=False)
+        process = context.Process(target=run_time_slice,
+                                  args=(processor, evaluation_model_factory(), pattern_queries, output_interfaces,
+                                        time_slice, results_sender),
+                                  daemon=True)
+        process.start()
+        results_sender.close()
+        processes.append((process, results_receiver))
+    results = [[] for _ in pattern_queries]
+    for process, results_receiver in processes:
+        schema_arguments, output_values, results_values = results_receiver.recv()
+        results_receiver.close()
+        process.join()
+        if schema_arguments is None:
+            continue
+        create_event = processing_utilities.EventSchema(*schema_arguments).create_event
+        for query_index, (query_output, query_results) in enumerate(zip(output_values, results_values)):
+            if query_output:
+                output_interfaces[query_index].output_results(
+                    [[create_event(values) for values in match] for match in query_output])
+            results[query_index].extend([create_event(values) for values in match] for match in query_results)
+    return results
@@ -1,5 +1,31 @@
 import typing
 import itertools
+import bisect
+import heapq
+import math
+import operator
+import keyword
+import time
+import gzip
+import bz2
+import lzma
+import ast
+import io
+import re
+import tokenize
+import random
+import weakref
+import threading
+
+# numpy is an optional dependency: EventBatch filters the columns of micro batches by numpy arrays if it is installed,
+# and by lists otherwise
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# the sequence ids of the created events, increasing in creation order (which is stream order)
+event_sequence_ids = itertools.count()
 
 
 class Event:
@@ -17,6 +43,8 @@ class Event:
         self.attributes = dict(zip(attribute_names, values))
         self.time_name = time_name
         self.type_name = type_name
+        # identifies the event in the partial results, events with identical attributes are still different events
+        self.sequence_id = next(event_sequence_ids)
 
     def __getattr__(self, item):
         """
@@ -34,6 +62,12 @@ class Event:
     def get_type(self):
         return self.attributes[self.type_name]
 
+    def get_values(self) -> typing.Tuple:
+        """
+        :return: the attributes values, in the order of the attribute names
+        """
+        return tuple(self.attributes.values())
+
     @staticmethod
     def same_events(event1, event2) -> bool:
         return event1.attributes == event2.attributes
@@ -57,6 +91,124 @@ class Event:
         self.attributes[self.time_name] = counter
 
 
+class SchemaEvent:
+    """
+    Base class of the compact event classes created by EventSchema. Every attribute is stored in its own slot so events
+    hold no per instance dictionary, and start_time, end_time and event_type are aliases of the slots of the time and
+    type attributes. It provides the same API as Event.
+    """
+    __slots__ = ('sequence_id',)
+    schema = None
+
+    def get_time(self):
+        return self.start_time
+
+    def get_type(self):
+        return self.event_type
+
+    def get_values(self) -> typing.Tuple:
+        """
+        :return: the attributes values, in the order of the attribute names
+        """
+        return self.schema.values_getter(self)
+
+    @property
+    def attributes(self) -> typing.Dict:
+        """
+        compatibility with Event, builds a new dictionary on every call
+        :return: a dict from attribute name to attribute value
+        """
+        return dict(zip(self.schema.attribute_names, self.get_values()))
+
+    @property
+    def time_name(self):
+        return self.schema.time_name
+
+    @property
+    def type_name(self):
+        return self.schema.type_name
+
+    def __len__(self):
+        """
+        for debugging reasons
+        :return:
+        """
+        return len(self.schema.attribute_names)
+
+    def __str__(self):
+        return ','.join(str(value) for value in self.get_values())
+
+    def set_time_to_counter(self, counter):
+        """
+        used if pattern uses fixed window instead of time limit
+        :param counter:
+        """
+        self.start_time = counter
+
+
+class EventSchema:
+    """
+    This class describes the attributes of the events in a stream. It is created once (per Processor) and defines a
+    compact event class whose attributes are read directly from slots at precomputed offsets instead of through a
+    per event dictionary.
+    """
+    reserved_names = {'self', 'start_time', 'end_time', 'event_type', 'schema', 'attributes', 'time_name', 'type_name',
+                      'get_time', 'get_type', 'get_values', 'set_time_to_counter', 'same_events',
+                      'sequence_id'}
+
+    def __init__(self, attribute_names: typing.List[str], time_attribute_index: int, type_attribute_index: int,
+                 attribute_types: typing.List[typing.Callable] = None):
+        """
+        :param attribute_names: the names of the attributes (those names should match the attribute names
+        in the conditions functions)
+        :param time_attribute_index: the index of the time attribute in attribute_names
+        :param type_attribute_index: the index of the event type (name) attribute in attribute_names
+        :param attribute_types: optional types of the attributes (for example int, float, str), used to convert
+        the raw values of the input file. If None the types are guessed per value
+        """
+        if attribute_types is not None and len(attribute_types) != len(attribute_names):
+            raise ValueError("expected {} attribute types, got {}".format(len(attribute_names), len(attribute_types)))
+        for name in attribute_names:
+            if not name.isidentifier() or keyword.iskeyword(name) or name in EventSchema.reserved_names or \
+                    name.startswith('__'):
+                raise ValueError("attribute name {} can not be used in an event schema".format(name))
+        self.attribute_names = list(attribute_names)
+        self.attribute_offsets = {name: i for i, name in enumerate(self.attribute_names)}
+        self.time_index = time_attribute_index
+        self.type_index = type_attribute_index
+        self.time_name = self.attribute_names[time_attribute_index]
+        self.type_name = self.attribute_names[type_attribute_index]
+        self.attribute_types = list(attribute_types) if attribute_types is not None else None
+        self.values_getter = operator.attrgetter(*self.attribute_names) if len(self.attribute_names) > 1 \
+            else lambda event: (getattr(event, self.attribute_names[0]),)
+        self.event_class = self._create_event_class()
+
+    def _create_event_class(self):
+        """
+        :return: a SchemaEvent subclass with a slot per attribute and a constructor receiving the values positionally
+        """
+        arguments = ', '.join(self.attribute_names)
+        assignments = ''.join('\n    self.{0} = {0}'.format(name) for name in self.attribute_names) + \
+            '\n    self.sequence_id = next(event_sequence_ids)'
+        namespace = {'event_sequence_ids': event_sequence_ids}
+        exec('def __init__(self, {}):{}'.format(arguments, assignments), namespace)
+        event_class = type('SchemaEvent', (SchemaEvent,), {'__slots__': tuple(self.attribute_names),
+                                                           '__init__': namespace['__init__'],
+                                                           'schema': self})
+        time_slot = event_class.__dict__[self.time_name]
+        event_class.start_time = time_slot
+        event_class.end_time = time_slot
+        event_class.event_type = event_class.__dict__[self.type_name]
+        return event_class
+
+    def create_event(self, values: typing.Sequence) -> SchemaEvent:
+        """
+        :param values: the attributes values, in the order of the attribute names
+        :return: a new event of this schema
+        """
+        return self.event_class(*values)
+
+
 class EventTypeOrPatternAndIdentifier:
     """
     Simple tuple class that glues and event type and its identifier. Used in event pattern.
@@ -84,73 +236,80 @@ class EventPattern:
 
 class PartialResult:
     """
-    This class holds a partial match.
+    This class holds a partial match: its events in a flat tuple with a slot per identifier of its layout (the
+    identifiers of the node that built it, a tuple shared by all the partial results of the node), the cached times
+    of its first and last events, and the set of the sequence ids of its events, so partial results sharing an event
+    are detected by a single set operation.
     """
-    def __init__(self, identifier_to_partial_result: typing.Dict, operator_type=None, identifier=None):
+    __slots__ = ('events', 'layout', 'start_time', 'end_time', 'identifier', 'operator_type', 'sequence_ids')
+
+    def __init__(self, events: tuple, layout: tuple, start_time, end_time, identifier=None, operator_type=None,
+                 sequence_ids: frozenset = None):
         """
-        :param identifier_to_partial_result: a dictionary that holds all the partial results that this partial results
-        is composed of. It holds a mapping from identifier to partial results.
-        :param operator_type: the operator type that created this partial results
+        :param events: the events of the partial match, in the order of the layout
+        :param layout: the identifiers of the events
+        :param start_time: the time of the first event
+        :param end_time: the time of the last event
         :param identifier: the identifier associated with this partial match
+        :param operator_type: the operator type that created this partial results
+        :param sequence_ids: the sequence ids of the events, computed from the events if not given
         """
-        self.identifier_to_partial_result = identifier_to_partial_result
-        self.operator_type = operator_type
+        self.events = events
+        self.layout = layout
+        self.start_time = start_time
+        self.end_time = end_time
         self.identifier = identifier
-        self.start_time = min(self.identifier_to_partial_result.values(),
-                              key=lambda partial_result_or_event: partial_result_or_event.start_time).start_time
-        self.end_time = max(self.identifier_to_partial_result.values(),
-                            key=lambda partial_result_or_event: partial_result_or_event.end_time).end_time
+        self.operator_type = operator_type
+        self.sequence_ids = sequence_ids if sequence_ids is not None else \
+            frozenset(event.sequence_id for event in events)
+
+    @staticmethod
+    def init_with_event(event, identifier):
+        """
+        :return: a partial result holding a single event
+        """
+        time = event.get_time()
+        return PartialResult((event,), (identifier,), time, time, identifier)
 
     def is_event_wrapper(self) -> bool:
         """
-        :return: True if this partial result holds a single event (the basis of the following recursive functions),
-        False otherwise
+        :return: True if this partial result holds a single event, False otherwise
         """
-        return len(self.identifier_to_partial_result) == 1
+        return len(self.events) == 1
 
     @staticmethod
     def init_with_partial_results(partial_results, operator_type=None, identifier=None):
         """
-        composing a new partial results from partial results
+        composing a new partial results from partial results, by concatenating their slots
         :param partial_results: results to compose
         :param operator_type: operator type that is composing this partial result
         :param identifier: relevant identifier
         :return: new partial results
         """
-        identifier_to_partial_result = {}
-        for partial_result in partial_results:
-            if partial_result.operator_type is None and not partial_result.is_event_wrapper:
-                identifier_to_partial_result.update(partial_result.identifier_to_partial_result)
-            else:
-                identifier_to_partial_result.update({partial_result.identifier: partial_result})
-
-        return PartialResult(identifier_to_partial_result, operator_type, identifier)
+        events = tuple(itertools.chain.from_iterable(partial_result.events for partial_result in partial_results))
+        layout = tuple(itertools.chain.from_iterable(partial_result.layout for partial_result in partial_results))
+        return PartialResult(events, layout, min(partial_result.start_time for partial_result in partial_results),
+                             max(partial_result.end_time for partial_result in partial_results), identifier,
+                             operator_type, frozenset().union(*(partial_result.sequence_ids
+                                                                for partial_result in partial_results)))
+
+    def get_event(self, identifier):
+        """
+        :return: the event of the identifier
+        """
+        return self.events[self.layout.index(identifier)]
 
     def completely_unpack(self) -> typing.Dict:
         """
-        recursive function that traversed all inner partial results and unpacks all the identifier to partial results
-        dictionaries that this partial results holds.
-        :return: a dict that holds mapping from identifier to event for all the events that are
-        (directly or in directly) in this partial result
+        :return: a dict that holds mapping from identifier to event for all the events in this partial result
         """
-        if self.is_event_wrapper():
-            return self.identifier_to_partial_result
-        result = dict()
-        for partial_result in self.identifier_to_partial_result.values():
-            result.update(partial_result.completely_unpack())
-        return result
+        return dict(zip(self.layout, self.events))
 
     def unpack(self):
         """
-        :return: similar to above, but returns a dict holding from identifier to partial results for all the partial results
-        that are (directly or in directly) in this partial result
+        :return: a dict from the identifier of this partial result to it
         """
-        if self.is_event_wrapper() or self.operator_type is not None:
-            return {self.identifier: self}
-        result = dict()
-        for partial_result in self.identifier_to_partial_result.values():
-            result.update(partial_result.unpack())
-        return result
+        return {self.identifier: self}
 
 
 class MemoryModel:
@@ -163,6 +322,12 @@ class MemoryModel:
     def __iter__(self):
         pass
 
+    def __len__(self):
+        """
+        :return: number of saved partial matches
+        """
+        pass
+
     def get_relevant_results(self, current_time, time_limit, **kwargs):
         """
         :param current_time: time of the current processed event
@@ -172,6 +337,20 @@ class MemoryModel:
         """
         pass
 
+    def get_results_in_time_range(self, current_time, time_limit, min_start_time=None, max_start_time=None,
+                                  **kwargs):
+        """
+        :param current_time: time of the current processed event
+        :param time_limit: the time limit associated with the query
+        :param min_start_time: minimal start time of the returned partial matches (None for no bound)
+        :param max_start_time: maximal start time of the returned partial matches (None for no bound)
+        :param kwargs:
+        :return: all the partial matches that are still in the time limit and started in the given range
+        """
+        return [result for result in self.get_relevant_results(current_time, time_limit, **kwargs)
+                if (min_start_time is None or result.start_time >= min_start_time) and
+                (max_start_time is None or result.start_time <= max_start_time)]
+
     def pop_results(self):
         """
         :return: all current partial matches
@@ -181,10 +360,30 @@ class MemoryModel:
     def clear(self):
         pass
 
+    def record_joins(self, results_num: int):
+        """
+        called by the parent node after the partial matches of this memory model were joined with a new partial match
+        :param results_num: the number of new partial matches the join created
+        """
+        pass
+
+    def get_attribute_index(self) -> typing.Optional['AttributeIndexMemoryModel']:
+        """
+        :return: the attribute index holding the partial matches of this memory model, None if they are not indexed
+        """
+        return None
+
+    def get_unbounded(self) -> 'MemoryModel':
+        """
+        :return: a memory model saving the partial matches of this memory model without dropping any of them
+        """
+        return self
+
 
 class ListWrapper(MemoryModel):
     """
-    A simple memory model implemented as a list
+    A simple memory model implemented as a list. If its partial results are sorted by start time (is_sorted, as in event
+    nodes), the partial results in a start time range are found by a binary search
     """
     def __init__(self):
         self.l = []
@@ -192,6 +391,9 @@ class ListWrapper(MemoryModel):
     def __iter__(self):
         return iter(self.l)
 
+    def __len__(self):
+        return len(self.l)
+
     def add_partial_result(self, partial_result: PartialResult):
         self.l.append(partial_result)
 
@@ -205,28 +407,716 @@ class ListWrapper(MemoryModel):
             self.l = [result for result in self.l if current_time - result.start_time <= time_limit]
         return self.l
 
+    def get_results_in_time_range(self, current_time, time_limit, min_start_time=None, max_start_time=None,
+                                  **kwargs):
+        if not kwargs['is_sorted']:
+            return super().get_results_in_time_range(current_time, time_limit, min_start_time, max_start_time, **kwargs)
+        results = self.get_relevant_results(current_time, time_limit, **kwargs)
+        first = self.bisect_start_time(results, min_start_time, False) if min_start_time is not None else 0
+        last = self.bisect_start_time(results, max_start_time, True) if max_start_time is not None else len(results)
+        return results[first:last]
+
+    @staticmethod
+    def bisect_start_time(results: typing.List[PartialResult], start_time, include_equal: bool) -> int:
+        """
+        :param results: partial results sorted by start time
+        :param start_time: the start time to search
+        :param include_equal: whether the partial results starting at start_time are before the returned index
+        :return: the index of the first partial result starting after start_time (or at it, if include_equal is False)
+        """
+        low, high = 0, len(results)
+        while low < high:
+            middle = (low + high) // 2
+            middle_start_time = results[middle].start_time
+            if middle_start_time < start_time or (include_equal and middle_start_time == start_time):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
     def pop_results(self):
         temp = self.l
-        self.l.clear()
+        self.l = []
         return temp
 
     def clear(self):
         self.l.clear()
 
 
+class ListSlice:
+    """
+    A read only view of the items of a list between two indices, which is sized, indexable and can be iterated multiple
+    times like the slice of the list, without copying the items. Items inserted to or deleted from the list before the
+    end of the view shift it, so a view is only used until its memory model saves another partial result
+    """
+    __slots__ = ('items', 'start', 'stop')
+
+    def __init__(self, items: typing.List, start: int, stop: int):
+        self.items = items
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index: int):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("list slice index out of range")
+        return self.items[self.start + index]
+
+    def __iter__(self):
+        return itertools.islice(self.items, self.start, self.stop)
+
+
+class TimeOrderedMemoryModel(MemoryModel):
+    """
+    A memory model that keeps its partial results ordered by start time. Expired partial results are found by a binary
+    search and skipped by advancing the index of the first relevant partial result; the skipped prefix is removed only
+    once it makes up most of the buffer, so window expiry is amortized O(log n). The relevant partial results are
+    returned as a ListSlice view, without copying them. Partial results arriving in start time order (as in event
+    nodes) are appended in amortized O(1); out of order ones (as in condition nodes) are inserted at their sorted
+    position in O(n).
+    """
+    def __init__(self):
+        self.start_times = []
+        self.results = []
+        self.first = 0
+
+    def __iter__(self):
+        return itertools.islice(self.results, self.first, None)
+
+    def __len__(self):
+        return len(self.results) - self.first
+
+    def add_partial_result(self, partial_result: PartialResult):
+        start_time = partial_result.start_time
+        if not self.start_times or start_time >= self.start_times[-1]:
+            self.start_times.append(start_time)
+            self.results.append(partial_result)
+        else:
+            i = bisect.bisect_right(self.start_times, start_time, self.first)
+            self.start_times.insert(i, start_time)
+            self.results.insert(i, partial_result)
+
+    def remove_expired_results(self, earliest_start_time):
+        """
+        forgets all the partial results that started before the given time
+        :param earliest_start_time: the earliest start time of a partial result that is still relevant
+        """
+        self.first = bisect.bisect_left(self.start_times, earliest_start_time, self.first)
+        if self.first > len(self.results) // 2:
+            # new lists, so the views returned before see the partial results they were returned with
+            self.start_times = self.start_times[self.first:]
+            self.results = self.results[self.first:]
+            self.first = 0
+
+    def get_relevant_results(self, current_time, time_limit, **kwargs):
+        self.remove_expired_results(current_time - time_limit)
+        return ListSlice(self.results, self.first, len(self.results))
+
+    def get_results_in_time_range(self, current_time, time_limit, min_start_time=None, max_start_time=None,
+                                  **kwargs):
+        self.remove_expired_results(current_time - time_limit)
+        first = self.first if min_start_time is None else \
+            bisect.bisect_left(self.start_times, min_start_time, self.first)
+        last = len(self.results) if max_start_time is None else \
+            bisect.bisect_right(self.start_times, max_start_time, first)
+        return ListSlice(self.results, first, last)
+
+    def pop_results(self):
+        results = self.results[self.first:]
+        self.clear()
+        return results
+
+    def clear(self):
+        self.start_times = []
+        self.results = []
+        self.first = 0
+
+
+class AttributeIndexMemoryModel(MemoryModel):
+    """
+    Abstract class of memory models that index their partial results by the value of an attribute of one of their
+    events, so the partial results satisfying a comparison with a given value are found without scanning the whole
+    buffer
+    """
+    supported_relations = ()
+
+    def __init__(self, identifier, attribute_name: str):
+        """
+        :param identifier: the identifier of the event whose attribute is the key of the index
+        :param attribute_name: the name of the attribute that is the key of the index
+        """
+        self.identifier = identifier
+        self.attribute_name = attribute_name
+
+    def get_key(self, partial_result: PartialResult):
+        """
+        :param partial_result: a partial result holding the event with the index identifier
+        :return: the key of the partial result in the index
+        """
+        return getattr(partial_result.get_event(self.identifier), self.attribute_name)
+
+    def get_attribute_index(self) -> 'AttributeIndexMemoryModel':
+        return self
+
+    def get_matching_results(self, relation: str, value, current_time, time_limit) -> typing.List[PartialResult]:
+        """
+        :param relation: one of supported_relations
+        :param value: the value to compare the keys to
+        :param current_time: time of the current processed event
+        :param time_limit: the time limit associated with the query
+        :return: all the partial matches that are still in the time limit and whose key satisfies (key relation value)
+        """
+        pass
+
+
+class HashIndexMemoryModel(AttributeIndexMemoryModel):
+    """
+    A memory model that indexes its partial results by the value of an attribute of one of their events, so the
+    partial results joining on an equality condition (for example A.close == B.open) are found without scanning the
+    whole buffer. Each value has its own TimeOrderedMemoryModel so window expiry still applies.
+    """
+    supported_relations = ('==',)
+
+    def __init__(self, identifier, attribute_name: str):
+        """
+        :param identifier: the identifier of the event whose attribute is the key of the index
+        :param attribute_name: the name of the attribute that is the key of the index
+        """
+        super().__init__(identifier, attribute_name)
+        self.key_to_results = {}
+        self.earliest_start_time = None
+        self.additions_since_sweep = 0
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.key_to_results.values())
+
+    def __len__(self):
+        return sum(len(results) for results in self.key_to_results.values())
+
+    def add_partial_result(self, partial_result: PartialResult):
+        key = self.get_key(partial_result)
+        results = self.key_to_results.get(key)
+        if results is None:
+            results = self.key_to_results[key] = TimeOrderedMemoryModel()
+        results.add_partial_result(partial_result)
+        self.additions_since_sweep += 1
+        if self.additions_since_sweep > len(self.key_to_results) and self.earliest_start_time is not None:
+            self.remove_expired_results(self.earliest_start_time)
+
+    def remove_expired_results(self, earliest_start_time):
+        """
+        forgets all the partial results that started before the given time and the keys that have no partial results
+        left. Called for the whole index only once the number of additions exceeds the number of keys, so the sweep
+        is amortized O(1) per addition
+        :param earliest_start_time: the earliest start time of a partial result that is still relevant
+        """
+        for key in list(self.key_to_results.keys()):
+            results = self.key_to_results[key]
+            results.remove_expired_results(earliest_start_time)
+            if len(results) == 0:
+                del self.key_to_results[key]
+        self.additions_since_sweep = 0
+
+    def get_relevant_results(self, current_time, time_limit, **kwargs):
+        self.earliest_start_time = current_time - time_limit
+        self.remove_expired_results(self.earliest_start_time)
+        return list(self)
+
+    def get_matching_results(self, relation: str, value, current_time, time_limit) -> typing.List[PartialResult]:
+        self.earliest_start_time = current_time - time_limit
+        results = self.key_to_results.get(value)
+        if results is None:
+            return []
+        return results.get_relevant_results(current_time, time_limit)
+
+    def pop_results(self):
+        results = list(self)
+        self.clear()
+        return results
+
+    def clear(self):
+        self.key_to_results = {}
+        self.additions_since_sweep = 0
+
+
+class RangeIndexMemoryModel(AttributeIndexMemoryModel):
+    """
+    A memory model that keeps its partial results sorted by the value of an attribute of one of their events, so the
+    partial results joining on an inequality condition (for example A.volumes < B.volumes) are found by a binary search
+    in O(log n + k). Window expiry pops the partial results from a heap ordered by start time.
+    The partial results are kept in sorted lists, so adding a partial result takes O(n) (a binary search and a list
+    insert), and removing the expired partial results takes O(n) for all the partial results expiring at once.
+    """
+    supported_relations = ('==', '<', '<=', '>', '>=')
+
+    def __init__(self, identifier, attribute_name: str):
+        """
+        :param identifier: the identifier of the event whose attribute is the key of the index
+        :param attribute_name: the name of the attribute that is the key of the index
+        """
+        super().__init__(identifier, attribute_name)
+        # (key, insertion counter) pairs, sorted, and the partial results in the same order
+        self.keys = []
+        self.results = []
+        # (start time, insertion counter, key) of every partial result, used for expiry
+        self.expiry_heap = []
+        self.counter = 0
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __len__(self):
+        return len(self.results)
+
+    def add_partial_result(self, partial_result: PartialResult):
+        entry = (self.get_key(partial_result), self.counter)
+        self.counter += 1
+        i = bisect.bisect_right(self.keys, entry)
+        self.keys.insert(i, entry)
+        self.results.insert(i, partial_result)
+        heapq.heappush(self.expiry_heap, (partial_result.start_time, entry[1], entry[0]))
+
+    def remove_expired_results(self, earliest_start_time):
+        """
+        forgets all the partial results that started before the given time
+        :param earliest_start_time: the earliest start time of a partial result that is still relevant
+        """
+        expired_entries = []
+        while self.expiry_heap and self.expiry_heap[0][0] < earliest_start_time:
+            _, counter, key = heapq.heappop(self.expiry_heap)
+            expired_entries.append((key, counter))
+        if len(expired_entries) == 1:
+            i = bisect.bisect_left(self.keys, expired_entries[0])
+            del self.keys[i]
+            del self.results[i]
+        elif expired_entries:
+            # a single pass over the lists instead of a list deletion per expired partial result
+            expired_entries = set(expired_entries)
+            kept = [(entry, result) for entry, result in zip(self.keys, self.results) if entry not in expired_entries]
+            self.keys = [entry for entry, _ in kept]
+            self.results = [result for _, result in kept]
+
+    def get_relevant_results(self, current_time, time_limit, **kwargs):
+        self.remove_expired_results(current_time - time_limit)
+        return list(self.results)
+
+    def get_matching_results(self, relation: str, value, current_time, time_limit) -> typing.List[PartialResult]:
+        self.remove_expired_results(current_time - time_limit)
+        # (value,) is smaller and (value, inf) is larger than every entry whose key equals value
+        if relation == '<':
+            return self.results[:bisect.bisect_left(self.keys, (value,))]
+        if relation == '<=':
+            return self.results[:bisect.bisect_right(self.keys, (value, math.inf))]
+        if relation == '>':
+            return self.results[bisect.bisect_right(self.keys, (value, math.inf)):]
+        if relation == '>=':
+            return self.results[bisect.bisect_left(self.keys, (value,)):]
+        return self.results[bisect.bisect_left(self.keys, (value,)):bisect.bisect_right(self.keys, (value, math.inf))]
+
+    def pop_results(self):
+        results = self.results
+        self.clear()
+        return results
+
+    def clear(self):
+        self.keys = []
+        self.results = []
+        self.expiry_heap = []
+
+
+class SheddingPolicy:
+    """
+    Abstract class choosing the partial matches dropped when the budget of a BoundedMemoryModel or a MemoryBudget is
+    exceeded
+    """
+    def select_victims(self, entries: typing.List[typing.Tuple['BoundedMemoryModel', PartialResult]], count: int) \
+            -> typing.Iterable[int]:
+        """
+        :param entries: the saved partial matches, each with the memory model saving it
+        :param count: the number of partial matches to drop
+        :return: the indices (in entries) of the partial matches to drop
+        """
+        pass
+
+
+class OldestSheddingPolicy(SheddingPolicy):
+    """
+    drops the partial matches that passed the largest part of their time window
+    """
+    def select_victims(self, entries: typing.List[typing.Tuple['BoundedMemoryModel', PartialResult]], count: int) \
+            -> typing.Iterable[int]:
+        return heapq.nlargest(count, range(len(entries)), key=lambda i: entries[i][0].get_age(entries[i][1]))
+
+
+class RandomSheddingPolicy(SheddingPolicy):
+    """
+    drops uniformly chosen partial matches
+    """
+    def __init__(self, seed=None):
+        """
+        :param seed: the seed of the random choices, for reproducible runs
+        """
+        self.random = random.Random(seed)
+
+    def select_victims(self, entries: typing.List[typing.Tuple['BoundedMemoryModel', PartialResult]], count: int) \
+            -> typing.Iterable[int]:
+        return self.random.sample(range(len(entries)), count)
+
+
+class UtilitySheddingPolicy(SheddingPolicy):
+    """
+    drops the partial matches of the lowest estimated utility, the number of new partial matches they are expected to
+    join into in the rest of their window (see BoundedMemoryModel.get_utility). Partial matches of nodes whose partial
+    matches rarely join are dropped first, and within a node the oldest ones
+    """
+    def select_victims(self, entries: typing.List[typing.Tuple['BoundedMemoryModel', PartialResult]], count: int) \
+            -> typing.Iterable[int]:
+        return heapq.nsmallest(count, range(len(entries)), key=lambda i: entries[i][0].get_utility(entries[i][1]))
+
+
+class BoundedMemoryModel(MemoryModel):
+    """
+    A memory model saving its partial matches in another memory model, but at most max_results of them, and possibly
+    also within a MemoryBudget shared with other bounded memory models. When a budget is exceeded partial matches are
+    dropped (load shedding), as chosen by the policy, until shed_ratio of the budget is used, so memory and latency stay
+    bounded under bursts at the cost of missed matches. The partial matches are dropped by refilling the wrapped memory
+    model with the others, which is amortized by dropping many at once. Expired partial matches are removed on the way
+    and not counted as dropped.
+    It is used by a memory_model_factory of a GraphInitializer, for example
+    lambda identifier, is_event_node: BoundedMemoryModel(ListWrapper(), 10000, budget=budget). The memory model of the
+    root of a graph holds matches, so it is never bounded (see GraphInitializer.set_root_node)
+    """
+    def __init__(self, memory_model: MemoryModel = None, max_results: int = None, policy: SheddingPolicy = None,
+                 budget: 'MemoryBudget' = None, shed_ratio: float = 0.9):
+        """
+        :param memory_model: the memory model saving the partial matches, a ListWrapper by default
+        :param max_results: the maximal number of partial matches, None for no bound (but the budget's)
+        :param policy: chooses the partial matches to drop, an OldestSheddingPolicy by default
+        :param budget: a budget shared with other memory models, if given
+        :param shed_ratio: the part of max_results that is used after partial matches are dropped
+        """
+        self.memory_model = memory_model if memory_model is not None else ListWrapper()
+        self.max_results = max_results
+        self.policy = policy if policy is not None else OldestSheddingPolicy()
+        self.budget = budget
+        self.shed_ratio = shed_ratio
+        # the number of saved partial matches, including expired ones that were not removed yet
+        self.size = 0
+        self.added_num = 0
+        # the number of new partial matches of the parent node that partial matches of this memory model joined into
+        self.joins_num = 0
+        self.dropped_num = 0
+        # the parts of their windows that the dropped partial matches had left
+        self.lost_windows = 0.0
+        self.estimated_lost_results = 0.0
+        # the time of the last lookup and the time limit, used to find how long the partial matches have left
+        self.current_time = None
+        self.time_limit = None
+        if budget is not None:
+            budget.add_memory_model(self)
+
+    def __iter__(self):
+        return iter(self.memory_model)
+
+    def __len__(self):
+        return len(self.memory_model)
+
+    def add_partial_result(self, partial_result: PartialResult):
+        self.memory_model.add_partial_result(partial_result)
+        self.size += 1
+        self.added_num += 1
+        if self.max_results is not None and self.size > self.max_results and \
+                self.update_size() > self.max_results:
+            self.shed([self], self.policy, int(self.max_results * self.shed_ratio))
+        if self.budget is not None:
+            self.budget.add_partial_result()
+
+    def get_relevant_results(self, current_time, time_limit, **kwargs):
+        self.current_time, self.time_limit = current_time, time_limit
+        return self.memory_model.get_relevant_results(current_time, time_limit, **kwargs)
+
+    def get_results_in_time_range(self, current_time, time_limit, min_start_time=None, max_start_time=None,
+                                  **kwargs):
+        self.current_time, self.time_limit = current_time, time_limit
+        return self.memory_model.get_results_in_time_range(current_time, time_limit, min_start_time, max_start_time,
+                                                           **kwargs)
+
+    def get_matching_results(self, relation: str, value, current_time, time_limit) -> typing.List[PartialResult]:
+        """
+        see AttributeIndexMemoryModel.get_matching_results, for a wrapped attribute index
+        """
+        self.current_time, self.time_limit = current_time, time_limit
+        return self.memory_model.get_matching_results(relation, value, current_time, time_limit)
+
+    def pop_results(self):
+        self.size = 0
+        return self.memory_model.pop_results()
+
+    def clear(self):
+        self.size = 0
+        self.memory_model.clear()
+
+    def record_joins(self, results_num: int):
+        self.joins_num += results_num
+
+    def get_attribute_index(self) -> typing.Optional['AttributeIndexMemoryModel']:
+        return self.memory_model.get_attribute_index()
+
+    def get_unbounded(self) -> MemoryModel:
+        if self.budget is not None:
+            self.budget.remove_memory_model(self)
+        return self.memory_model
+
+    def update_size(self) -> int:
+        """
+        :return: the number of saved partial matches, which is also saved to size
+        """
+        self.size = len(self.memory_model)
+        return self.size
+
+    def get_age(self, partial_result: PartialResult) -> float:
+        """
+        :return: the part of its time window that the partial match passed (more than 1 if it expired), as of the last
+        lookup
+        """
+        if self.current_time is None or not self.time_limit:
+            return 0.0
+        return max(0.0, (self.current_time - partial_result.start_time) / self.time_limit)
+
+    def get_join_rate(self) -> float:
+        """
+        :return: the observed join success rate: the average number of new partial matches of the parent node that a
+        partial match of this memory model joins into during a whole window, counting only the parts of the windows of
+        the dropped partial matches that they were saved for (smoothed, so it is positive before any join)
+        """
+        return (self.joins_num + 1) / (self.added_num - self.lost_windows + 1)
+
+    def get_utility(self, partial_result: PartialResult) -> float:
+        """
+        :return: the number of new partial matches of the parent node the partial match is expected to join into, its
+        join rate times the part of its window left
+        """
+        return self.get_join_rate() * max(0.0, 1 - self.get_age(partial_result))
+
+    def drop(self, partial_result: PartialResult):
+        """
+        counts a dropped partial match and the new partial matches it is expected to have joined into
+        """
+        self.dropped_num += 1
+        self.estimated_lost_results += self.get_utility(partial_result)
+        self.lost_windows += max(0.0, 1 - self.get_age(partial_result))
+
+    def get_shedding_statistics(self) -> typing.Dict:
+        """
+        :return: the number of added and dropped partial matches, the estimated number of new partial matches of the
+        parent node lost by dropping them, and the estimated recall loss: the part of the parent's new partial matches
+        that were lost
+        """
+        total = self.joins_num + self.estimated_lost_results
+        return {'added': self.added_num, 'dropped': self.dropped_num,
+                'estimated_lost_results': self.estimated_lost_results,
+                'estimated_recall_loss': self.estimated_lost_results / total if total > 0 else 0.0}
+
+    @staticmethod
+    def shed(memory_models: typing.List['BoundedMemoryModel'], policy: SheddingPolicy, target_size: int):
+        """
+        removes the expired partial matches of the memory models, and then drops partial matches chosen by the policy
+        until target_size partial matches are left in all of them together
+        """
+        entries = []
+        for memory_model in memory_models:
+            for partial_result in memory_model.pop_results():
+                if memory_model.get_age(partial_result) <= 1:
+                    entries.append((memory_model, partial_result))
+        victims = set(policy.select_victims(entries, len(entries) - target_size)) \
+            if len(entries) > target_size else set()
+        for i, (memory_model, partial_result) in enumerate(entries):
+            if i in victims:
+                memory_model.drop(partial_result)
+            else:
+                memory_model.memory_model.add_partial_result(partial_result)
+                memory_model.size += 1
+
+
+class MemoryBudget:
+    """
+    A bound on the total number of partial matches saved by the BoundedMemoryModels created with it (for example by the
+    nodes of all the queries). When it is exceeded, partial matches of all of them are dropped together, as chosen by
+    the policy. Memory models of graphs that are no longer used are forgotten
+    """
+    def __init__(self, max_results: int, policy: SheddingPolicy = None, shed_ratio: float = 0.9):
+        """
+        :param max_results: the maximal total number of partial matches
+        :param policy: chooses the partial matches to drop, an OldestSheddingPolicy by default
+        :param shed_ratio: the part of max_results that is used after partial matches are dropped
+        """
+        self.max_results = max_results
+        self.policy = policy if policy is not None else OldestSheddingPolicy()
+        self.shed_ratio = shed_ratio
+        self.memory_models = weakref.WeakSet()
+        # the total number of saved partial matches, possibly larger (never smaller) than the real number
+        self.size = 0
+        self.sheds_num = 0
+
+    def add_memory_model(self, memory_model: BoundedMemoryModel):
+        self.memory_models.add(memory_model)
+
+    def remove_memory_model(self, memory_model: BoundedMemoryModel):
+        self.memory_models.discard(memory_model)
+
+    def add_partial_result(self):
+        """
+        called by the memory models after saving a partial match
+        """
+        self.size += 1
+        if self.size <= self.max_results:
+            return
+        memory_models = list(self.memory_models)
+        self.size = sum(memory_model.update_size() for memory_model in memory_models)
+        if self.size > self.max_results:
+            BoundedMemoryModel.shed(memory_models, self.policy, int(self.max_results * self.shed_ratio))
+            self.size = sum(memory_model.size for memory_model in memory_models)
+            self.sheds_num += 1
+
+    def get_shedding_statistics(self) -> typing.Dict:
+        """
+        :return: the shedding statistics (see BoundedMemoryModel.get_shedding_statistics) of all the memory models
+        together, and the number of times the budget was exceeded
+        """
+        statistics = [memory_model.get_shedding_statistics() for memory_model in list(self.memory_models)]
+        added = sum(memory_model_statistics['added'] for memory_model_statistics in statistics)
+        dropped = sum(memory_model_statistics['dropped'] for memory_model_statistics in statistics)
+        lost = sum(memory_model_statistics['estimated_lost_results'] for memory_model_statistics in statistics)
+        return {'added': added, 'dropped': dropped, 'estimated_lost_results': lost, 'sheds': self.sheds_num}
+
+
+class AttributeComparison:
+    """
+    Describes the structure of a condition comparing an attribute of one event to an attribute of another event
+    (first_identifier.first_attribute relation second_identifier.second_attribute) so the engine can use indexes
+    to evaluate it
+    """
+    relations = {'==': operator.eq, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+    flipped_relations = {'==': '==', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+    def __init__(self, first_identifier, first_attribute: str, relation: str, second_identifier,
+                 second_attribute: str):
+        """
+        :param first_identifier: identifier of the event on the left side of the comparison
+        :param first_attribute: attribute name of the event on the left side of the comparison
+        :param relation: the comparison operator, one of AttributeComparison.relations
+        :param second_identifier: identifier of the event on the right side of the comparison
+        :param second_attribute: attribute name of the event on the right side of the comparison
+        """
+        self.first_identifier = first_identifier
+        self.first_attribute = first_attribute
+        self.relation = relation
+        self.second_identifier = second_identifier
+        self.second_attribute = second_attribute
+
+    def get_attribute(self, identifier) -> str:
+        """
+        :param identifier: the identifier of one of the compared events
+        :return: the compared attribute of that event
+        """
+        return self.first_attribute if identifier == self.first_identifier else self.second_attribute
+
+    def get_relation(self, identifier) -> str:
+        """
+        :param identifier: the identifier of one of the compared events
+        :return: the relation between the attribute of that event and the attribute of the other event (the relation
+        with its sides swapped if identifier is on the right side)
+        """
+        return self.relation if identifier == self.first_identifier else self.flipped_relations[self.relation]
+
+    def get_other_identifier(self, identifier):
+        """
+        :param identifier: the identifier of one of the compared events
+        :return: the identifier of the event it is compared to
+        """
+        return self.second_identifier if identifier == self.first_identifier else self.first_identifier
+
+
+class ConstantComparison:
+    """
+    Describes the structure of a condition comparing an attribute of one event to a constant
+    (identifier.attribute relation value), so the engine can evaluate it on single events
+    """
+    relations = {'==': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt,
+                 '>=': operator.ge, 'in': lambda value, values: value in values,
+                 'not in': lambda value, values: value not in values}
+    flipped_relations = {'==': '==', '!=': '!=', '<': '>', '<=': '>=', '>': '<', '>=': '<='}
+
+    def __init__(self, identifier, attribute: str, relation: str, value):
+        """
+        :param identifier: identifier of the compared event
+        :param attribute: the compared attribute of the event
+        :param relation: the comparison operator, one of ConstantComparison.relations
+        :param value: the constant the attribute is compared to
+        """
+        self.identifier = identifier
+        self.attribute = attribute
+        self.relation = relation
+        self.value = value
+
+
 class Condition:
     """
     this class represents a predicate (for example for events A, B: A.x > B.x)
     """
-    def __init__(self, condition_apply_function: typing.Callable, event_identifiers: typing.List):
+    def __init__(self, condition_apply_function: typing.Callable, event_identifiers: typing.List,
+                 comparison: AttributeComparison = None):
         """
         :param condition_apply_function: a boolean function that gets the relevant event and applies the condition
         :param event_identifiers: the identifiers of the events in the PatternQuery event_types list
             to be checked by this condition. Note that event_indices needs to be ordered in the order arguments should
             be passed to the condition_apply_function!
+        :param comparison: optional description of the condition, if it is a comparison between attributes of two
+        events (see the static constructors below)
         """
         self.condition_apply_function = condition_apply_function
         self.event_identifiers = event_identifiers
+        self.comparison = comparison
+
+    @staticmethod
+    def compare(first_identifier, first_attribute: str, relation: str, second_identifier, second_attribute: str):
+        """
+        :param relation: one of AttributeComparison.relations
+        :return: the condition (first_identifier.first_attribute relation second_identifier.second_attribute), declared
+        as a comparison so it can be evaluated with hash or range indexes
+        """
+        get_first = operator.attrgetter(first_attribute)
+        get_second = operator.attrgetter(second_attribute)
+        compare = AttributeComparison.relations[relation]
+        return Condition(lambda first, second: compare(get_first(first), get_second(second)),
+                         [first_identifier, second_identifier],
+                         AttributeComparison(first_identifier, first_attribute, relation, second_identifier,
+                                             second_attribute))
+
+    @staticmethod
+    def equals(first_identifier, first_attribute: str, second_identifier, second_attribute: str):
+        """
+        :return: the condition first_identifier.first_attribute == second_identifier.second_attribute, declared as
+        an equi-join so it can be evaluated with hash indexes
+        """
+        return Condition.compare(first_identifier, first_attribute, '==', second_identifier, second_attribute)
+
+    @staticmethod
+    def less_than(first_identifier, first_attribute: str, second_identifier, second_attribute: str):
+        """
+        :return: the condition first_identifier.first_attribute < second_identifier.second_attribute
+        """
+        return Condition.compare(first_identifier, first_attribute, '<', second_identifier, second_attribute)
+
+    @staticmethod
+    def greater_than(first_identifier, first_attribute: str, second_identifier, second_attribute: str):
+        """
+        :return: the condition first_identifier.first_attribute > second_identifier.second_attribute
+        """
+        return Condition.compare(first_identifier, first_attribute, '>', second_identifier, second_attribute)
 
     def check_condition(self, partial_result: PartialResult) -> bool:
         """
@@ -234,11 +1124,165 @@ class Condition:
         need to be called in the condition_apply_function
         :return: true if the condition holds for the relevant events
         """
-        events = partial_result.completely_unpack()
+        return self.condition_apply_function(*[partial_result.get_event(identifier)
+                                               for identifier in self.event_identifiers])
+
+    def check_events(self, events: typing.Dict) -> bool:
+        """
+        :param events: a dictionary from identifier to event, holding (at least) the events of the condition
+        :return: true if the condition holds for the relevant events
+        """
         relevant_events = [events[identifier] for identifier in self.event_identifiers]
         return self.condition_apply_function(*relevant_events)
 
 
+class CompiledCondition(Condition):
+    """
+    A condition compiled from an expression of the pattern language (see StringInputInterface), for example
+    a.volumes > b.volumes. The expression is compiled to a function reading the attributes of the events directly
+    (slot reads for schema events), and its structure is kept so the engine can analyze it
+    """
+    binary_operators = {'Add': '+', 'Sub': '-', 'Mult': '*', 'Div': '/', 'FloorDiv': '//', 'Mod': '%', 'Pow': '**'}
+    unary_operators = {'Not': 'not ', 'USub': '-', 'UAdd': '+'}
+    comparison_operators = {'Eq': '==', 'NotEq': '!=', 'Lt': '<', 'LtE': '<=', 'Gt': '>', 'GtE': '>=', 'In': 'in',
+                            'NotIn': 'not in'}
+    constant_nodes = {'Constant', 'Num', 'Str', 'NameConstant', 'Tuple', 'List'}
+    # every node type an expression may contain, checked before the expression is compiled
+    allowed_nodes = {'BoolOp', 'And', 'Or', 'UnaryOp', 'BinOp', 'Compare', 'Attribute', 'Name', 'Load'} | \
+        set(binary_operators) | set(unary_operators) | set(comparison_operators) | constant_nodes
+
+    def __init__(self, expression: str, condition_apply_function: typing.Callable,
+                 events_function: typing.Callable[[typing.Dict], bool], event_identifiers: typing.List,
+                 attributes: typing.Dict[typing.Any, typing.Tuple[str, ...]], comparison: AttributeComparison = None,
+                 constant_comparison: ConstantComparison = None):
+        """
+        :param expression: the (normalized) source of the condition
+        :param condition_apply_function: the condition as a function of the events, in the order of event_identifiers
+        :param events_function: the condition as a function of a dictionary from identifier to event (see check_events)
+        :param event_identifiers: the identifiers the condition refers to, in order of appearance
+        :param attributes: the attributes of every identifier that the condition reads
+        :param comparison: the structure of the condition, if it compares attributes of two events
+        :param constant_comparison: the structure of the condition, if it compares an attribute to a constant
+        """
+        super().__init__(condition_apply_function, event_identifiers, comparison)
+        self.expression = expression
+        self.events_function = events_function
+        self.attributes = attributes
+        self.constant_comparison = constant_comparison
+
+    def check_events(self, events: typing.Dict) -> bool:
+        return self.events_function(events)
+
+    @staticmethod
+    def to_source(node: ast.AST, identifier_names: typing.Dict[str, str], attributes: typing.Dict) -> str:
+        """
+        generates the (fully parenthesized) source of an expression, allowing only attributes of the pattern events,
+        constants, arithmetic, comparisons and boolean operators
+        :param node: the expression
+        :param identifier_names: the source that replaces every identifier
+        :param attributes: filled with the attributes read of every identifier, in order of appearance
+        :return: the source of the expression
+        """
+        kind = type(node).__name__
+        if kind == 'BoolOp':
+            separator = ' and ' if isinstance(node.op, ast.And) else ' or '
+            return '(' + separator.join(CompiledCondition.to_source(value, identifier_names, attributes)
+                                        for value in node.values) + ')'
+        if kind == 'UnaryOp' and type(node.op).__name__ in CompiledCondition.unary_operators:
+            return '(' + CompiledCondition.unary_operators[type(node.op).__name__] + \
+                   CompiledCondition.to_source(node.operand, identifier_names, attributes) + ')'
+        if kind == 'BinOp' and type(node.op).__name__ in CompiledCondition.binary_operators:
+            return '(' + CompiledCondition.to_source(node.left, identifier_names, attributes) + ' ' + \
+                   CompiledCondition.binary_operators[type(node.op).__name__] + ' ' + \
+                   CompiledCondition.to_source(node.right, identifier_names, attributes) + ')'
+        if kind == 'Compare':
+            source = CompiledCondition.to_source(node.left, identifier_names, attributes)
+            for comparison_operator, comparator in zip(node.ops, node.comparators):
+                if type(comparison_operator).__name__ not in CompiledCondition.comparison_operators:
+                    raise ValueError("unsupported comparison in condition")
+                source += ' ' + CompiledCondition.comparison_operators[type(comparison_operator).__name__] + ' ' + \
+                          CompiledCondition.to_source(comparator, identifier_names, attributes)
+            return '(' + source + ')'
+        if kind == 'Attribute':
+            if not isinstance(node.value, ast.Name) or node.value.id not in identifier_names:
+                raise ValueError("conditions may only read attributes of the pattern events")
+            if node.attr.startswith('_'):
+                raise ValueError("conditions may not read private attribute {}".format(node.attr))
+            identifier_attributes = attributes.setdefault(node.value.id, [])
+            if node.attr not in identifier_attributes:
+                identifier_attributes.append(node.attr)
+            return identifier_names[node.value.id] + '.' + node.attr
+        if kind in CompiledCondition.constant_nodes:
+            return repr(CompiledCondition.get_constant(node))
+        raise ValueError("unsupported expression in condition: {}".format(kind))
+
+    @staticmethod
+    def check_nodes(node: ast.AST):
+        """
+        raises a ValueError if the expression contains a node of a type that is not in allowed_nodes
+        """
+        for child in ast.walk(node):
+            kind = type(child).__name__
+            if kind not in CompiledCondition.allowed_nodes:
+                raise ValueError("unsupported expression in condition: {}".format(kind))
+
+    @staticmethod
+    def get_constant(node: ast.AST):
+        """
+        :return: the value of a constant expression (lists are converted to tuples)
+        """
+        value = ast.literal_eval(node)
+        return tuple(value) if isinstance(value, list) else value
+
+    @staticmethod
+    def get_structure(node: ast.AST) -> typing.Tuple[typing.Optional[AttributeComparison],
+                                                     typing.Optional[ConstantComparison]]:
+        """
+        :return: the attribute comparison or the constant comparison that the expression is (None for other
+        expressions)
+        """
+        if type(node).__name__ != 'Compare' or len(node.ops) != 1:
+            return None, None
+        relation = CompiledCondition.comparison_operators.get(type(node.ops[0]).__name__)
+        left, right = node.left, node.comparators[0]
+        left_is_attribute = isinstance(left, ast.Attribute)
+        right_is_attribute = isinstance(right, ast.Attribute)
+        if left_is_attribute and right_is_attribute:
+            if left.value.id != right.value.id and relation in AttributeComparison.relations:
+                return AttributeComparison(left.value.id, left.attr, relation, right.value.id, right.attr), None
+        elif left_is_attribute and type(right).__name__ in CompiledCondition.constant_nodes:
+            return None, ConstantComparison(left.value.id, left.attr, relation, CompiledCondition.get_constant(right))
+        elif right_is_attribute and type(left).__name__ in CompiledCondition.constant_nodes and \
+                relation in ConstantComparison.flipped_relations:
+            return None, ConstantComparison(right.value.id, right.attr, ConstantComparison.flipped_relations[relation],
+                                            CompiledCondition.get_constant(left))
+        return None, None
+
+    @staticmethod
+    def compile(node: ast.AST, identifiers: typing.Iterable[str]) -> 'CompiledCondition':
+        """
+        :param node: the expression of the condition
+        :param identifiers: the identifiers of the pattern events
+        :return: the compiled condition
+        """
+        CompiledCondition.check_nodes(node)
+        attributes = {}
+        expression = CompiledCondition.to_source(node, {identifier: identifier for identifier in identifiers},
+                                                 attributes)
+        event_identifiers = list(attributes)
+        if not event_identifiers:
+            raise ValueError("condition {} does not refer to any event".format(expression))
+        namespace = {'__builtins__': {}}
+        condition_apply_function = eval('lambda {}: {}'.format(', '.join(event_identifiers), expression), namespace)
+        events_source = CompiledCondition.to_source(
+            node, {identifier: 'events[{!r}]'.format(identifier) for identifier in event_identifiers}, {})
+        events_function = eval('lambda events: {}'.format(events_source), namespace)
+        comparison, constant_comparison = CompiledCondition.get_structure(node)
+        return CompiledCondition(expression, condition_apply_function, events_function, event_identifiers,
+                                 {identifier: tuple(names) for identifier, names in attributes.items()},
+                                 comparison, constant_comparison)
+
+
 class PatternQuery:
     """
     This is an abstract class representing a possible input for a possible interface. In order to create new ways of
@@ -264,25 +1308,170 @@ class CleanPatternQuery(PatternQuery):
 class StringPatternQuery(PatternQuery):
     """
     This class represents a pattern query, its input is a string in the following form:
-    WHERE
+    PATTERN SEQ(AAME a, MCRS b, AAME c) WHERE a.volumes > b.volumes AND c.peak_price < 100 WITHIN 5
+    The operator is SEQ or AND, and every event is an event type followed by its identifier. The optional WHERE clause
+    is a boolean expression over the attributes of the events (python syntax, with AND, OR, NOT and = also accepted).
+    WITHIN gives the time limit, or the window size if it is followed by EVENTS
     """
-    # def __init__(self, pattern_query: str):
+    def __init__(self, pattern_query: str):
+        self.pattern_query = pattern_query
 
 
 class Operator:
     """
     Abstract class representing an operator
     """
+    def __init__(self):
+        # cache of the plans of get_combinations, see get_combination_plan
+        self.combination_plans = {}
+
     def get_new_results(self, children_buffers: typing.List[MemoryModel],
-                        new_result: PartialResult, identifier) -> typing.List[PartialResult]:
+                        new_result: PartialResult, identifier, conditions: typing.List['Condition'] = (),
+                        time_limit=None, layout: tuple = None) -> typing.List[PartialResult]:
         """
         :param children_buffers: list where each cell is a list that holds partial matches
         :param new_result: the new partial results to be composed to existing partial results
         :param identifier: the relevant identifier
+        :param conditions: conditions that the new results must satisfy
+        :param time_limit: if given, the new results must be within it
+        :param layout: the layout of the new results (the identifiers of the node), by default the identifiers of the
+        children buffers followed by those of the new result
         :return: new results composed of the new result and a partial results from each child buffer
         """
         pass
 
+    def get_order_check(self, children_buffers: typing.List[MemoryModel], new_result: PartialResult) \
+            -> typing.Optional[typing.Callable[[PartialResult, int, typing.List[PartialResult]], bool]]:
+        """
+        :return: None if the operator does not restrict the order of the partial results, otherwise a function of
+        (partial result, depth, chosen partial results) that returns True if the partial result, chosen for the buffer
+        in depth, is correctly ordered relative to the new result and to the partial results chosen for the previous
+        buffers
+        """
+        return None
+
+    @staticmethod
+    def get_slots_getter(positions: typing.Sequence[int]) -> typing.Callable[[tuple], tuple]:
+        """
+        :return: a function returning the tuple of the slots in the given positions
+        """
+        if len(positions) == 1:
+            position = positions[0]
+            return lambda events: (events[position],)
+        if not positions:
+            return lambda events: ()
+        return operator.itemgetter(*positions)
+
+    def get_combination_plan(self, children_buffers: typing.List[MemoryModel], new_result: PartialResult,
+                             conditions: typing.List['Condition'], layout: typing.Optional[tuple]) -> tuple:
+        """
+        while a combination is built, its events are bound in a flat tuple: the events of the new result followed by
+        those of the partial results chosen for the buffers so far. Every condition is checked once all its events are
+        bound, with its arguments taken from the tuple by their precomputed positions
+        :return: (the conditions checked on the new result alone, the conditions checked in every depth, a function
+        ordering the bound events by the layout of the new results or None if they are already in this order, the
+        layout of the new results), where every condition is a (condition function, arguments getter) pair. The plan
+        depends only on the layouts and the conditions, so it is cached
+        """
+        key = (new_result.layout, tuple(buffer[0].layout for buffer in children_buffers), tuple(conditions), layout)
+        plan = self.combination_plans.get(key)
+        if plan is not None:
+            return plan
+        bound_layout = list(new_result.layout)
+        remaining_conditions = list(conditions)
+
+        def pop_bound_conditions():
+            nonlocal remaining_conditions
+            positions = {identifier: position for position, identifier in enumerate(bound_layout)}
+            bound_conditions = [(condition.condition_apply_function,
+                                 self.get_slots_getter([positions[identifier]
+                                                        for identifier in condition.event_identifiers]))
+                                for condition in remaining_conditions if positions.keys() >=
+                                set(condition.event_identifiers)]
+            remaining_conditions = [condition for condition in remaining_conditions
+                                    if not positions.keys() >= set(condition.event_identifiers)]
+            return bound_conditions
+
+        initial_conditions = pop_bound_conditions()
+        depth_conditions = []
+        for buffer in children_buffers:
+            bound_layout.extend(buffer[0].layout)
+            depth_conditions.append(pop_bound_conditions())
+        if remaining_conditions:
+            raise ValueError("a condition refers to identifiers that the combinations do not hold")
+        bound_layout = tuple(bound_layout)
+        if layout is None:
+            layout = bound_layout[len(new_result.layout):] + new_result.layout
+        ordering = None
+        if layout != bound_layout:
+            ordering = self.get_slots_getter([bound_layout.index(identifier) for identifier in layout])
+        plan = self.combination_plans[key] = (initial_conditions, depth_conditions, ordering, layout)
+        return plan
+
+    def get_combinations(self, children_buffers: typing.List[MemoryModel], new_result: PartialResult, identifier,
+                         conditions: typing.List['Condition'] = (), time_limit=None, layout: tuple = None) \
+            -> typing.List[PartialResult]:
+        """
+        the combinations are built one child buffer at a time (in the same order as get_all_possible_combinations), and
+        a partial result is only chosen if it shares no event with the partial results chosen so far, and they keep the
+        order of the operator, are within the time limit and satisfy every condition whose events are all bound, so
+        combinations that fail are abandoned as early as possible. The events of a combination are merged by
+        concatenating the slots of its partial results
+        :param children_buffers: list where each cell is a list that holds partial matches
+        :param new_result: the new partial results to be composed to existing partial results
+        :param identifier: the relevant identifier
+        :param conditions: conditions that the combinations must satisfy
+        :param time_limit: if given, the combinations must be within it
+        :param layout: see get_new_results
+        :return: every combination satisfying the above
+        """
+        for buffer in children_buffers:
+            if not buffer:
+                return []
+        initial_conditions, depth_conditions, ordering, layout = \
+            self.get_combination_plan(children_buffers, new_result, conditions, layout)
+        if not all(function(*getter(new_result.events)) for function, getter in initial_conditions):
+            return []
+        is_ordered = self.get_order_check(children_buffers, new_result)
+        chosen = [None] * len(children_buffers) + [new_result]
+        operator_type = type(self)
+        result = []
+
+        def extend(depth, events, start_time, end_time, sequence_ids):
+            if depth == len(children_buffers):
+                result.append(PartialResult(ordering(events) if ordering is not None else events, layout,
+                                            start_time, end_time, identifier, operator_type, sequence_ids))
+                return
+            conditions_in_depth = depth_conditions[depth]
+            for partial_result in children_buffers[depth]:
+                if not sequence_ids.isdisjoint(partial_result.sequence_ids):
+                    continue
+                if is_ordered is not None and not is_ordered(partial_result, depth, chosen):
+                    continue
+                new_start_time = min(start_time, partial_result.start_time)
+                new_end_time = max(end_time, partial_result.end_time)
+                if time_limit is not None and new_end_time - new_start_time > time_limit:
+                    continue
+                new_events = events + partial_result.events
+                if conditions_in_depth and \
+                        not all(function(*getter(new_events)) for function, getter in conditions_in_depth):
+                    continue
+                chosen[depth] = partial_result
+                extend(depth + 1, new_events, new_start_time, new_end_time,
+                       sequence_ids | partial_result.sequence_ids)
+
+        extend(0, new_result.events, new_result.start_time, new_result.end_time, new_result.sequence_ids)
+        return result
+
+    def get_start_time_range(self, child_identifier, new_result: PartialResult):
+        """
+        :param child_identifier: the identifier of the partial results of a child node
+        :param new_result: the new partial results to be composed to existing partial results
+        :return: (minimal start time, maximal start time) of the partial results of the child that can be composed with
+        the new result, None for no bound
+        """
+        return None, None
+
     @staticmethod
     def get_all_possible_combinations(children_buffers: typing.List[MemoryModel],
                                       new_result: PartialResult):
@@ -301,21 +1490,22 @@ class Operator:
             result.update(partial_result.unpack())
         return result
 
+    @staticmethod
+    def contains_same_event(events: typing.Sequence) -> bool:
+        """
+        :return: True if the same event (an event of the same sequence id) appears multiple times in the events, False
+        otherwise
+        """
+        return len({event.sequence_id for event in events}) != len(events)
+
     @staticmethod
     def contains_same_event_multiple_times(partial_results) -> bool:
         """
         :param partial_results:
         :return: True checks if the partial results contains the same event multiple times, False otherwise
         """
-        s = set()
-        for partial_result in partial_results:
-            events = partial_result.completely_unpack()
-            for event in events.values():
-                value_representation = tuple(event.attributes.values())
-                if value_representation in s:
-                    return True
-                s.add(value_representation)
-        return False
+        return len(frozenset().union(*(partial_result.sequence_ids for partial_result in partial_results))) != \
+            sum(len(partial_result.sequence_ids) for partial_result in partial_results)
 
 
 class Seq(Operator):
@@ -326,7 +1516,9 @@ class Seq(Operator):
         """
         :param identifiers_order: an iterable defining the order of the identifiers in the seq
         """
+        super().__init__()
         self.identifiers_order = identifiers_order
+        self.identifier_positions = {identifier: i for i, identifier in enumerate(identifiers_order)}
 
     @staticmethod
     def get_sorted_by_identifier_order(partial_results_dict, identifiers_order):
@@ -340,24 +1532,58 @@ class Seq(Operator):
             events_ordered.append(partial_results_dict[identifier])
         return events_ordered
 
+    def get_start_time_range(self, child_identifier, new_result: PartialResult):
+        """
+        partial results of a child preceding the new result in the seq must end (and therefore start) before it starts,
+        and partial results of a child following it must start after it ends
+        """
+        child_position = self.identifier_positions.get(child_identifier)
+        new_result_position = self.identifier_positions.get(new_result.identifier)
+        if child_position is None or new_result_position is None:
+            return None, None
+        if child_position < new_result_position:
+            return None, new_result.start_time
+        return new_result.end_time, None
+
+    def get_order_check(self, children_buffers: typing.List[MemoryModel], new_result: PartialResult) \
+            -> typing.Callable[[PartialResult, int, typing.List[PartialResult]], bool]:
+        """
+        a partial result is only chosen if it is correctly ordered relative to the new result and the partial results
+        already chosen, so out of order combinations are never enumerated
+        """
+        positions = [self.identifier_positions[buffer[0].identifier] for buffer in children_buffers]
+        chosen_positions = positions + [self.identifier_positions[new_result.identifier]]
+
+        def is_ordered(partial_result, depth, chosen):
+            """
+            :return: True if the partial result chosen for the buffer in depth is ordered relative to the new result and
+            to the partial results chosen for the buffers before depth
+            """
+            position = positions[depth]
+            for other, other_position in itertools.chain(zip(chosen[:depth], chosen_positions[:depth]),
+                                                         ((new_result, chosen_positions[-1]),)):
+                if position < other_position:
+                    if partial_result.end_time > other.start_time:
+                        return False
+                elif partial_result.start_time < other.end_time:
+                    return False
+            return True
+
+        return is_ordered
+
     def get_new_results(self, children_buffers: typing.List[MemoryModel],
-                        new_result: PartialResult, identifier) -> typing.List[PartialResult]:
+                        new_result: PartialResult, identifier, conditions: typing.List['Condition'] = (),
+                        time_limit=None, layout: tuple = None) -> typing.List[PartialResult]:
         """
         :param children_buffers: list where each cell is a list that holds partial matches
         :param new_result: the new partial results to be composed to existing partial results
         :param identifier: the relevant identifier
-        :return: returns every ordered combination that does not contain the same event twice
+        :param conditions: conditions that the new results must satisfy
+        :param time_limit: if given, the new results must be within it
+        :param layout: see Operator.get_new_results
+        :return: returns every ordered combination that does not contain the same event twice (see get_combinations)
         """
-        result = []
-        for partial_results in self.get_all_possible_combinations(children_buffers, new_result):
-            partial_results_dict = self.get_events_from_partial_results(partial_results)
-            if not self.contains_same_event_multiple_times(partial_results_dict.values()):
-                partial_results_ordered = self.get_sorted_by_identifier_order(partial_results_dict,
-                                                                              self.identifiers_order)
-                if all(partial_results_ordered[i].end_time <= partial_results_ordered[i + 1].start_time
-                       for i in range(len(partial_results_ordered) - 1)):
-                    result.append(PartialResult.init_with_partial_results(partial_results, Seq, identifier))
-        return result
+        return self.get_combinations(children_buffers, new_result, identifier, conditions, time_limit, layout)
 
 
 class And(Operator):
@@ -365,19 +1591,21 @@ class And(Operator):
     Class representing an and operator
     """
     def __init__(self, *args):
-        pass
+        super().__init__()
 
     def get_new_results(self, children_buffers: typing.List[MemoryModel],
-                        new_result: PartialResult, identifier) -> typing.List[PartialResult]:
+                        new_result: PartialResult, identifier, conditions: typing.List['Condition'] = (),
+                        time_limit=None, layout: tuple = None) -> typing.List[PartialResult]:
         """
         :param children_buffers: list where each cell is a list that holds partial matches
         :param new_result: the new partial results to be composed to existing partial results
         :param identifier: the relevant identifier
-        :return: returns every combination that does not contain the same event twice
+        :param conditions: conditions that the new results must satisfy
+        :param time_limit: if given, the new results must be within it
+        :param layout: see Operator.get_new_results
+        :return: returns every combination that does not contain the same event twice (see get_combinations)
         """
-        return [PartialResult.init_with_partial_results(partial_results, And, identifier) for partial_results in
-                self.get_all_possible_combinations(children_buffers, new_result) if not
-                self.contains_same_event_multiple_times(self.get_events_from_partial_results(partial_results).values())]
+        return self.get_combinations(children_buffers, new_result, identifier, conditions, time_limit, layout)
 
 
 class InputInterface:
@@ -400,8 +1628,88 @@ class TrivialInputInterface(InputInterface):
 
 class StringInputInterface(InputInterface):
     """
-    This interface gets a StringPatternQuery.
+    This interface gets a StringPatternQuery. Every top level conjunct of the WHERE clause becomes a CompiledCondition
     """
+    pattern_regex = re.compile(r'^\s*PATTERN\s+(?P<operator>\w+)\s*\((?P<events>[^()]*)\)\s*'
+                               r'(?:WHERE\s+(?P<conditions>.*?)\s+)?WITHIN\s+(?P<time_limit>[^\s]+)\s*'
+                               r'(?P<const_window>EVENTS)?\s*$', re.IGNORECASE | re.DOTALL)
+    operators = {'SEQ': Seq, 'AND': And}
+    keywords = {'AND': 'and', 'OR': 'or', 'NOT': 'not'}
+
+    def get_clean_pattern_queries(self, pattern_queries: typing.Iterable[StringPatternQuery]) \
+            -> typing.Iterable[CleanPatternQuery]:
+        return [self.parse(pattern_query.pattern_query) for pattern_query in pattern_queries]
+
+    @staticmethod
+    def parse_events(events: str) -> typing.List[EventTypeOrPatternAndIdentifier]:
+        """
+        :param events: the events of the pattern, for example "AAME a, MCRS b"
+        :return: the events with their identifiers
+        """
+        events_and_identifiers = []
+        for event in events.split(','):
+            parts = event.split()
+            if len(parts) != 2 or not parts[1].isidentifier() or keyword.iskeyword(parts[1]):
+                raise ValueError("expected an event type and an identifier, got '{}'".format(event.strip()))
+            if any(parts[1] == other.identifier for other in events_and_identifiers):
+                raise ValueError("identifier {} is used twice".format(parts[1]))
+            events_and_identifiers.append(EventTypeOrPatternAndIdentifier(parts[0], parts[1]))
+        return events_and_identifiers
+
+    @staticmethod
+    def to_python(conditions: str) -> str:
+        """
+        :return: the conditions with the keywords of the language replaced by python's
+        """
+        tokens = []
+        for token in tokenize.generate_tokens(io.StringIO(conditions.strip()).readline):
+            token_string = token.string
+            if token.type == tokenize.NAME:
+                token_string = StringInputInterface.keywords.get(token_string.upper(), token_string)
+            elif token.type == tokenize.OP and token_string == '=':
+                token_string = '=='
+            elif token.type in (tokenize.NL, tokenize.NEWLINE):
+                token_string = ' '
+            tokens.append((token.type, token_string))
+        return tokenize.untokenize(tokens).strip()
+
+    @staticmethod
+    def parse_conditions(conditions: str, identifiers: typing.List[str]) -> typing.List[CompiledCondition]:
+        """
+        :return: a condition for every top level conjunct of the conditions
+        """
+        try:
+            expression = ast.parse(StringInputInterface.to_python(conditions), mode='eval').body
+        except (SyntaxError, tokenize.TokenError) as error:
+            raise ValueError("invalid WHERE clause '{}': {}".format(conditions, error))
+        conjuncts = expression.values if isinstance(expression, ast.BoolOp) and isinstance(expression.op, ast.And) \
+            else [expression]
+        return [CompiledCondition.compile(conjunct, identifiers) for conjunct in conjuncts]
+
+    @staticmethod
+    def parse(pattern_query: str) -> CleanPatternQuery:
+        """
+        :param pattern_query: a pattern query in the form described in StringPatternQuery
+        :return: the clean pattern query
+        """
+        match = StringInputInterface.pattern_regex.match(pattern_query)
+        if match is None:
+            raise ValueError("invalid pattern query '{}'".format(pattern_query))
+        operator_type = StringInputInterface.operators.get(match.group('operator').upper())
+        if operator_type is None:
+            raise ValueError("unknown operator {}".format(match.group('operator')))
+        events = StringInputInterface.parse_events(match.group('events'))
+        identifiers = [event.identifier for event in events]
+        conditions = StringInputInterface.parse_conditions(match.group('conditions'), identifiers) \
+            if match.group('conditions') else []
+        try:
+            time_limit = ast.literal_eval(match.group('time_limit'))
+        except (SyntaxError, ValueError):
+            time_limit = None
+        if isinstance(time_limit, bool) or not isinstance(time_limit, (int, float)):
+            raise ValueError("invalid time limit {}".format(match.group('time_limit')))
+        return CleanPatternQuery(EventPattern(events, operator_type(identifiers)), conditions, time_limit,
+                                 use_const_window=match.group('const_window') is not None)
 
 
 class OutputInterface:
@@ -419,6 +1727,12 @@ class OutputInterface:
         """
         pass
 
+    def close(self):
+        """
+        called when the processing of the stream ends, to release the resources of the output interface
+        """
+        pass
+
 
 class TrivialOutputInterface(OutputInterface):
     """
@@ -432,6 +1746,52 @@ class TrivialOutputInterface(OutputInterface):
         return False
 
 
+class CollectingOutputInterface(OutputInterface):
+    """
+    An output interface that keeps the results it gets, to be taken by pop_results
+    """
+    def __init__(self, output_while_running: bool = True):
+        """
+        :param output_while_running: if True the results are passed to this interface while the stream is processed
+        """
+        self.results = []
+        self.collect_while_running = output_while_running
+
+    def output_results(self, results):
+        self.results.extend(results)
+        return results
+
+    def output_while_running(self) -> bool:
+        return self.collect_while_running
+
+    def pop_results(self) -> typing.List:
+        results = self.results
+        self.results = []
+        return results
+
+
+class SharedListOutputInterface(OutputInterface):
+    """
+    An output interface that appends (query index, match) pairs to a list shared by the output interfaces of several
+    queries, so the matches of all the queries can be consumed in the order they were found
+    """
+    def __init__(self, query_index: int, matches: typing.List[typing.Tuple[int, typing.List]]):
+        """
+        :param query_index: the index of the query of this output interface
+        :param matches: the shared list
+        """
+        self.query_index = query_index
+        self.matches = matches
+
+    def output_results(self, results):
+        self.matches.extend((self.query_index, result) for result in results)
+        return results
+
+    @staticmethod
+    def output_while_running() -> bool:
+        return True
+
+
 class FileOutputInterface(OutputInterface):
     """
     An OutputInterface that outputs the results to a file
@@ -443,18 +1803,15 @@ class FileOutputInterface(OutputInterface):
         self.output_file = output_file
         self.first_call = True
 
-    def output_results(self, query_result):
-        def result_to_str(_result: typing.List[Event]):
-            s = " ###result### \n"
-            for event in _result:
-                s += str(event) + "\n"
-            s += " ### "
-            return s
+    @staticmethod
+    def result_to_str(result: typing.List[Event]) -> str:
+        return " ###result### \n" + "".join([str(event) + "\n" for event in result]) + " ### "
 
+    def output_results(self, query_result):
         output = open(self.output_file, 'a') if not self.first_call else open(self.output_file, 'w+')
         self.first_call = False
         for result in query_result:
-            output.write(result_to_str(result))
+            output.write(self.result_to_str(result))
         output.close()
         return query_result
 
@@ -463,13 +1820,226 @@ class FileOutputInterface(OutputInterface):
         return True
 
 
+class BufferedFileOutputInterface(FileOutputInterface):
+    """
+    An OutputInterface that outputs the results to a file in the format of FileOutputInterface, but keeps the file open
+    and writes the results in batches: the results are buffered until their size reaches buffer_size characters or
+    until flush_interval seconds passed since the first of them was buffered (a timer thread writes them then, even if
+    no other results arrive), and the rest are written when the interface is closed (the Processor closes the output
+    interfaces at the end of a query)
+    """
+    compressions = {'gzip': gzip.open, 'bz2': bz2.open, 'lzma': lzma.open}
+
+    def __init__(self, output_file: str, buffer_size: int = 1 << 16, flush_interval: float = 1.0,
+                 compression: str = None):
+        """
+        :param output_file: file path to output results to
+        :param buffer_size: the number of characters buffered before they are written
+        :param flush_interval: the maximal number of seconds results are buffered for, None for no limit
+        :param compression: None or one of compressions, the compression of the output file
+        """
+        super().__init__(output_file)
+        if compression is not None and compression not in self.compressions:
+            raise ValueError("unsupported compression %s, expected one of %s" %
+                             (compression, ', '.join(self.compressions)))
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.compression = compression
+        self.output = None
+        self.buffer = []
+        self.buffered_size = 0
+        # the timer writing the buffered results once flush_interval passed, and the lock of the buffer and the file,
+        # which the timer thread uses too
+        self.flush_timer = None
+        self.lock = threading.Lock()
+
+    def open(self):
+        mode = 'a' if not self.first_call else 'w'
+        self.first_call = False
+        if self.compression is None:
+            self.output = open(self.output_file, mode)
+        else:
+            self.output = self.compressions[self.compression](self.output_file, mode + 't')
+
+    def output_results(self, query_result):
+        with self.lock:
+            if self.output is None:
+                self.open()
+            for result in query_result:
+                result_str = self.result_to_str(result)
+                self.buffer.append(result_str)
+                self.buffered_size += len(result_str)
+            if self.buffered_size >= self.buffer_size:
+                self._flush()
+            elif self.buffer and self.flush_interval is not None and self.flush_timer is None:
+                self.flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self.flush_timer.daemon = True
+                self.flush_timer.start()
+        return query_result
+
+    def flush(self):
+        """
+        writes the buffered results to the file
+        """
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if self.flush_timer is not None:
+            self.flush_timer.cancel()
+            self.flush_timer = None
+        if self.buffer:
+            self.output.write(''.join(self.buffer))
+            self.buffer = []
+            self.buffered_size = 0
+        if self.output is not None:
+            self.output.flush()
+
+    def close(self):
+        """
+        writes the buffered results and closes the file (later results are appended to it)
+        """
+        with self.lock:
+            if self.output is None:
+                return
+            self._flush()
+            self.output.close()
+            self.output = None
+
+
+class EventBatch:
+    """
+    A micro batch of consecutive events of the stream, whose attributes are also available as columns (numpy arrays if
+    numpy is installed, otherwise lists) so events can be grouped by type and filtered by constant comparisons for the
+    whole batch at once
+    """
+    def __init__(self, events: typing.List, time_name: str):
+        """
+        :param events: the events of the batch, in stream order
+        :param time_name: the name of the time attribute
+        """
+        self.events = events
+        self.time_name = time_name
+        self.columns = {}
+        self.types = None
+        self.type_indices = None
+        self.masks = {}
+
+    @staticmethod
+    def to_array(values: typing.List):
+        """
+        :return: the values as a numpy array comparing like the values themselves: columns of mixed (or other than int,
+        float and str) types are kept as python objects, so numpy does not convert them
+        """
+        value_types = set(map(type, values))
+        if len(value_types) == 1 and value_types.pop() in (int, float, str):
+            array = numpy.array(values)
+            if array.dtype.kind in 'iufU':
+                return array
+        array = numpy.empty(len(values), dtype=object)
+        array[:] = values
+        return array
+
+    def get_column(self, attribute: str):
+        """
+        :return: the values of the attribute in all the events of the batch
+        """
+        column = self.columns.get(attribute)
+        if column is None:
+            values = list(map(operator.attrgetter(attribute), self.events))
+            column = self.columns[attribute] = self.to_array(values) if numpy is not None else values
+        return column
+
+    def get_type_indices(self, event_type) -> typing.Sequence[int]:
+        """
+        :return: the (increasing) indices of the events of the given type in the batch
+        """
+        if self.type_indices is None:
+            self.type_indices = {}
+            types = list(map(operator.methodcaller('get_type'), self.events))
+            if numpy is not None:
+                self.types = self.to_array(types)
+            else:
+                for index, event_type_of_index in enumerate(types):
+                    self.type_indices.setdefault(event_type_of_index, []).append(index)
+        indices = self.type_indices.get(event_type)
+        if indices is None:
+            if numpy is None:
+                return []
+            indices = self.type_indices[event_type] = numpy.flatnonzero(self.types == event_type)
+        return indices
+
+    def get_mask(self, comparison: ConstantComparison):
+        """
+        :return: a boolean numpy array holding for every event of the batch whether it satisfies the comparison
+        """
+        key = (comparison.attribute, comparison.relation, comparison.value)
+        mask = self.masks.get(key)
+        if mask is None:
+            column = self.get_column(comparison.attribute)
+            if comparison.relation in ('in', 'not in'):
+                mask = numpy.zeros(len(column), dtype=bool)
+                for value in comparison.value:
+                    mask |= numpy.asarray(column == value, dtype=bool)
+                if comparison.relation == 'not in':
+                    mask = ~mask
+            else:
+                mask = ConstantComparison.relations[comparison.relation](column, comparison.value)
+            if numpy.shape(mask) != (len(column),):
+                raise TypeError("the comparison can not be applied to the column")
+            mask = self.masks[key] = numpy.asarray(mask, dtype=bool)
+        return mask
+
+    def filter(self, indices: typing.Sequence[int], comparisons: typing.List[ConstantComparison]) \
+            -> typing.Tuple[typing.List[int], typing.List[ConstantComparison]]:
+        """
+        :param indices: increasing indices of events in the batch
+        :param comparisons: constant comparisons of the events' attributes
+        :return: the indices of the events satisfying the comparisons, and the comparisons that could not be applied
+        to the whole batch (for example a comparison of a text attribute to a number), which are left to be checked
+        event by event
+        """
+        failed_comparisons = []
+        if numpy is None:
+            for comparison in comparisons:
+                column = self.get_column(comparison.attribute)
+                relation = ConstantComparison.relations[comparison.relation]
+                try:
+                    indices = [index for index in indices if relation(column[index], comparison.value)]
+                except TypeError:
+                    failed_comparisons.append(comparison)
+            return list(indices), failed_comparisons
+        indices = numpy.asarray(indices, dtype=numpy.intp)
+        for comparison in comparisons:
+            try:
+                mask = self.get_mask(comparison)
+            except (TypeError, ValueError):
+                failed_comparisons.append(comparison)
+                continue
+            indices = indices[mask[indices]]
+        return indices.tolist(), failed_comparisons
+
+
 class EvaluationModel:
     """
     An abstract class responsible of processing events
     """
     def handle_event(self, event, event_counter):
+        """
+        :param event: the event to handle
+        :param event_counter: the position of the event in the stream
+        """
         pass
 
+    def handle_event_batch(self, batch: EventBatch, first_counter: int):
+        """
+        handles the events of a batch, as handle_event handles them one by one
+        :param batch: the events to handle
+        :param first_counter: the event counter of the first event in the batch
+        """
+        for counter, event in enumerate(batch.events, first_counter):
+            self.handle_event(event, counter)
+
     def set_pattern_queries(self, pattern_queries: typing.Iterable[CleanPatternQuery],
                             output_interfaces: typing.List[OutputInterface]):
         """
@@ -1,6 +1,16 @@
 from . import processing_utilities
 import typing
-from .file_sort import sort_file
+import csv
+import itertools
+import os
+import multiprocessing
+import asyncio
+import mmap
+from .file_sort import sort_file, get_sorted_path
+from .time_index import TimeIndex
+from .columnar_cache import ColumnarCache, ColumnBuilder
+from . import parallel_processing
+from .async_event_sources import AsyncEventSource
 
 
 class Processor:
@@ -8,9 +18,15 @@ class Processor:
     This class represents the main complex event processor
     """
     sorted_prefix = 'sorted_'
+    parse_batch_size = 8192
+    read_block_size = 1 << 20
+    # bytes between the lines indexed by the time index of the input file
+    time_index_step = 1 << 16
+    columnar_cache_suffix = '.columns'
 
     def __init__(self, data_file_path: str, attribute_names: typing.List[str], time_attribute_index: int,
-                 type_attribute_index: int, sorted_by_time=True):
+                 type_attribute_index: int, sorted_by_time=True, use_compact_events=False,
+                 attribute_types: typing.List[typing.Callable] = None, use_columnar_cache=False):
         """
         initializes all the needed parameters and sorts the input file according to time (if needed)
         :param data_file_path: input file path
@@ -18,42 +34,493 @@ class Processor:
         :param time_attribute_index: the index of the time attribute in attribute_names
         :param type_attribute_index: the index of the event type (name) attribute in attribute_names
         :param sorted_by_time: whether or not the input file is sorted by the time attribute
+        :param use_compact_events: if True events are created by an EventSchema (slotted, no per event dictionary,
+        so new attributes can not be set on them), otherwise processing_utilities.Event is used
+        :param attribute_types: the types of the attributes (for example data_formats.metastock7_attribute_types).
+        If given, the input file is parsed in batches and each column is converted by its type. Otherwise the type of
+        every value is guessed
+        :param use_columnar_cache: if True, the events of the input file are cached in a binary columnar file next to
+        it (see ColumnarCache) the first time the whole file is read, and later reads load the cached columns through a
+        memory map instead of parsing the file. The cache is valid as long as the file and the schema do not change
         """
         self.data_file_path = data_file_path
         self.attribute_names = attribute_names
+        self.time_attribute_index = time_attribute_index
         self.time_name = attribute_names[time_attribute_index]
         self.type_name = attribute_names[type_attribute_index]
+        self.attribute_types = attribute_types
+        self.use_columnar_cache = use_columnar_cache
+        self.event_schema = processing_utilities.EventSchema(attribute_names, time_attribute_index,
+                                                             type_attribute_index, attribute_types) \
+            if use_compact_events else None
         if not sorted_by_time:
-            self.data_file_path = Processor.sorted_prefix + self.data_file_path
-            sort_file(time_attribute_index, data_file_path, self.data_file_path)
+            # the sorted file is used, or the input file itself if it turns out to be sorted
+            self.data_file_path = sort_file(time_attribute_index, data_file_path,
+                                            get_sorted_path(data_file_path, Processor.sorted_prefix),
+                                            attribute_types[time_attribute_index] if attribute_types is not None
+                                            else Processor.convert_value)
+
+    @staticmethod
+    def convert_value(value: str):
+        """
+        :return: the value of an attribute of an unknown type
+        """
+        def isfloat(val: str):
+            try:
+                float(val)
+                return True
+            except ValueError:
+                return False
+        if str.isdigit(value):
+            return int(value)
+        if isfloat(value):
+            return float(value)
+        return value
 
     def get_event_from_line(self, line):
         """
         parses a line from the event input file into an event class
         :param line: the line from the input file representing to current event
         """
-        def convert_value(value: str):
-            def isfloat(val: str):
-                try:
-                    float(val)
-                    return True
-                except ValueError:
-                    return False
-            if str.isdigit(value):
-                return int(value)
-            if isfloat(value):
-                return float(value)
-            return value
-        values = line[:-1].split(',')
+        values = line.rstrip('\r\n').split(',')
         for i, value in enumerate(values):
-            values[i] = convert_value(value)
-        new_event = processing_utilities.Event(self.attribute_names, values, self.time_name, self.type_name)
-        return new_event
+            values[i] = self.convert_value(value)
+        return self.create_event(values)
+
+    def parse_time(self, value: str):
+        """
+        :return: the value of a time attribute
+        """
+        if self.attribute_types is None:
+            return self.convert_value(value)
+        return self.attribute_types[self.time_attribute_index](value)
+
+    def create_event(self, values: typing.Sequence):
+        """
+        :param values: the (already converted) attributes values of the event
+        :return: a new event holding the values
+        """
+        if self.event_schema is not None:
+            return self.event_schema.create_event(values)
+        return processing_utilities.Event(self.attribute_names, values, self.time_name, self.type_name)
+
+    def parse_line(self, line: str):
+        """
+        parses a single line of the input file format, by the attribute types if they are known
+        :param line: the line to parse
+        :return: the event of the line
+        """
+        if self.attribute_types is None:
+            return self.get_event_from_line(line)
+        values = next(csv.reader((line,)))
+        return self.create_event([value if attribute_type is str else attribute_type(value)
+                                  for attribute_type, value in zip(self.attribute_types, values)])
+
+    def get_events_from_lines(self, lines: typing.Iterable[str]) -> typing.Iterator:
+        """
+        parses lines of the event input file into events. If the attribute types are known the lines are read in
+        batches and converted column by column, otherwise every line is parsed by get_event_from_line. Blank lines are
+        skipped, and a line without a value for every attribute raises a ValueError
+        :param lines: the lines to parse
+        :return: an iterator over the parsed events, in the order of the lines
+        """
+        attributes_num = len(self.attribute_names)
+        if self.attribute_types is None:
+            for line in lines:
+                if line.strip():
+                    if line.count(',') + 1 != attributes_num:
+                        raise self.get_line_error(line.rstrip('\r\n').split(','))
+                    yield self.get_event_from_line(line)
+            return
+        reader = csv.reader(lines)
+        while True:
+            lines_batch = list(itertools.islice(reader, self.parse_batch_size))
+            if not lines_batch:
+                return
+            # blank and whitespace only lines are skipped, as they are when the attribute types are unknown
+            rows = [row for row in lines_batch if len(row) > 1 or (row and row[0].strip())]
+            for row in rows:
+                if len(row) != attributes_num:
+                    raise self.get_line_error(row)
+            columns = [column if attribute_type is str else list(map(attribute_type, column))
+                       for attribute_type, column in zip(self.attribute_types, zip(*rows))]
+            for values in zip(*columns):
+                yield self.create_event(values)
+
+    def get_line_error(self, values: typing.List[str]) -> ValueError:
+        """
+        :param values: the values of a line of the input file that does not hold a value for every attribute
+        :return: the error describing the line
+        """
+        return ValueError("invalid line '{}' in {}: expected {} attributes, got {}".format(
+            ','.join(values), self.data_file_path, len(self.attribute_names), len(values)))
+
+    def get_events(self) -> typing.Iterator:
+        """
+        :return: an iterator over the events of the input file
+        """
+        if not self.use_columnar_cache:
+            with open(self.data_file_path, 'r') as data_stream:
+                yield from self.get_events_from_lines(data_stream)
+            return
+        cache_path = self.data_file_path + self.columnar_cache_suffix
+        key = self.get_columnar_cache_key()
+        rows = ColumnarCache.load(cache_path, key)
+        if rows is not None:
+            for values in rows:
+                yield self.create_event(values)
+            return
+        columns = [ColumnBuilder() for _ in self.attribute_names]
+        rows_num = 0
+        with open(self.data_file_path, 'r') as data_stream:
+            for event in self.get_events_from_lines(data_stream):
+                # the values are saved before the event is evaluated, which may change its time to its counter
+                for column, value in zip(columns, event.get_values()):
+                    column.add(value)
+                rows_num += 1
+                yield event
+        # only reached if the whole file was read
+        ColumnarCache.write(cache_path, key, columns, rows_num)
+
+    def get_columnar_cache_key(self) -> typing.Dict:
+        """
+        :return: the key that the columnar cache of the input file is valid for: the path and the modification time of
+        the file and the schema it is parsed by
+        """
+        status = os.stat(self.data_file_path)
+        return {'path': os.path.abspath(self.data_file_path), 'size': status.st_size,
+                'modification_time': status.st_mtime_ns, 'attribute_names': list(self.attribute_names),
+                'attribute_types': [getattr(attribute_type, '__qualname__', repr(attribute_type))
+                                    for attribute_type in self.attribute_types]
+                if self.attribute_types is not None else None}
+
+    def get_query_events(self, start_time=None, end_time=None) -> typing.Iterator:
+        """
+        :return: the events of the whole input file, or of the time range if start_time or end_time are given
+        """
+        if start_time is None and end_time is None:
+            return self.get_events()
+        return self.get_events_in_time_range(start_time, end_time)
+
+    def get_event_batches(self, batch_size: int, batch_time_span=None, start_time=None, end_time=None) \
+            -> typing.Iterator[processing_utilities.EventBatch]:
+        """
+        :param batch_size: the maximal number of events in a batch
+        :param batch_time_span: if given, a batch ends before an event more than this time after the first event of the
+        batch
+        :param start_time: see get_query_events
+        :param end_time: see get_query_events
+        :return: an iterator over consecutive batches of the events
+        """
+        events = []
+        first_time = None
+        for event in self.get_query_events(start_time, end_time):
+            if events and batch_time_span is not None and event.get_time() - first_time > batch_time_span:
+                yield processing_utilities.EventBatch(events, self.time_name)
+                events = []
+            if not events:
+                first_time = event.get_time()
+            events.append(event)
+            if len(events) >= batch_size:
+                yield processing_utilities.EventBatch(events, self.time_name)
+                events = []
+        if events:
+            yield processing_utilities.EventBatch(events, self.time_name)
+
+    def get_events_in_time_range(self, start_time=None, end_time=None) -> typing.Iterator:
+        """
+        reads the (time sorted) input file through a memory map, and uses its time index (see TimeIndex) to find the
+        lines in the time range, so lines out of the range are not decoded or parsed
+        :param start_time: if given, only events of this time or later are returned
+        :param end_time: if given, only events earlier than this time are returned
+        :return: an iterator over the events in the time range
+        """
+        if os.path.getsize(self.data_file_path) == 0:
+            return
+        with open(self.data_file_path, 'rb') as data_file, \
+                mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            time_index = TimeIndex.get_index(self.data_file_path, data, self.time_attribute_index, self.parse_time,
+                                             self.time_index_step)
+            start = time_index.find_first_line(data, start_time, self.parse_time) if start_time is not None else 0
+            end = time_index.find_first_line(data, end_time, self.parse_time) if end_time is not None else len(data)
+
+            def get_lines():
+                data.seek(start)
+                while data.tell() < end:
+                    yield data.readline().decode()
+
+            yield from self.get_events_from_lines(get_lines())
+
+    def get_events_in_range(self, start_offset: int, end_offset: int) -> typing.Iterator:
+        """
+        :param start_offset: the offset of the first line to parse (must be the start of a line)
+        :param end_offset: lines starting at or after this offset are not parsed
+        :return: an iterator over the events of the lines of the input file between the offsets
+        """
+        def get_lines(data_stream):
+            position = start_offset
+            while position < end_offset:
+                line = data_stream.readline()
+                if not line:
+                    return
+                position += len(line)
+                yield line.decode()
+
+        with open(self.data_file_path, 'rb') as data_stream:
+            data_stream.seek(start_offset)
+            yield from self.get_events_from_lines(get_lines(data_stream))
+
+    @staticmethod
+    def _get_line_start(data_stream, offset: int) -> int:
+        """
+        :return: the offset of the first line starting at or after offset
+        """
+        if offset <= 0:
+            return 0
+        data_stream.seek(offset - 1)
+        data_stream.readline()
+        return data_stream.tell()
+
+    def _get_line_time(self, data_stream, offset: int):
+        """
+        :return: the time of the event in the line starting at offset
+        """
+        data_stream.seek(offset)
+        return next(self.get_events_from_lines([data_stream.readline().decode()])).get_time()
+
+    def _find_first_line(self, data_stream, time, low: int, high: int) -> int:
+        """
+        binary search over the offsets of the (time sorted) input file
+        :return: the offset of the first line starting in [low, high) whose time is at least the given time, or high if
+        there is no such line
+        """
+        while low < high:
+            middle = (low + high) // 2
+            line_start = self._get_line_start(data_stream, middle)
+            if line_start >= high or self._get_line_time(data_stream, line_start) >= time:
+                high = middle
+            else:
+                low = middle + 1
+        return self._get_line_start(data_stream, low)
+
+    def _count_lines(self, data_stream, start_offset: int, end_offset: int) -> int:
+        """
+        :return: the number of line ends between the offsets
+        """
+        data_stream.seek(start_offset)
+        count = 0
+        remaining = end_offset - start_offset
+        while remaining > 0:
+            block = data_stream.read(min(remaining, self.read_block_size))
+            if not block:
+                break
+            count += block.count(b'\n')
+            remaining -= len(block)
+        return count
+
+    def _get_line_start_before(self, data_stream, offset: int, lines_num: int) -> int:
+        """
+        :return: the offset of the line lines_num lines before the line starting at offset (0 if there are less lines)
+        """
+        newlines_num = 0
+        position = offset
+        while position > 0:
+            block_start = max(0, position - self.read_block_size)
+            data_stream.seek(block_start)
+            block = data_stream.read(position - block_start)
+            index = len(block)
+            while True:
+                index = block.rfind(b'\n', 0, index)
+                if index < 0:
+                    break
+                newlines_num += 1
+                if newlines_num > lines_num:
+                    return block_start + index + 1
+            position = block_start
+        return 0
+
+    def get_time_slices(self, slices_num: int, time_limit=None, window_events_num: int = 0) \
+            -> typing.List[parallel_processing.TimeSlice]:
+        """
+        splits the (time sorted) input file into at most slices_num slices of about the same size. Slices start where
+        the time changes, so events of the same time are in the same slice
+        :param slices_num: the number of slices
+        :param time_limit: the largest time limit of the queries, the evaluation of every slice starts at the events
+        in this time before it
+        :param window_events_num: the largest constant window of the queries, the evaluation of every slice starts at
+        least this number of events before it
+        :return: the time slices
+        """
+        size = os.path.getsize(self.data_file_path)
+        with open(self.data_file_path, 'rb') as data_stream:
+            starts = [0]
+            for i in range(1, slices_num):
+                offset = self._get_line_start(data_stream, size * i // slices_num)
+                if offset >= size:
+                    break
+                offset = self._find_first_line(data_stream, self._get_line_time(data_stream, offset), starts[-1],
+                                               offset)
+                if offset > starts[-1]:
+                    starts.append(offset)
+            time_slices = []
+            start_counter = 0
+            previous_start = 0
+            for start, end in zip(starts, starts[1:] + [size]):
+                start_counter += self._count_lines(data_stream, previous_start, start)
+                previous_start = start
+                start_time = self._get_line_time(data_stream, start) if start < size else None
+                evaluation_start = start
+                if start > 0 and time_limit is not None:
+                    evaluation_start = self._find_first_line(data_stream, start_time - time_limit, 0, start)
+                if start > 0 and window_events_num:
+                    evaluation_start = min(evaluation_start,
+                                           self._get_line_start_before(data_stream, start, window_events_num))
+                first_counter = start_counter - self._count_lines(data_stream, evaluation_start, start)
+                time_slices.append(parallel_processing.TimeSlice(evaluation_start, start, end, first_counter,
+                                                                 start_counter, start_time))
+        return time_slices
+
+    def query_time_sliced(self, pattern_queries: typing.List[processing_utilities.PatternQuery],
+                          evaluation_model_factory: typing.Callable[[], processing_utilities.EvaluationModel],
+                          slices_num: int = None,
+                          input_interface: processing_utilities.InputInterface =
+                          processing_utilities.TrivialInputInterface(),
+                          output_interfaces: typing.List[processing_utilities.OutputInterface] = None):
+        """
+        like query, but splits the (time sorted) input file into time slices that are evaluated in parallel, each in
+        its own (forked) process and by its own evaluation model. The slices overlap by the largest time limit (or
+        constant window) of the queries, and every match is only reported by the slice holding its last event, so the
+        results and the output are the same as those of query. Event counters are line numbers, so the input file must
+        not contain empty lines
+        :param pattern_queries: the pattern queries to query by
+        :param evaluation_model_factory: returns a new evaluation model for a time slice (for example
+        lambda: NaiveMultipleTreesGraphBasedProcessing(LeftDeepTreeInitializer()))
+        :param slices_num: the number of time slices, by default the number of CPUs
+        :param input_interface:
+        :param output_interfaces:
+        :return: the results of the queries
+        """
+        if output_interfaces is None:
+            output_interfaces = [processing_utilities.TrivialOutputInterface()] * len(pattern_queries)
+        clean_pattern_queries = list(input_interface.get_clean_pattern_queries(pattern_queries))
+        time_limit = max((pattern_query.time_limit for pattern_query in clean_pattern_queries
+                          if not pattern_query.use_const_window), default=None)
+        window_events_num = max((pattern_query.time_limit for pattern_query in clean_pattern_queries
+                                 if pattern_query.use_const_window), default=0)
+        time_slices = self.get_time_slices(slices_num if slices_num is not None else multiprocessing.cpu_count(),
+                                           time_limit, window_events_num)
+        results = parallel_processing.evaluate_time_slices(self, clean_pattern_queries, evaluation_model_factory,
+                                                           time_slices, output_interfaces)
+        for output_interface in output_interfaces:
+            output_interface.close()
+        return results
+
+    def query_stream(self, pattern_queries: typing.List[processing_utilities.PatternQuery],
+                     evaluation_model: processing_utilities.EvaluationModel,
+                     input_interface: processing_utilities.InputInterface =
+                     processing_utilities.TrivialInputInterface(), start_time=None, end_time=None) \
+            -> typing.Iterator[typing.Tuple[int, typing.List]]:
+        """
+        like query, but yields the matches while the input file is processed: every match is yielded right after the
+        event completing it is handled, and is not kept by the evaluation model (the root nodes do not buffer matches
+        that were output)
+        :param pattern_queries: the pattern queries to query by
+        :param evaluation_model: the evaluation model to use
+        :param input_interface:
+        :param start_time: see query
+        :param end_time: see query
+        :return: an iterator over (index of the query in pattern_queries, match) pairs
+        """
+        clean_pattern_queries = list(input_interface.get_clean_pattern_queries(pattern_queries))
+        matches = []
+        evaluation_model.set_pattern_queries(clean_pattern_queries,
+                                             [processing_utilities.SharedListOutputInterface(query_index, matches)
+                                              for query_index in range(len(clean_pattern_queries))])
+        for counter, event in enumerate(self.get_query_events(start_time, end_time)):
+            evaluation_model.handle_event(event, counter)
+            if matches:
+                yield from matches
+                matches.clear()
+        # models that buffer matches despite the output interfaces return them at the end
+        for query_index, query_results in enumerate(evaluation_model.get_results()):
+            for match in query_results:
+                yield query_index, match
+        yield from matches
+        matches.clear()
+
+    async def query_async(self, pattern_queries: typing.List[processing_utilities.PatternQuery],
+                          evaluation_model: processing_utilities.EvaluationModel,
+                          event_sources: typing.List[AsyncEventSource],
+                          input_interface: processing_utilities.InputInterface =
+                          processing_utilities.TrivialInputInterface(),
+                          output_interfaces: typing.List[processing_utilities.OutputInterface] = None,
+                          queue_size: int = 1024, batch_size: int = 256):
+        """
+        like query, but takes the events from asynchronous sources (for example a socket) instead of the input file,
+        until all the sources are exhausted, so it can run as a long running service. The events of all the sources are
+        passed through a bounded queue: while it is full the sources are not read, which slows the senders down. Events
+        are evaluated in the order they arrive, which should be time order. If a source fails, the other sources are
+        cancelled and closed, and its exception is raised at once
+        :param pattern_queries: the pattern queries to query by
+        :param evaluation_model: the evaluation model to use
+        :param event_sources: the sources of the events
+        :param input_interface:
+        :param output_interfaces: output interfaces that output while running get the matches as they are found
+        :param queue_size: the maximal number of events waiting to be evaluated
+        :param batch_size: the number of events evaluated before the sources are given a chance to run
+        :return: the results of the queries
+        """
+        if output_interfaces is None:
+            output_interfaces = [processing_utilities.TrivialOutputInterface()] * len(pattern_queries)
+        clean_pattern_queries = input_interface.get_clean_pattern_queries(pattern_queries)
+        evaluation_model.set_pattern_queries(clean_pattern_queries, output_interfaces)
+        events_queue = asyncio.Queue(maxsize=queue_size)
+
+        async def read_source(event_source: AsyncEventSource):
+            try:
+                async for item in event_source.get_items():
+                    await events_queue.put(self.parse_line(item) if isinstance(item, str) else item)
+            finally:
+                await event_source.close()
+            # None marks the end of a source (that was neither cancelled nor failed)
+            await events_queue.put(None)
+
+        async def evaluate_events():
+            counter = 0
+            running_readers_num = len(event_sources)
+            while running_readers_num > 0:
+                event = await events_queue.get()
+                if event is None:
+                    running_readers_num -= 1
+                    continue
+                evaluation_model.handle_event(event, counter)
+                counter += 1
+                if counter % batch_size == 0:
+                    await asyncio.sleep(0)
+
+        tasks = [asyncio.ensure_future(read_source(event_source)) for event_source in event_sources]
+        tasks.append(asyncio.ensure_future(evaluate_events()))
+        try:
+            # the evaluation ends after all the sources are exhausted, but a failed source (or evaluation) ends the
+            # query at once, and its exception is raised here
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            # the cancelled sources are closed before returning
+            await asyncio.gather(*tasks, return_exceptions=True)
+        results = evaluation_model.get_results()
+        for output_interface in output_interfaces:
+            output_interface.close()
+        return results
 
     def query(self, pattern_queries: typing.List[processing_utilities.PatternQuery],
               evaluation_model: processing_utilities.EvaluationModel,
               input_interface: processing_utilities.InputInterface = processing_utilities.TrivialInputInterface(),
-              output_interfaces: typing.List[processing_utilities.OutputInterface]=None):
+              output_interfaces: typing.List[processing_utilities.OutputInterface]=None, start_time=None,
+              end_time=None, batch_size: int = None, batch_time_span=None):
         """
         creates the evaluation model based on the give queries and the corresponding output interfaces, and parses event
         lines from the event files and passes them as event objects to the evaluation model
@@ -61,19 +528,27 @@ class Processor:
         :param evaluation_model: the evaluation model to use
         :param input_interface:
         :param output_interfaces:
+        :param start_time: if given, only events of this time or later are evaluated (see get_events_in_time_range)
+        :param end_time: if given, only events earlier than this time are evaluated
+        :param batch_size: if given, the events are passed to the evaluation model in micro batches of (at most) this
+        size, see EvaluationModel.handle_event_batch
+        :param batch_time_span: if given (with batch_size), the events of a batch are at most this time apart
         :return:
         """
         if output_interfaces is None:
             output_interfaces = [processing_utilities.TrivialOutputInterface()] * len((pattern_queries))
         clean_pattern_queries = input_interface.get_clean_pattern_queries(pattern_queries)
         evaluation_model.set_pattern_queries(clean_pattern_queries, output_interfaces)
-        data_stream = open(self.data_file_path, 'r')
-        counter = 0
-        for line in data_stream:
-            event = self.get_event_from_line(line)
-            evaluation_model.handle_event(event, counter)
-            counter += 1
-        data_stream.close()
+        if batch_size is None:
+            for counter, event in enumerate(self.get_query_events(start_time, end_time)):
+                evaluation_model.handle_event(event, counter)
+        else:
+            counter = 0
+            for batch in self.get_event_batches(batch_size, batch_time_span, start_time, end_time):
+                evaluation_model.handle_event_batch(batch, counter)
+                counter += len(batch.events)
         results = evaluation_model.get_results()
+        for output_interface in output_interfaces:
+            output_interface.close()
         return results
 
@@ -0,0 +1,50 @@
+import itertools
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+# the sample the initial plans are chosen by holds few events of the first types, so the plans are replaced once the
+# real rates are observed
+stock_types = ['AAME', 'MCRS', 'ZHNE', 'ABCB']
+sample_size = 1000
+
+
+def create_evaluation_model(sample_events):
+    return graph_based_processing_utilities.AdaptiveGraphBasedProcessing(
+        graph_based_processing_utilities.CostBasedTreeInitializer(sample_events=sample_events), check_interval=200,
+        replan_threshold=1.05)
+
+
+if __name__ == "__main__":
+    # replacing the plan of a query while the stream is processed neither loses nor duplicates matches
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, MCRS b, ZHNE c, ABCB d) WHERE a.volumes > b.volumes WITHIN 6"),
+        processing_utilities.StringPatternQuery("PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.volumes > b.volumes "
+                                                "WITHIN 3")]
+    events = processor.get_events()
+    sample_events = [event for event in itertools.islice(events, 20 * sample_size)
+                     if event.get_type() not in stock_types[:2] or event.get_values()[-1] % 20 == 0][:sample_size]
+    matches = test_utilities.get_matches(processor.query(
+        pattern_queries, graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+            graph_based_processing_utilities.LeftDeepTreeInitializer()), processing_utilities.StringInputInterface()))
+    evaluation_model = create_evaluation_model(sample_events)
+    adaptive_matches = test_utilities.get_matches(processor.query(pattern_queries, evaluation_model,
+                                                                  processing_utilities.StringInputInterface()))
+    print("matches: %s, plan replacements: %d" %
+          ([len(query_matches) for query_matches in matches], len(evaluation_model.replanning_log)))
+    assert evaluation_model.replanning_log
+    assert adaptive_matches == matches
+    # the same for matches output while the stream is processed, where matches of replayed events are not output again
+    output_interfaces = [processing_utilities.CollectingOutputInterface() for _ in pattern_queries]
+    second_evaluation_model = create_evaluation_model(sample_events)
+    processor.query(pattern_queries, second_evaluation_model, processing_utilities.StringInputInterface(),
+                    output_interfaces)
+    assert test_utilities.get_matches([output_interface.pop_results()
+                                       for output_interface in output_interfaces]) == matches
+    # the selectivities are estimated from seeded samples, so the plans and re-plannings are the same in every run
+    assert second_evaluation_model.replanning_log == evaluation_model.replanning_log
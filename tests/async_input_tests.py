@@ -0,0 +1,129 @@
+import asyncio
+import processor
+import processing_utilities
+import async_event_sources
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+stock_types = ['AAME', 'AAME', 'MCRS', 'ZHNE']
+input_file = "sorted_NASDAQ_20080201_1.txt"
+queue_size = 16
+
+
+def condition1(A: processing_utilities.Event, B: processing_utilities.Event) -> bool:
+    return A.volumes > B.volumes
+
+
+def create_evaluation_model():
+    return graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+
+
+async def send_lines(reader, writer):
+    """
+    a local stand-in for a live feed: sends the lines of the input file to every client
+    """
+    with open(input_file, 'rb') as lines:
+        for line in lines:
+            writer.write(line)
+            await writer.drain()
+    writer.close()
+
+
+async def query_by_tcp(cep_processor, pattern_queries):
+    server = await asyncio.start_server(send_lines, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        return await cep_processor.query_async(pattern_queries, create_evaluation_model(),
+                                               [async_event_sources.TCPEventSource('127.0.0.1', port)],
+                                               queue_size=queue_size)
+    finally:
+        server.close()
+        await server.wait_closed()
+
+
+async def query_by_queue(cep_processor, pattern_queries):
+    """
+    a bounded queue makes the producer wait for the evaluation
+    """
+    lines_queue = asyncio.Queue(maxsize=queue_size)
+    largest_size = 0
+
+    async def produce():
+        nonlocal largest_size
+        with open(input_file) as lines:
+            for line in lines:
+                await lines_queue.put(line)
+                largest_size = max(largest_size, lines_queue.qsize())
+        await lines_queue.put(None)
+
+    producer = asyncio.ensure_future(produce())
+    results = await cep_processor.query_async(pattern_queries, create_evaluation_model(),
+                                              [async_event_sources.QueueEventSource(lines_queue)],
+                                              queue_size=queue_size)
+    await producer
+    assert largest_size <= queue_size
+    return results
+
+
+class FailingEventSource(async_event_sources.AsyncEventSource):
+    """
+    a source that fails after a few lines
+    """
+    def __init__(self, lines_num: int):
+        self.lines_num = lines_num
+
+    async def get_items(self):
+        with open(input_file) as lines:
+            for i, line in enumerate(lines):
+                if i == self.lines_num:
+                    raise ConnectionError("source failed")
+                yield line
+
+
+class EndlessEventSource(async_event_sources.QueueEventSource):
+    """
+    a source that is never exhausted (nothing is put in its queue), remembering whether it was closed
+    """
+    def __init__(self):
+        super().__init__(asyncio.Queue())
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+async def query_with_failing_source(cep_processor, pattern_queries):
+    """
+    the failure of a source must end the query while another source is still running
+    """
+    endless_source = EndlessEventSource()
+    try:
+        await asyncio.wait_for(cep_processor.query_async(pattern_queries, create_evaluation_model(),
+                                                         [endless_source, FailingEventSource(100)],
+                                                         queue_size=queue_size), 10)
+    except ConnectionError:
+        assert endless_source.closed
+        return
+    assert False, "the failure of the source was not raised"
+
+
+if __name__ == "__main__":
+    # events read from a socket or a queue must give the same matches as events read from the file
+    condition = processing_utilities.Condition(condition1, [0, 1])
+    processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types)
+    stock_types_with_identifiers = \
+        [processing_utilities.EventTypeOrPatternAndIdentifier(type, i) for i, type in enumerate(stock_types)]
+    seq_event_pattern = processing_utilities.EventPattern(stock_types_with_identifiers,
+                                                          processing_utilities.Seq(range(4)))
+    pattern_queries = [processing_utilities.CleanPatternQuery(seq_event_pattern, [condition], 16)]
+    file_matches = test_utilities.get_ordered_matches(processor.query(pattern_queries, create_evaluation_model()))
+    tcp_matches = test_utilities.get_ordered_matches(asyncio.run(query_by_tcp(processor, pattern_queries)))
+    queue_matches = test_utilities.get_ordered_matches(asyncio.run(query_by_queue(processor, pattern_queries)))
+    print("matches:", len(file_matches[0]))
+    assert tcp_matches == file_matches
+    assert queue_matches == file_matches
+    asyncio.run(query_with_failing_source(processor, pattern_queries))
@@ -0,0 +1,30 @@
+import os
+import processor
+import data_formats
+import test_utilities
+
+input_file = "sorted_NASDAQ_20080201_1.txt"
+
+
+def measure(get_events):
+    read_time, events = test_utilities.measure(lambda: list(get_events()))
+    return read_time, [event.get_values() for event in events]
+
+
+if __name__ == "__main__":
+    # reading the input file: parsing the csv lines vs loading the columnar cache written by the first read
+    cache_path = input_file + processor.Processor.columnar_cache_suffix
+    if os.path.exists(cache_path):
+        os.remove(cache_path)
+    arguments = (input_file, data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                 data_formats.metastock7_type_index)
+    for attribute_types in [None, data_formats.metastock7_attribute_types]:
+        csv_processor = processor.Processor(*arguments, use_compact_events=True, attribute_types=attribute_types)
+        cached_processor = processor.Processor(*arguments, use_compact_events=True, attribute_types=attribute_types,
+                                               use_columnar_cache=True)
+        csv_time, csv_events = measure(csv_processor.get_events)
+        write_time, written_events = measure(cached_processor.get_events)
+        load_time, loaded_events = measure(cached_processor.get_events)
+        print("attribute types %s: csv %.3fs, csv and cache writing %.3fs, cache %.3fs (same events: %s)" %
+              ("given" if attribute_types is not None else "guessed", csv_time, write_time, load_time,
+               csv_events == written_events == loaded_events))
@@ -0,0 +1,25 @@
+import os
+import processor
+import data_formats
+
+input_file = "columnar_cache_test_events.txt"
+# the open prices are guessed as an int and a float of equal values, and the close prices as values of mixed types
+lines = ["AAME,200802010900,10,11.07,10,10.07,11832\n", "AAME,200802010901,10.0,11.17,10,x,9000\n",
+         "MCRS,200802010902,10,11.17,10,10.07,9000\n"]
+
+
+if __name__ == "__main__":
+    # events loaded from the columnar cache are the events parsed from the input file, values of their types included
+    with open(input_file, 'w') as output_stream:
+        output_stream.writelines(lines)
+    cache_path = input_file + processor.Processor.columnar_cache_suffix
+    cached_processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                           data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                           use_columnar_cache=True)
+    parsed_events = [str(event) for event in cached_processor.get_events()]
+    assert os.path.exists(cache_path)
+    loaded_events = [str(event) for event in cached_processor.get_events()]
+    print(loaded_events)
+    assert loaded_events == parsed_events == [line.strip() for line in lines]
+    os.remove(cache_path)
+    os.remove(input_file)
@@ -0,0 +1,70 @@
+import os
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+# numpy is optional: micro batches are filtered by numpy arrays if it is installed, and by lists otherwise
+numpy = processing_utilities.numpy
+lines = ["AAME,200802010900,10.07,11.07,10,10.07,11832", "MCRS,200802010900,20.5,21,20,20.5,500",
+         "AAME,200802010901,10.17,11.17,10,10.17,9000", "ZHNE,200802010901,1,1,1,1,x",
+         "AAME,200802010902,10.27,11.27,10,10.27,15000", "MCRS,200802010903,20.7,21,20,20.7,700"]
+
+
+def filter_events(batch, indices, comparisons):
+    """
+    :return: the indices of the events satisfying the comparisons, checking the comparisons the batch could not apply
+    event by event (which comparisons fail depends on the columns being numpy arrays or lists)
+    """
+    indices, failed_comparisons = batch.filter(indices, comparisons)
+    return [index for index in indices if all(
+        processing_utilities.ConstantComparison.relations[comparison.relation](
+            getattr(batch.events[index], comparison.attribute), comparison.value)
+        for comparison in failed_comparisons)]
+
+
+def check_batch(batch_processor):
+    batch = processing_utilities.EventBatch(list(map(batch_processor.parse_line, lines)), batch_processor.time_name)
+    assert list(batch.get_type_indices('AAME')) == [0, 2, 4] and list(batch.get_type_indices('ABCB')) == []
+    assert filter_events(batch, batch.get_type_indices('AAME'), [
+        processing_utilities.ConstantComparison('a', 'volumes', '>', 10000),
+        processing_utilities.ConstantComparison('a', 'open_of_the_day', '<', 10.2)]) == [0]
+    assert filter_events(batch, range(len(lines)), [
+        processing_utilities.ConstantComparison('a', 'open_of_the_day', 'in', (20.5, 10.17, 1))]) == [1, 2, 3]
+    # the volumes of the ZHNE event are text, so the comparison can not be applied to the whole batch
+    comparison = processing_utilities.ConstantComparison('a', 'volumes', '<', 1000)
+    assert batch.filter(range(len(lines)), [comparison])[1] == [comparison]
+
+
+def check_query(batch_processor):
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, MCRS b) WHERE a.volumes > 10000 AND b.open_of_the_day > 20 WITHIN 3")]
+    results = []
+    for batch_size in [None, 4]:
+        evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+            graph_based_processing_utilities.LeftDeepTreeInitializer())
+        results.append(test_utilities.get_matches(batch_processor.query(pattern_queries, evaluation_model,
+                                                         processing_utilities.StringInputInterface(),
+                                                         batch_size=batch_size)))
+    assert results[0] == results[1] and len(results[0][0]) == 3
+
+
+if __name__ == "__main__":
+    input_file = "event_batch_test_events.txt"
+    with open(input_file, 'w') as output_stream:
+        output_stream.writelines(line + "\n" for line in lines)
+    batch_processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                          data_formats.metastock7_time_index, data_formats.metastock7_type_index)
+    if numpy is not None:
+        check_batch(batch_processor)
+        check_query(batch_processor)
+        print("numpy columns: ok")
+    else:
+        print("numpy columns: skipped, numpy is not installed")
+    processing_utilities.numpy = None
+    check_batch(batch_processor)
+    check_query(batch_processor)
+    processing_utilities.numpy = numpy
+    print("list columns: ok")
+    os.remove(input_file)
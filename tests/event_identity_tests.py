@@ -0,0 +1,44 @@
+import os
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+from nfa_based_processing import nfa_based_processing_utilities
+import data_formats
+
+input_file = "event_identity_test_events.txt"
+# two different ticks with identical attributes, and another tick of the same type
+lines = ["AAME,200802010900,10.07,11.07,10,10.07,11832\n", "AAME,200802010900,10.07,11.07,10,10.07,11832\n",
+         "AAME,200802010901,10.17,11.17,10,10.17,9000\n"]
+
+
+if __name__ == "__main__":
+    # events are identified by their position in the stream, not by their attributes: a match may hold two events with
+    # identical attributes, but never the same event twice
+    with open(input_file, 'w') as output_stream:
+        output_stream.writelines(lines)
+    processor = processor.Processor(input_file, data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                                    data_formats.metastock7_type_index)
+    pattern_queries = [processing_utilities.StringPatternQuery("PATTERN SEQ(AAME a, AAME b) WITHIN 1"),
+                       processing_utilities.StringPatternQuery("PATTERN AND(AAME a, AAME b, AAME c) WITHIN 1")]
+    for evaluation_model in [graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+            graph_based_processing_utilities.LeftDeepTreeInitializer()),
+            nfa_based_processing_utilities.NFAEvaluationModel()]:
+        results = processor.query(pattern_queries, evaluation_model, processing_utilities.StringInputInterface())
+        print(type(evaluation_model).__name__, "matches:", [len(query_results) for query_results in results])
+        # the identical ticks are ordered both ways in the seq, and each is followed by the later tick
+        assert len(results[0]) == 4
+        # every order of the three ticks
+        assert len(results[1]) == 6
+    os.remove(input_file)
+
+    # events get their sequence ids when they are created, so events passed to the event nodes directly (not by an
+    # evaluation model) are distinct as well
+    graph = graph_based_processing_utilities.LeftDeepTreeInitializer().get_graph(
+        processing_utilities.StringInputInterface.parse("PATTERN AND(AAME a, AAME b) WITHIN 1"))
+    for line in lines:
+        event = processor.parse_line(line)
+        for event_node in graph.event_nodes:
+            event_node.try_add_partial_result(event)
+    # every ordered pair of the three ticks
+    print("matches of events passed to the event nodes:", len(graph.root_node.get_results()))
+    assert len(graph.root_node.get_results()) == 6
@@ -0,0 +1,59 @@
+import random
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+symbols_num = 2000
+events_num = 20000
+query_counts = [1, 10, 100, 500]
+
+
+class FullScanGraphBasedProcessing(graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing):
+    """
+    the evaluation model as it was before the routing index: every event is offered to every leaf of every graph
+    """
+    def handle_event(self, event, event_counter):
+        for graph in self.graphs:
+            if graph.use_const_window:
+                event.set_time_to_counter(event_counter)
+            for event_node in graph.event_nodes:
+                event_node.try_add_partial_result(event)
+
+
+def get_events(symbols):
+    events = []
+    for i in range(events_num):
+        values = [random.choice(symbols), 200802010900 + i // 10, 1.0, 1.0, 1.0, 1.0, random.randint(1, 30000)]
+        events.append(processing_utilities.Event(data_formats.metastock7_attributes, values, 'date', 'symbol'))
+    return events
+
+
+def get_pattern_queries(symbols, queries_num):
+    pattern_queries = []
+    for _ in range(queries_num):
+        first_symbol, second_symbol = random.sample(symbols, 2)
+        events = [processing_utilities.EventTypeOrPatternAndIdentifier(first_symbol, 0),
+                  processing_utilities.EventTypeOrPatternAndIdentifier(second_symbol, 1)]
+        event_pattern = processing_utilities.EventPattern(events, processing_utilities.Seq([0, 1]))
+        pattern_queries.append(processing_utilities.CleanPatternQuery(event_pattern, [], 5))
+    return pattern_queries
+
+
+def measure_throughput(evaluation_model, pattern_queries, events):
+    query_time, _ = test_utilities.measure(test_utilities.handle_events, evaluation_model, pattern_queries, events)
+    return len(events) / query_time
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    all_symbols = ['S%04d' % i for i in range(symbols_num)]
+    stream = get_events(all_symbols)
+    print("queries | full scan (events/s) | routed (events/s)")
+    for queries_num in query_counts:
+        queries = get_pattern_queries(all_symbols, queries_num)
+        initializer = graph_based_processing_utilities.LeftDeepTreeInitializer()
+        full_scan = measure_throughput(FullScanGraphBasedProcessing(initializer), queries, stream)
+        routed = measure_throughput(
+            graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(initializer), queries, stream)
+        print("%7d | %20.0f | %17.0f" % (queries_num, full_scan, routed))
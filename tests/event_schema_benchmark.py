@@ -0,0 +1,47 @@
+import random
+import tracemalloc
+import processing_utilities
+import data_formats
+import test_utilities
+
+events_num = 100000
+
+
+def get_values(i):
+    return [['AAME', 'MCRS', 'ZHNE'][i % 3], 200802010900 + i // 10, 1.5, 1.6, 1.4, 1.55, random.randint(1, 30000)]
+
+
+def measure_memory(create_event, values):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    events = [create_event(event_values) for event_values in values]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (after - before) / len(events), events
+
+
+def access_attributes(events):
+    for event in events:
+        event.volumes > event.open_of_the_day and event.start_time <= event.end_time
+
+
+def measure_attribute_access(events):
+    access_time, _ = test_utilities.measure(access_attributes, events)
+    return access_time / len(events) * 10 ** 9
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    all_values = [get_values(i) for i in range(events_num)]
+    schema = processing_utilities.EventSchema(data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                                              data_formats.metastock7_type_index)
+    dict_memory, dict_events = measure_memory(
+        lambda values: processing_utilities.Event(data_formats.metastock7_attributes, values, 'date', 'symbol'),
+        all_values)
+    schema_memory, schema_events = measure_memory(schema.create_event, all_values)
+    dict_access = measure_attribute_access(dict_events)
+    schema_access = measure_attribute_access(schema_events)
+    print("             | bytes per event | ns per 4 attribute reads")
+    print("Event        | %15.0f | %24.0f" % (dict_memory, dict_access))
+    print("EventSchema  | %15.0f | %24.0f" % (schema_memory, schema_access))
+    print("memory saving: %.1fx, access speedup: %.1fx" % (dict_memory / schema_memory, dict_access / schema_access))
@@ -0,0 +1,64 @@
+import os
+import random
+import shutil
+import file_sort
+import data_formats
+
+test_directory = "file_sort_test_directory"
+lines_num = 60000
+
+
+def get_lines():
+    """
+    :return: lines in random time order, where many lines share a time and the last field tells the lines apart
+    """
+    return ["AAME,%d,10.07,11.07,10,10.07,%d\n" % (200802010900 + random.randrange(500), i) for i in range(lines_num)]
+
+
+def read_lines(path):
+    with open(path) as input_stream:
+        return input_stream.readlines()
+
+
+def write_lines(path, lines):
+    with open(path, 'w') as output_stream:
+        output_stream.writelines(lines)
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    os.makedirs(test_directory, exist_ok=True)
+    input_file = os.path.join(test_directory, "events.txt")
+    # the sorted file of an input file in a directory is next to it
+    assert file_sort.get_sorted_path(input_file) == os.path.join(test_directory, "sorted_events.txt")
+    assert file_sort.get_sorted_path("events.txt", "s_") == "s_events.txt"
+    lines = get_lines()
+    # a blank line, and a last line without a line break
+    write_lines(input_file, lines[:10] + ["\n"] + lines[10:-1] + [lines[-1].rstrip("\n")])
+    # lines of equal times keep their order, as in a stable sort
+    expected_lines = sorted(lines, key=lambda line: int(line.split(',')[data_formats.metastock7_time_index]))
+    # the file is larger than the smallest chunk, so it is sorted in several chunks by several processes and merged
+    chunks_num = len(file_sort.get_chunk_offsets(input_file, file_sort.read_buffer_size))
+    assert chunks_num > 1
+    for workers_num in [1, 3]:
+        sorted_file = file_sort.sort_file(data_formats.metastock7_time_index, input_file, memory_budget=1 << 16,
+                                          workers_num=workers_num)
+        assert sorted_file == file_sort.get_sorted_path(input_file)
+        assert read_lines(sorted_file) == expected_lines
+        print("%d chunks, %d workers: ok" % (chunks_num, workers_num))
+    # a single chunk is sorted without workers
+    single_chunk_lines = lines[:3000]
+    write_lines(input_file, single_chunk_lines)
+    output_file = os.path.join(test_directory, "output.txt")
+    sorted_file = file_sort.sort_file(data_formats.metastock7_time_index, input_file, output_file)
+    assert sorted_file == output_file
+    assert read_lines(sorted_file) == sorted(
+        single_chunk_lines, key=lambda line: int(line.split(',')[data_formats.metastock7_time_index]))
+    # a sorted file is used as it is, and no output file is written
+    os.remove(sorted_file)
+    write_lines(input_file, expected_lines)
+    assert file_sort.is_sorted(input_file, data_formats.metastock7_time_index, int)
+    assert file_sort.sort_file(data_formats.metastock7_time_index, input_file, sorted_file) == input_file
+    assert not os.path.exists(sorted_file) and read_lines(input_file) == expected_lines
+    print("sorted file: ok")
+    shutil.rmtree(test_directory)
@@ -0,0 +1,44 @@
+import os
+import processor
+import data_formats
+
+input_file = "line_parsing_test_events.txt"
+# blank and whitespace only lines between the events, and a last line without a newline
+lines = ["AAME,200802010900,10.07,11.07,10,10.07,11832\n", "\n", " \n", "MCRS,200802010900,20.5,21,20,20.5,500\n",
+         "\t\n", "AAME,200802010901,10.17,11.17,10,10.17,9000\n", "ZHNE,200802010902,1.5,1.6,1.4,1.55,700"]
+short_line = "MCRS,200802010901,20.5\n"
+
+
+def create_processor(attribute_types, parse_batch_size):
+    cep_processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                        data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                        attribute_types=attribute_types)
+    cep_processor.parse_batch_size = parse_batch_size
+    return cep_processor
+
+
+def get_events(cep_processor):
+    return [event.get_values() for event in cep_processor.get_events()]
+
+
+if __name__ == "__main__":
+    # parsing by the attribute types (in batches of every size) gives the events of parsing line by line
+    with open(input_file, 'w') as output_stream:
+        output_stream.writelines(lines)
+    events = get_events(create_processor(None, processor.Processor.parse_batch_size))
+    print("events:", events)
+    assert [event[0] for event in events] == ['AAME', 'MCRS', 'AAME', 'ZHNE'] and events[-1][-1] == 700
+    for parse_batch_size in [1, 2, 3, processor.Processor.parse_batch_size]:
+        assert get_events(create_processor(data_formats.metastock7_attribute_types, parse_batch_size)) == events
+    # a line without a value for every attribute is an error, not a cut event
+    with open(input_file, 'w') as output_stream:
+        output_stream.writelines(lines[:4] + [short_line] + lines[4:])
+    for attribute_types in [None, data_formats.metastock7_attribute_types]:
+        for parse_batch_size in [2, processor.Processor.parse_batch_size]:
+            try:
+                get_events(create_processor(attribute_types, parse_batch_size))
+                assert False, "the short line was parsed"
+            except ValueError as error:
+                assert short_line.strip() in str(error)
+    print("short line: ok")
+    os.remove(input_file)
@@ -0,0 +1,40 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def measure(processor, pattern_queries, memory_model_factory):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer(memory_model_factory))
+    query_time, results = test_utilities.measure(processor.query, pattern_queries, evaluation_model,
+                                                 processing_utilities.StringInputInterface())
+    return query_time, test_utilities.get_matches(results), evaluation_model.get_shedding_statistics()
+
+
+if __name__ == "__main__":
+    # partial matches dropped by per node and global budgets: the matches found are a subset of all the matches, and
+    # the estimated recall loss is reported next to the real one
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types, use_compact_events=True)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c) WHERE a.volumes > b.volumes WITHIN 8"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.close_of_the_day < b.close_of_the_day WITHIN 8")]
+    unbounded_time, all_matches, _ = measure(processor, pattern_queries, None)
+    print("unbounded: matches %s, %.3fs" % ([len(matches) for matches in all_matches], unbounded_time))
+    for policy in [processing_utilities.OldestSheddingPolicy(), processing_utilities.RandomSheddingPolicy(0),
+                   processing_utilities.UtilitySheddingPolicy()]:
+        for node_max_results, budget in [(100, None), (None, processing_utilities.MemoryBudget(200, policy))]:
+            bounded_time, matches, statistics = measure(
+                processor, pattern_queries, lambda identifier, is_event_node: processing_utilities.BoundedMemoryModel(
+                    processing_utilities.ListWrapper(), node_max_results, policy, budget))
+            recall = [len(set(map(tuple, query_matches)) & set(map(tuple, query_all_matches))) /
+                      len(query_all_matches) for query_matches, query_all_matches in zip(matches, all_matches)]
+            print("%s, %s: %.3fs, dropped %s, recall %s, estimated recall %s" %
+                  (type(policy).__name__, "global budget" if budget else "node budget", bounded_time,
+                   [query_statistics['dropped'] for query_statistics in statistics],
+                   ["%.2f" % query_recall for query_recall in recall],
+                   ["%.2f" % (1 - query_statistics['estimated_recall_loss']) for query_statistics in statistics]))
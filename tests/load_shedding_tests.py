@@ -0,0 +1,38 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def query(processor, pattern_queries, memory_model_factory):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer(memory_model_factory))
+    results = processor.query(pattern_queries, evaluation_model, processing_utilities.StringInputInterface())
+    return test_utilities.get_matches(results), evaluation_model.get_shedding_statistics()
+
+
+if __name__ == "__main__":
+    # dropping partial matches by per node and global budgets loses matches but never makes up new ones
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c) WHERE a.volumes > b.volumes WITHIN 8"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.close_of_the_day < b.close_of_the_day WITHIN 8")]
+    all_matches, _ = query(processor, pattern_queries, None)
+    for policy in [processing_utilities.OldestSheddingPolicy(), processing_utilities.RandomSheddingPolicy(0),
+                   processing_utilities.UtilitySheddingPolicy()]:
+        for node_max_results, budget in [(100, None), (None, processing_utilities.MemoryBudget(200, policy))]:
+            matches, statistics = query(
+                processor, pattern_queries, lambda identifier, is_event_node: processing_utilities.BoundedMemoryModel(
+                    processing_utilities.ListWrapper(), node_max_results, policy, budget))
+            print("%s, %s: matches %s of %s, dropped %s" %
+                  (type(policy).__name__, "global budget" if budget else "node budget",
+                   [len(query_matches) for query_matches in matches],
+                   [len(query_matches) for query_matches in all_matches],
+                   [query_statistics['dropped'] for query_statistics in statistics]))
+            for query_matches, query_all_matches, query_statistics in zip(matches, all_matches, statistics):
+                assert set(map(tuple, query_matches)) <= set(map(tuple, query_all_matches))
+                assert len(query_matches) == len(query_all_matches) or query_statistics['dropped'] > 0
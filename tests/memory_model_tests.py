@@ -0,0 +1,68 @@
+import processing_utilities
+import data_formats
+
+
+def create_partial_result(time, volumes=1):
+    values = ['AAME', time, 1, 1, 1, 1, volumes]
+    event = processing_utilities.Event(data_formats.metastock7_attributes, values,
+                                       data_formats.metastock7_attributes[data_formats.metastock7_time_index],
+                                       data_formats.metastock7_attributes[data_formats.metastock7_type_index])
+    return processing_utilities.PartialResult((event,), ('a',), time, time, 'a')
+
+
+def get_start_times(partial_results):
+    return [partial_result.start_time for partial_result in partial_results]
+
+
+if __name__ == "__main__":
+    # the time ordered memory model keeps its partial results sorted by start time and expires them by the window
+    memory_model = processing_utilities.TimeOrderedMemoryModel()
+    for time in [1, 2, 5, 3, 4, 6, 8, 7]:
+        memory_model.add_partial_result(create_partial_result(time))
+    assert get_start_times(memory_model) == [1, 2, 3, 4, 5, 6, 7, 8]
+    relevant_results = memory_model.get_relevant_results(8, 5)
+    assert get_start_times(relevant_results) == [3, 4, 5, 6, 7, 8] and len(relevant_results) == 6
+    assert relevant_results[0].start_time == 3 and relevant_results[-1].start_time == 8
+    # the views can be iterated multiple times, as the joins of a condition node do
+    assert get_start_times(relevant_results) == get_start_times(relevant_results)
+    assert get_start_times(memory_model.get_results_in_time_range(8, 5, 4, 6)) == [4, 5, 6]
+    assert get_start_times(memory_model.get_results_in_time_range(8, 5, max_start_time=3)) == [3]
+    # the expired prefix is skipped, and removed once it is most of the buffer
+    assert memory_model.first == 2 and len(memory_model) == 6
+    later_results = memory_model.get_relevant_results(12, 5)
+    assert memory_model.first == 0 and len(memory_model.results) == 2
+    assert get_start_times(later_results) == [7, 8]
+    # removing the prefix does not change the views returned before
+    assert get_start_times(relevant_results) == [3, 4, 5, 6, 7, 8]
+    # late partial results are inserted in order
+    memory_model.add_partial_result(create_partial_result(7.5))
+    memory_model.add_partial_result(create_partial_result(9))
+    assert get_start_times(memory_model) == [7, 7.5, 8, 9]
+    assert get_start_times(memory_model.pop_results()) == [7, 7.5, 8, 9] and len(memory_model) == 0
+    print("time ordered memory model: ok")
+
+    # the range index keeps its partial results sorted by the key, and removes all the expired ones at once
+    memory_model = processing_utilities.RangeIndexMemoryModel('a', 'volumes')
+    for time, volumes in [(1, 30), (2, 10), (3, 50), (4, 20), (5, 40), (6, 10)]:
+        memory_model.add_partial_result(create_partial_result(time, volumes))
+    assert get_start_times(memory_model) == [2, 6, 4, 1, 5, 3]
+    assert get_start_times(memory_model.get_matching_results('<=', 20, 6, 10)) == [2, 6, 4]
+    # one expired partial result, and then three at once
+    assert get_start_times(memory_model.get_matching_results('>', 10, 7, 5)) == [4, 5, 3]
+    assert get_start_times(memory_model.get_relevant_results(10, 5)) == [6, 5]
+    assert len(memory_model.keys) == len(memory_model.expiry_heap) == 2
+    print("range index memory model: ok")
+
+    # a sorted list finds the partial results in a start time range by a binary search
+    memory_model = processing_utilities.ListWrapper()
+    for time in [1, 2, 2, 2, 3, 5, 5, 8]:
+        memory_model.add_partial_result(create_partial_result(time))
+    for min_start_time, max_start_time in [(2, 5), (None, 2), (3, None), (4, 4), (0, 9), (6, 1)]:
+        expected_start_times = [time for time in get_start_times(memory_model)
+                                if (min_start_time is None or time >= min_start_time) and
+                                (max_start_time is None or time <= max_start_time)]
+        assert get_start_times(memory_model.get_results_in_time_range(8, 10, min_start_time, max_start_time,
+                                                                      is_sorted=True)) == expected_start_times
+        assert get_start_times(memory_model.get_results_in_time_range(8, 10, min_start_time, max_start_time,
+                                                                      is_sorted=False)) == expected_start_times
+    print("list memory model: ok")
@@ -0,0 +1,32 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def measure(processor, pattern_queries, batch_size):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+    query_time, results = test_utilities.measure(processor.query, pattern_queries, evaluation_model,
+                                                 processing_utilities.StringInputInterface(), batch_size=batch_size)
+    return query_time, test_utilities.get_matches(results)
+
+
+if __name__ == "__main__":
+    # selective filters of single events, applied event by event vs to micro batches (vectorized if numpy is installed)
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types, use_compact_events=True)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, MCRS b, ZHNE c) WHERE a.volumes > 26000 AND b.volumes > 26000 AND c.volumes > 26000 "
+        "WITHIN 30"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b) WHERE a.volumes < 3000 AND b.close_of_the_day > 90 AND "
+            "a.close_of_the_day < b.close_of_the_day WITHIN 30")]
+    event_time, event_matches = measure(processor, pattern_queries, None)
+    print("matches: %s, events one by one: %.3fs" % ([len(matches) for matches in event_matches], event_time))
+    for batch_size in [256, 4096]:
+        batch_time, batch_matches = measure(processor, pattern_queries, batch_size)
+        print("batches of %d events: %.3fs (same matches: %s)" %
+              (batch_size, batch_time, batch_matches == event_matches))
@@ -0,0 +1,57 @@
+import random
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+events_num = 20000
+query_counts = [1, 10, 50]
+symbols = ['AAME', 'MCRS', 'ZHNE', 'ACAT', 'AAPL', 'ABCB', 'ABCW', 'ABIX']
+
+
+def volumes_increase(A, B):
+    return A.volumes < B.volumes
+
+
+def get_events():
+    events = []
+    for i in range(events_num):
+        values = [random.choice(symbols), 200802010900 + i // 10, 1.0, 1.0, 1.0, 1.0, random.randint(1, 30000)]
+        events.append(processing_utilities.Event(data_formats.metastock7_attributes, values, 'date', 'symbol'))
+    return events
+
+
+def get_pattern_queries(queries_num):
+    """
+    :return: SEQ(AAME, MCRS, X) queries that share their AAME -> MCRS prefix and condition
+    """
+    condition = processing_utilities.Condition(volumes_increase, [0, 1])
+    pattern_queries = []
+    for i in range(queries_num):
+        events = [processing_utilities.EventTypeOrPatternAndIdentifier(symbol, identifier)
+                  for identifier, symbol in enumerate(['AAME', 'MCRS', symbols[2 + i % (len(symbols) - 2)]])]
+        event_pattern = processing_utilities.EventPattern(events, processing_utilities.Seq([0, 1, 2]))
+        pattern_queries.append(processing_utilities.CleanPatternQuery(event_pattern, [condition], 3))
+    return pattern_queries
+
+
+def measure(evaluation_model, pattern_queries, events):
+    query_time, results = test_utilities.measure(test_utilities.handle_events, evaluation_model, pattern_queries,
+                                                 events)
+    return len(events) / query_time, [sorted(str(match) for match in query_results) for query_results in results]
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    stream = get_events()
+    print("queries | separate graphs (events/s) | shared DAG (events/s) | shared nodes | same results")
+    for queries_num in query_counts:
+        initializer = graph_based_processing_utilities.LeftDeepTreeInitializer()
+        separate, separate_results = measure(
+            graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(initializer),
+            get_pattern_queries(queries_num), stream)
+        shared_model = graph_based_processing_utilities.SharedMultipleTreesGraphBasedProcessing(initializer)
+        shared, shared_results = measure(shared_model, get_pattern_queries(queries_num), stream)
+        print("%7d | %26.0f | %21.0f | %12d | %s" % (queries_num, separate, shared,
+                                                    shared_model.get_shared_nodes_num(),
+                                                    separate_results == shared_results))
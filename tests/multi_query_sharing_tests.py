@@ -0,0 +1,20 @@
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+
+if __name__ == "__main__":
+    # event nodes are only shared by graphs that save their partial results the same way, so every graph keeps the join
+    # indexes chosen for it
+    pattern_queries = [processing_utilities.StringInputInterface.parse(pattern_query) for pattern_query in
+                       ["PATTERN SEQ(AAME a, MCRS b) WHERE a.volumes = b.volumes WITHIN 10",
+                        "PATTERN SEQ(AAME a, MCRS b, ZHNE c) WHERE a.volumes = b.volumes WITHIN 10",
+                        "PATTERN SEQ(AAME a, MCRS b) WHERE a.open_price = b.open_price WITHIN 10"]]
+    evaluation_model = graph_based_processing_utilities.SharedMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+    evaluation_model.set_pattern_queries(pattern_queries,
+                                         [processing_utilities.TrivialOutputInterface()] * len(pattern_queries))
+    first_graph, second_graph, third_graph = evaluation_model.graphs
+    assert first_graph.event_nodes == second_graph.event_nodes[:2]
+    for first_event_node, third_event_node in zip(first_graph.event_nodes, third_graph.event_nodes):
+        assert first_event_node is not third_event_node
+        assert third_event_node.partial_results_buffer.get_attribute_index().attribute_name == 'open_price'
+    print("shared event nodes: ok")
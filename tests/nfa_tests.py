@@ -0,0 +1,38 @@
+import itertools
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+from nfa_based_processing import nfa_based_processing_utilities
+import data_formats
+import test_utilities
+
+stock_types = ['AAME', 'AAME', 'MCRS', 'ZHNE']
+
+
+def condition1(A: processing_utilities.Event, B: processing_utilities.Event) -> bool:
+    return A.volumes > B.volumes
+
+
+if __name__ == "__main__":
+    # the lazy NFA must find the same matches as the left deep tree
+    condition = processing_utilities.Condition(condition1, [0, 1])
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index)
+    stock_types_with_identifiers = \
+        [processing_utilities.EventTypeOrPatternAndIdentifier(type, i) for i, type in enumerate(stock_types)]
+    seq_event_pattern = processing_utilities.EventPattern(stock_types_with_identifiers,
+                                                          processing_utilities.Seq(range(4)))
+    seq_pattern_query = processing_utilities.CleanPatternQuery(seq_event_pattern, [condition], 16)
+    and_event_pattern = processing_utilities.EventPattern(stock_types_with_identifiers, processing_utilities.And())
+    and_pattern_query = processing_utilities.CleanPatternQuery(and_event_pattern, [condition], 16)
+    pattern_queries = [seq_pattern_query, and_pattern_query]
+    left_deep_tree_processor = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+    tree_matches = test_utilities.get_matches(processor.query(pattern_queries, left_deep_tree_processor))
+    nfa_processor = nfa_based_processing_utilities.NFAEvaluationModel(
+        sample_events=itertools.islice(processor.get_events(), 10000))
+    nfa_matches = test_utilities.get_matches(processor.query(pattern_queries, nfa_processor))
+    print("evaluation orders:", [[event.identifier for event in automaton.evaluation_order]
+                                 for automaton in nfa_processor.automata])
+    print("matches:", [len(matches) for matches in nfa_matches])
+    assert nfa_matches == tree_matches
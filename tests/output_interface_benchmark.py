@@ -0,0 +1,54 @@
+import gzip
+import os
+import random
+import processing_utilities
+import data_formats
+import test_utilities
+
+results_num = 200000
+results_per_call = 1
+output_file = "output_interface_benchmark_results.txt"
+
+
+def get_results():
+    schema = processing_utilities.EventSchema(data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                                              data_formats.metastock7_type_index)
+    events = [schema.create_event([random.choice(['AAME', 'MCRS', 'ZHNE']), 200802010900 + i // 10, 1.5, 1.6, 1.4,
+                                   1.55, random.randint(1, 30000)])
+              for i in range(1000)]
+    return [random.sample(events, 3) for _ in range(results_num)]
+
+
+def output_all(output_interface, results):
+    """
+    outputs the results the way a root node does, a few results on every call
+    """
+    for i in range(0, len(results), results_per_call):
+        output_interface.output_results(results[i:i + results_per_call])
+    output_interface.close()
+
+
+def measure(output_interface, results):
+    return test_utilities.measure(output_all, output_interface, results)[0]
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    all_results = get_results()
+    file_time = measure(processing_utilities.FileOutputInterface(output_file), all_results)
+    with open(output_file) as output:
+        file_output = output.read()
+    buffered_time = measure(processing_utilities.BufferedFileOutputInterface(output_file), all_results)
+    with open(output_file) as output:
+        buffered_output = output.read()
+    compressed_time = measure(processing_utilities.BufferedFileOutputInterface(output_file + ".gz",
+                                                                               compression='gzip'), all_results)
+    with gzip.open(output_file + ".gz", 'rt') as output:
+        compressed_output = output.read()
+    print("FileOutputInterface         | %.2fs" % file_time)
+    print("BufferedFileOutputInterface | %.2fs (same output: %s)" % (buffered_time, buffered_output == file_output))
+    print("gzip compressed             | %.2fs (same output: %s, %.1fx smaller)" %
+          (compressed_time, compressed_output == file_output,
+           os.path.getsize(output_file) / os.path.getsize(output_file + ".gz")))
+    os.remove(output_file)
+    os.remove(output_file + ".gz")
@@ -0,0 +1,34 @@
+import os
+import time
+import processing_utilities
+import data_formats
+
+output_file = "output_interface_test_results.txt"
+
+
+def read_output():
+    with open(output_file) as output:
+        return output.read()
+
+
+if __name__ == "__main__":
+    # buffered results are written once the flush interval passes, even if no other results arrive
+    schema = processing_utilities.EventSchema(data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                                              data_formats.metastock7_type_index)
+    result = [schema.create_event(['AAME', 200802010900, 1.5, 1.6, 1.4, 1.55, 100])]
+    output_interface = processing_utilities.BufferedFileOutputInterface(output_file, flush_interval=0.1)
+    output_interface.output_results([result])
+    assert read_output() == ""
+    time.sleep(0.5)
+    timer_output = read_output()
+    print("written by the timer:", repr(timer_output))
+    assert timer_output == output_interface.result_to_str(result)
+    # a full buffer is written at once, and the rest when the interface is closed
+    output_interface = processing_utilities.BufferedFileOutputInterface(output_file, buffer_size=1, flush_interval=None)
+    output_interface.output_results([result])
+    assert read_output() == timer_output
+    output_interface.output_results([result])
+    assert read_output() == timer_output * 2
+    output_interface.close()
+    assert output_interface.flush_timer is None and read_output() == timer_output * 2
+    os.remove(output_file)
@@ -0,0 +1,58 @@
+import random
+import processing_utilities
+import parallel_processing
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+symbols_num = 200
+events_num = 50000
+queries_num = 64
+workers_counts = [1, 2, 4, 8, 16, 32]
+
+
+def get_events(symbols):
+    schema = processing_utilities.EventSchema(data_formats.metastock7_attributes, data_formats.metastock7_time_index,
+                                              data_formats.metastock7_type_index)
+    return [schema.create_event([random.choice(symbols), 200802010900 + i // 10, 1.0, 1.0, 1.0, 1.0,
+                                 random.randint(1, 30000)])
+            for i in range(events_num)]
+
+
+def get_pattern_queries(symbols):
+    pattern_queries = []
+    for _ in range(queries_num):
+        events = [processing_utilities.EventTypeOrPatternAndIdentifier(symbol, identifier)
+                  for identifier, symbol in enumerate(random.sample(symbols, 3))]
+        event_pattern = processing_utilities.EventPattern(events, processing_utilities.Seq([0, 1, 2]))
+        condition = processing_utilities.Condition.less_than(0, 'volumes', 2, 'volumes')
+        pattern_queries.append(processing_utilities.CleanPatternQuery(event_pattern, [condition], 20))
+    return pattern_queries
+
+
+def create_evaluation_model():
+    return graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+
+
+def measure(evaluation_model, pattern_queries, events):
+    query_time, results = test_utilities.measure(test_utilities.handle_events, evaluation_model, pattern_queries,
+                                                 events)
+    return len(events) / query_time, \
+        [sorted([str(event) for event in match] for match in query_results) for query_results in results]
+
+
+if __name__ == "__main__":
+    random.seed(0)
+    all_symbols = ['S%03d' % i for i in range(symbols_num)]
+    stream = get_events(all_symbols)
+    queries = get_pattern_queries(all_symbols)
+    sequential, sequential_results = measure(create_evaluation_model(), queries, stream)
+    print("workers | events/s | speedup | same results")
+    print("%7s | %8.0f | %7.2f | %s" % ('-', sequential, 1, True))
+    for workers_num in workers_counts:
+        throughput, results = measure(parallel_processing.ParallelEvaluationModel(create_evaluation_model,
+                                                                                  workers_num),
+                                      queries, stream)
+        print("%7d | %8.0f | %7.2f | %s" % (workers_num, throughput, throughput / sequential,
+                                            results == sequential_results))
@@ -0,0 +1,64 @@
+import os
+import processor
+import processing_utilities
+import parallel_processing
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+output_file = "parallel_processing_test_results_%d.txt"
+
+
+def create_evaluation_model():
+    return graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+
+
+def get_outputs(cep_processor, pattern_queries, evaluation_model):
+    """
+    :return: the contents of the output file of every query
+    """
+    output_interfaces = [processing_utilities.FileOutputInterface(output_file % i) for i in range(len(pattern_queries))]
+    cep_processor.query(pattern_queries, evaluation_model, processing_utilities.StringInputInterface(),
+                        output_interfaces)
+    outputs = []
+    for i in range(len(pattern_queries)):
+        with open(output_file % i) as output:
+            outputs.append(output.read())
+        os.remove(output_file % i)
+    return outputs
+
+
+if __name__ == "__main__":
+    # evaluating the queries by worker processes must give the same matches, in the same order, and the same output as
+    # a sequential evaluation, for any number of workers
+    cep_processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                        data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                        attribute_types=data_formats.metastock7_attribute_types)
+    time_window_queries = [
+        processing_utilities.StringPatternQuery("PATTERN SEQ(AAME a, AAME b, MCRS c) WHERE a.volumes > b.volumes "
+                                                "WITHIN 8"),
+        processing_utilities.StringPatternQuery("PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.close_of_the_day < "
+                                                "b.close_of_the_day WITHIN 8"),
+        processing_utilities.StringPatternQuery("PATTERN SEQ(ZHNE a, ABCB b) WITHIN 4")]
+    const_window_queries = [
+        processing_utilities.StringPatternQuery("PATTERN SEQ(MCRS a, ZHNE b) WHERE a.volumes < b.volumes WITHIN 40 "
+                                                "EVENTS"),
+        processing_utilities.StringPatternQuery("PATTERN AND(AAME a, ABCB b) WITHIN 20 EVENTS")]
+    # a constant window changes the time of the events, so it is evaluated separately
+    for pattern_queries in [time_window_queries, const_window_queries]:
+        matches = test_utilities.get_ordered_matches(cep_processor.query(
+            pattern_queries, create_evaluation_model(), processing_utilities.StringInputInterface()))
+        outputs = get_outputs(cep_processor, pattern_queries, create_evaluation_model())
+        print("matches:", [len(query_matches) for query_matches in matches])
+        assert all(matches) and all(outputs)
+        for workers_num in [1, 2, 3, 4]:
+            parallel_matches = test_utilities.get_ordered_matches(cep_processor.query(
+                pattern_queries, parallel_processing.ParallelEvaluationModel(create_evaluation_model, workers_num),
+                processing_utilities.StringInputInterface()))
+            assert parallel_matches == matches, workers_num
+            parallel_outputs = get_outputs(cep_processor, pattern_queries,
+                                           parallel_processing.ParallelEvaluationModel(create_evaluation_model,
+                                                                                       workers_num, batch_size=100))
+            assert parallel_outputs == outputs, workers_num
+            print("%d workers: ok" % workers_num)
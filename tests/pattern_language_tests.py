@@ -0,0 +1,55 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+stock_types = ['AAME', 'AAME', 'MCRS', 'ZHNE']
+
+
+def condition1(A: processing_utilities.Event, B: processing_utilities.Event) -> bool:
+    return A.volumes > B.volumes
+
+
+if __name__ == "__main__":
+    # a query of the pattern language must find the same matches as the query built by hand
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index)
+    stock_types_with_identifiers = \
+        [processing_utilities.EventTypeOrPatternAndIdentifier(type, i) for i, type in enumerate(stock_types)]
+    event_pattern = processing_utilities.EventPattern(stock_types_with_identifiers, processing_utilities.Seq(range(4)))
+    pattern_query = processing_utilities.CleanPatternQuery(
+        event_pattern, [processing_utilities.Condition(condition1, [0, 1])], 16)
+    string_pattern_query = processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c, ZHNE d) WHERE a.volumes > b.volumes WITHIN 16")
+    matches = test_utilities.get_matches(processor.query(
+        [pattern_query], graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+            graph_based_processing_utilities.LeftDeepTreeInitializer())))
+    string_matches = test_utilities.get_matches(processor.query(
+        [string_pattern_query], graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+            graph_based_processing_utilities.LeftDeepTreeInitializer()), processing_utilities.StringInputInterface()))
+    print("matches:", [len(query_matches) for query_matches in string_matches])
+    assert string_matches == matches
+
+    # the structure of the compiled conditions
+    clean_pattern_query = processing_utilities.StringInputInterface.parse(
+        "PATTERN AND(AAME a, MCRS b) WHERE a.open_price = b.open_price AND 100 > b.volumes "
+        "AND (a.volumes + b.volumes > 1000 OR NOT a.peak_price < 2) WITHIN 100 EVENTS")
+    comparison, constant_comparison, other = clean_pattern_query.conditions
+    assert clean_pattern_query.use_const_window and clean_pattern_query.time_limit == 100
+    assert (comparison.comparison.first_attribute, comparison.comparison.relation) == ('open_price', '==')
+    assert (constant_comparison.constant_comparison.identifier, constant_comparison.constant_comparison.relation,
+            constant_comparison.constant_comparison.value) == ('b', '<', 100)
+    assert other.event_identifiers == ['a', 'b'] and other.attributes == {'a': ('volumes', 'peak_price'),
+                                                                          'b': ('volumes',)}
+    for invalid_pattern_query in ["PATTERN SEQ(AAME a) WHERE __import__('os') WITHIN 1",
+                                  "PATTERN SEQ(AAME a) WHERE a.volumes > c.volumes WITHIN 1",
+                                  "PATTERN SEQ(AAME a, MCRS b) WHERE a.__class__ == b.__class__ WITHIN 1",
+                                  "PATTERN SEQ(AAME a) WHERE a.volumes > (lambda: 0)() WITHIN 1",
+                                  "PATTERN SEQ(AAME a) WHERE a.volumes in [x for x in (1, 2)] WITHIN 1",
+                                  "PATTERN SEQ(AAME a, MCRS a) WITHIN 1"]:
+        try:
+            processing_utilities.StringInputInterface.parse(invalid_pattern_query)
+            assert False, invalid_pattern_query
+        except ValueError:
+            pass
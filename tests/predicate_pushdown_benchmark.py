@@ -0,0 +1,34 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def measure(processor, pattern_queries, graph_initializer):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(graph_initializer)
+    query_time, results = test_utilities.measure(processor.query, pattern_queries, evaluation_model,
+                                                 processing_utilities.StringInputInterface())
+    return query_time, test_utilities.get_matches(results)
+
+
+if __name__ == "__main__":
+    # selective filters of single events, checked by the event nodes vs by the condition nodes joining the events
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types, use_compact_events=True)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c, ZHNE d) WHERE a.volumes > b.volumes AND c.volumes > 26000 AND "
+        "d.volumes > 26000 WITHIN 16"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.volumes < 3000 AND b.volumes > 26000 AND "
+            "b.close_of_the_day > c.close_of_the_day WITHIN 16")]
+    for initializer_type in [graph_based_processing_utilities.LeftDeepTreeInitializer,
+                             graph_based_processing_utilities.CostBasedTreeInitializer]:
+        push_down_time, push_down_matches = measure(processor, pattern_queries,
+                                                    initializer_type(push_down_conditions=True))
+        time_without_push_down, matches = measure(processor, pattern_queries,
+                                                  initializer_type(push_down_conditions=False))
+        print("%s: matches %s, pushed down filters %.3fs, filters in condition nodes %.3fs (same matches: %s)" %
+              (initializer_type.__name__, [len(query_matches) for query_matches in matches], push_down_time,
+               time_without_push_down, push_down_matches == matches))
@@ -0,0 +1,31 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def get_matches(processor, pattern_queries, graph_initializer):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(graph_initializer)
+    return test_utilities.get_matches(processor.query(pattern_queries, evaluation_model,
+                                                      processing_utilities.StringInputInterface()))
+
+
+if __name__ == "__main__":
+    # checking single event conditions by the event nodes must find the same matches as checking them by the
+    # condition nodes
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c, ZHNE d) WHERE a.volumes > b.volumes AND c.volumes > 26000 AND "
+        "d.volumes > 26000 WITHIN 16"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.volumes < 3000 AND b.volumes > 26000 AND "
+            "b.close_of_the_day > c.close_of_the_day WITHIN 16")]
+    for initializer_type in [graph_based_processing_utilities.LeftDeepTreeInitializer,
+                             graph_based_processing_utilities.CostBasedTreeInitializer]:
+        matches = get_matches(processor, pattern_queries, initializer_type(push_down_conditions=False))
+        push_down_matches = get_matches(processor, pattern_queries, initializer_type(push_down_conditions=True))
+        print("%s matches: %s" % (initializer_type.__name__, [len(query_matches) for query_matches in matches]))
+        assert push_down_matches == matches
@@ -0,0 +1,42 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+from nfa_based_processing import nfa_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def get_buffered_matches_num(evaluation_model) -> int:
+    """
+    :return: the number of matches kept by the root nodes (or automata) of the evaluation model
+    """
+    if isinstance(evaluation_model, nfa_based_processing_utilities.NFAEvaluationModel):
+        return sum(len(automaton.matches) for automaton in evaluation_model.automata)
+    return sum(len(graph.root_node.partial_results_buffer) for graph in evaluation_model.graphs)
+
+
+if __name__ == "__main__":
+    # the matches yielded while the stream is processed are the matches of query, and are not kept by the evaluation
+    # model after they are yielded
+    cep_processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                        data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                        attribute_types=data_formats.metastock7_attribute_types)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, AAME b, MCRS c) WHERE a.volumes > b.volumes WITHIN 8"),
+        processing_utilities.StringPatternQuery(
+            "PATTERN AND(AAME a, MCRS b, ZHNE c) WHERE a.close_of_the_day < b.close_of_the_day WITHIN 8")]
+    for create_evaluation_model in [
+            lambda: graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+                graph_based_processing_utilities.LeftDeepTreeInitializer()),
+            lambda: nfa_based_processing_utilities.NFAEvaluationModel()]:
+        matches = test_utilities.get_matches(cep_processor.query(pattern_queries, create_evaluation_model(),
+                                                                 processing_utilities.StringInputInterface()))
+        evaluation_model = create_evaluation_model()
+        stream_results = [[] for _ in pattern_queries]
+        for query_index, match in cep_processor.query_stream(pattern_queries, evaluation_model,
+                                                             processing_utilities.StringInputInterface()):
+            stream_results[query_index].append(match)
+            assert get_buffered_matches_num(evaluation_model) == 0
+        print("%s matches: %s" % (type(evaluation_model).__name__, [len(query_matches) for query_matches in matches]))
+        assert all(matches)
+        assert test_utilities.get_matches(stream_results) == matches
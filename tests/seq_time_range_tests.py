@@ -0,0 +1,36 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+
+def get_matches(cep_processor, pattern_queries, memory_model_factory):
+    evaluation_model = graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer(memory_model_factory))
+    return test_utilities.get_matches(cep_processor.query(pattern_queries, evaluation_model,
+                                                          processing_utilities.StringInputInterface()))
+
+
+if __name__ == "__main__":
+    # restricting the start times of the partial results joined by a seq (found by a binary search in sorted buffers)
+    # must not change its matches
+    cep_processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                        data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                        attribute_types=data_formats.metastock7_attribute_types)
+    pattern_queries = [processing_utilities.StringPatternQuery(
+        "PATTERN SEQ(AAME a, MCRS b, ZHNE c) WHERE a.volumes > b.volumes WITHIN 6"),
+        processing_utilities.StringPatternQuery("PATTERN SEQ(ZHNE a, AAME b, AAME c) WITHIN 4"),
+        processing_utilities.StringPatternQuery("PATTERN SEQ(MCRS a, ZHNE b) WITHIN 30 EVENTS")]
+    memory_model_factories = {'ListWrapper': None, 'TimeOrderedMemoryModel': lambda identifier, is_event_node:
+                              processing_utilities.TimeOrderedMemoryModel()}
+    get_start_time_range = processing_utilities.Seq.get_start_time_range
+    for name, memory_model_factory in memory_model_factories.items():
+        # a constant window changes the time of the events, so it is evaluated separately
+        for query_pattern_queries in [pattern_queries[:2], pattern_queries[2:]]:
+            matches = get_matches(cep_processor, query_pattern_queries, memory_model_factory)
+            processing_utilities.Seq.get_start_time_range = processing_utilities.Operator.get_start_time_range
+            unrestricted_matches = get_matches(cep_processor, query_pattern_queries, memory_model_factory)
+            processing_utilities.Seq.get_start_time_range = get_start_time_range
+            print("%s matches: %s" % (name, [len(query_matches) for query_matches in matches]))
+            assert all(matches) and matches == unrestricted_matches
@@ -0,0 +1,44 @@
+import time
+import typing
+import processing_utilities
+
+# helpers shared by the tests (which check the matches of the engine) and the benchmarks (which time it)
+
+
+def get_matches(results):
+    """
+    :return: the matches of every query as sets of events (the tree orders the events of a match by the order they
+    were combined in), sorted so the matches of different evaluation models can be compared
+    """
+    return [sorted(sorted(str(event) for event in match) for match in query_results) for query_results in results]
+
+
+def get_ordered_matches(results):
+    """
+    :return: the matches of every query as they were output, for evaluations that must keep the order of the matches
+    and of their events
+    """
+    return [[[str(event) for event in match] for match in query_results] for query_results in results]
+
+
+def handle_events(evaluation_model: processing_utilities.EvaluationModel,
+                  pattern_queries: typing.List[processing_utilities.CleanPatternQuery], events: typing.Iterable):
+    """
+    evaluates the pattern queries on events created by the benchmark, the way the processor evaluates the events of
+    the input file
+    :return: the results of every query
+    """
+    evaluation_model.set_pattern_queries(pattern_queries,
+                                         [processing_utilities.TrivialOutputInterface()] * len(pattern_queries))
+    for counter, event in enumerate(events):
+        evaluation_model.handle_event(event, counter)
+    return evaluation_model.get_results()
+
+
+def measure(function: typing.Callable, *args, **kwargs):
+    """
+    :return: the number of seconds the call of function with the given arguments took, and its return value
+    """
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
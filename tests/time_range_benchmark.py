@@ -0,0 +1,25 @@
+import processor
+import data_formats
+import test_utilities
+
+input_file = "sorted_NASDAQ_20080201_1.txt"
+
+
+def measure(get_events):
+    read_time, events = test_utilities.measure(lambda: list(get_events()))
+    return read_time, [str(event) for event in events]
+
+
+if __name__ == "__main__":
+    # reading one hour of the file: filtering all the parsed events vs seeking to the hour by the time index
+    processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types, use_compact_events=True)
+    start_time, end_time = 200802011000, 200802011100
+    scan_time, scan_events = measure(lambda: (event for event in processor.get_events()
+                                              if start_time <= event.get_time() < end_time))
+    index_build_time, _ = measure(lambda: processor.get_events_in_time_range(end_time, end_time))
+    index_time, index_events = measure(lambda: processor.get_events_in_time_range(start_time, end_time))
+    print("events in range: %d (same events: %s)" % (len(index_events), index_events == scan_events))
+    print("full scan: %.3fs, time index: %.3fs (first use, building the index: %.3fs)" %
+          (scan_time, index_time, index_build_time))
@@ -0,0 +1,22 @@
+import processor
+import data_formats
+
+input_file = "sorted_NASDAQ_20080201_1.txt"
+
+
+def get_events(events):
+    return [str(event) for event in events]
+
+
+if __name__ == "__main__":
+    # the events read by seeking to a time range by the time index are the events of the range in the whole file
+    processor = processor.Processor(input_file, data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index,
+                                    attribute_types=data_formats.metastock7_attribute_types)
+    all_events = list(processor.get_events())
+    first_time, last_time = all_events[0].get_time(), all_events[-1].get_time()
+    for start_time, end_time in [(200802011000, 200802011100), (first_time, last_time + 1), (first_time, first_time),
+                                 (last_time, last_time + 1), (last_time + 1, last_time + 100)]:
+        index_events = get_events(processor.get_events_in_time_range(start_time, end_time))
+        print("events in [%d, %d): %d" % (start_time, end_time, len(index_events)))
+        assert index_events == get_events(event for event in all_events if start_time <= event.get_time() < end_time)
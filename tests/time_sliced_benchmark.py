@@ -0,0 +1,35 @@
+import processor
+import processing_utilities
+from graph_based_processing import graph_based_processing_utilities
+import data_formats
+import test_utilities
+
+stock_types = ['AAME', 'AAME', 'MCRS', 'ZHNE']
+slices_num = 4
+
+
+def condition1(A: processing_utilities.Event, B: processing_utilities.Event) -> bool:
+    return A.volumes > B.volumes
+
+
+def create_evaluation_model():
+    return graph_based_processing_utilities.NaiveMultipleTreesGraphBasedProcessing(
+        graph_based_processing_utilities.LeftDeepTreeInitializer())
+
+
+if __name__ == "__main__":
+    # a sequential evaluation vs evaluating time slices of the file in parallel
+    condition = processing_utilities.Condition(condition1, [0, 1])
+    processor = processor.Processor("sorted_NASDAQ_20080201_1.txt", data_formats.metastock7_attributes,
+                                    data_formats.metastock7_time_index, data_formats.metastock7_type_index)
+    stock_types_with_identifiers = \
+        [processing_utilities.EventTypeOrPatternAndIdentifier(type, i) for i, type in enumerate(stock_types)]
+    seq_event_pattern = processing_utilities.EventPattern(stock_types_with_identifiers,
+                                                          processing_utilities.Seq(range(4)))
+    pattern_queries = [processing_utilities.CleanPatternQuery(seq_event_pattern, [condition], 16)]
+    sequential_time, sequential_results = test_utilities.measure(processor.query, pattern_queries,
+                                                                 create_evaluation_model())
+    sliced_time, sliced_results = test_utilities.measure(processor.query_time_sliced, pattern_queries,
+                                                         create_evaluation_model, slices_num)
+    print("matches: %d, sequential: %.2fs, %d time slices: %.2fs" % (len(sequential_results[0]), sequential_time,
+                                                                    slices_num, sliced_time))
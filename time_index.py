@@ -0,0 +1,125 @@
+import bisect
+import json
+import mmap
+import os
+import typing
+
+
+class TimeIndex:
+    """
+    A sparse index from time to byte offset of a time sorted input file: the offset and time of the first line starting
+    after every step_size bytes. The index is built by reading only these lines (through a memory map), and cached in
+    a file next to the input file, valid as long as the input file's size and modification time do not change
+    """
+    suffix = '.time_index'
+
+    def __init__(self, times: typing.List, offsets: typing.List[int], file_size: int, modification_time: int,
+                 time_attribute_index: int, step_size: int):
+        """
+        :param times: the times of the indexed lines, in file order
+        :param offsets: the offsets of the indexed lines
+        :param file_size: the size of the indexed file
+        :param modification_time: the modification time of the indexed file (in nanoseconds)
+        :param time_attribute_index: the index of the time attribute in the lines
+        :param step_size: the number of bytes between indexed lines
+        """
+        self.times = times
+        self.offsets = offsets
+        self.file_size = file_size
+        self.modification_time = modification_time
+        self.time_attribute_index = time_attribute_index
+        self.step_size = step_size
+
+    @staticmethod
+    def get_line_time(data: mmap.mmap, offset: int, time_attribute_index: int,
+                      parse_time: typing.Callable[[str], typing.Any]):
+        """
+        :return: the time of the line starting at offset, parsing only the time attribute of the line
+        """
+        end = data.find(b'\n', offset)
+        line = data[offset:end if end >= 0 else len(data)]
+        return parse_time(line.split(b',')[time_attribute_index].decode().strip())
+
+    @staticmethod
+    def build(data: mmap.mmap, file_size: int, modification_time: int, time_attribute_index: int,
+              parse_time: typing.Callable[[str], typing.Any], step_size: int):
+        """
+        :param data: a memory map of the input file
+        :param parse_time: converts the text of a time attribute to its value
+        :return: the index of the file
+        """
+        times = []
+        offsets = []
+        offset = 0
+        while offset < file_size:
+            if data[offset:offset + 1].strip():
+                times.append(TimeIndex.get_line_time(data, offset, time_attribute_index, parse_time))
+                offsets.append(offset)
+            next_line = data.find(b'\n', offset + step_size)
+            if next_line < 0:
+                break
+            offset = next_line + 1
+        return TimeIndex(times, offsets, file_size, modification_time, time_attribute_index, step_size)
+
+    @staticmethod
+    def load(index_path: str) -> typing.Optional['TimeIndex']:
+        """
+        :return: the index saved in index_path, None if it can not be read
+        """
+        try:
+            with open(index_path, 'r') as index_file:
+                saved = json.load(index_file)
+            return TimeIndex(saved['times'], saved['offsets'], saved['file_size'], saved['modification_time'],
+                             saved['time_attribute_index'], saved['step_size'])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def save(self, index_path: str):
+        """
+        saves the index, if index_path is writable
+        """
+        try:
+            with open(index_path, 'w') as index_file:
+                json.dump({'times': self.times, 'offsets': self.offsets, 'file_size': self.file_size,
+                           'modification_time': self.modification_time,
+                           'time_attribute_index': self.time_attribute_index, 'step_size': self.step_size},
+                          index_file)
+        except (OSError, TypeError):
+            # the times can not be saved as json or the directory is not writable, the index is just not cached
+            pass
+
+    def is_valid(self, file_size: int, modification_time: int, time_attribute_index: int, step_size: int) -> bool:
+        return (self.file_size, self.modification_time, self.time_attribute_index, self.step_size) == \
+               (file_size, modification_time, time_attribute_index, step_size)
+
+    @staticmethod
+    def get_index(data_file_path: str, data: mmap.mmap, time_attribute_index: int,
+                  parse_time: typing.Callable[[str], typing.Any], step_size: int = 1 << 16) -> 'TimeIndex':
+        """
+        :return: the cached index of the input file if it is valid, otherwise a new index (that is cached)
+        """
+        status = os.stat(data_file_path)
+        index_path = data_file_path + TimeIndex.suffix
+        index = TimeIndex.load(index_path)
+        if index is None or not index.is_valid(status.st_size, status.st_mtime_ns, time_attribute_index, step_size):
+            index = TimeIndex.build(data, status.st_size, status.st_mtime_ns, time_attribute_index, parse_time,
+                                    step_size)
+            index.save(index_path)
+        return index
+
+    def find_first_line(self, data: mmap.mmap, time, parse_time: typing.Callable[[str], typing.Any]) -> int:
+        """
+        :return: the offset of the first line whose time is at least the given time (the file size if there is none),
+        found by scanning the time attributes of the lines after the last indexed line of an earlier time
+        """
+        position = bisect.bisect_left(self.times, time)
+        offset = self.offsets[position - 1] if position > 0 else 0
+        while offset < self.file_size:
+            if data[offset:offset + 1].strip() and \
+                    self.get_line_time(data, offset, self.time_attribute_index, parse_time) >= time:
+                return offset
+            next_line = data.find(b'\n', offset)
+            if next_line < 0:
+                break
+            offset = next_line + 1
+        return self.file_size